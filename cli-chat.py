@@ -5,6 +5,7 @@ A starter kit for local AI chat applications
 
 Required packages:
 pip install ollama rich
+pip install numpy (optional: semantic search with /similar and --similar-cache)
 
 Usage:
 python gemma_chat.py
@@ -17,7 +18,10 @@ Educational Philosophy:
 
 Multi-user Setup (Ubuntu):
 - Multiple Ubuntu accounts can access simultaneously
-- Each user runs their own instance on different ports
+- One server process (--serve) owns the model and the database; each user
+  connects with a thin client (--connect) and keeps their own history
+- Replies are generated a few at a time, taking turns between users
+- fake_ollama.py stands in for Ollama when testing without a model
 - Scale: 10+ users on a single 70k yen mini PC
 - Access: Chrome, smartphone, Chromebook compatible
 
@@ -32,56 +36,422 @@ TODO for Students:
 8. Create API endpoints for external access
 """
 
-import ollama
+import time
+
+# Measured from here for --timing (interpreter startup is not included)
+STARTED = time.perf_counter()
+
 import sqlite3
+import getpass
+import hashlib
+import json
 import os
+import re
+import socket
 import sys
-from datetime import datetime
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
 from rich.table import Table
 from rich.text import Text
-from rich.markdown import Markdown
 from rich import print as rprint
 
+# ollama, rich.markdown and rich.live are imported where they are first used:
+# they are the slowest imports, and --help needs none of them
+
+# Redraws per second while a response streams in; each redraw re-renders the
+# Markdown so far, so a cap keeps long answers cheap on slow hardware
+STREAM_REFRESH_PER_SECOND = 8
+
+# How long Ollama keeps the model loaded after the last request
+KEEP_ALIVE = "30m"
+
+# Conversation threads: the model's context window (tokens), the share of it a
+# thread may fill before it is summarized (the rest is room for the reply),
+# and how many characters of recent turns replace a summary that failed
+CONTEXT_WINDOW = 4096
+CONTEXT_BUDGET = 0.75
+REPLAY_CHARS = 4000
+
+SUMMARY_PROMPT = ("Summarize our conversation so far in a few sentences, keeping names, "
+                  "facts and open questions. Reply with the summary only.")
+
+# Server mode: default socket, generations running at once, messages a user
+# may have waiting, and a cap on tokens per reply so no turn holds a slot forever
+SERVER_SOCKET = "/tmp/gemma-chat.sock"
+SERVER_MAX_INFLIGHT = 2
+SERVER_MAX_QUEUED = 4
+SERVER_MAX_TOKENS = 1024
+
+# Response cache for repeated questions: the total size of cached replies
+# (least recently used ones are evicted first) and how long one stays valid.
+# Only prompts without earlier turns are cached, as their reply does not
+# depend on the rest of a conversation
+CACHE_MAX_BYTES = 4 * 1024 * 1024
+CACHE_TTL = timedelta(days=7)
+
+# Semantic search: the Ollama embedding model (ollama pull nomic-embed-text),
+# and the cosine similarity from which --similar-cache answers a question
+# with the cached reply to a differently worded one
+EMBED_MODEL = "nomic-embed-text"
+SIMILAR_CACHE_THRESHOLD = 0.92
+
+# How long a writer waits for another user's transaction before giving up (ms)
+DB_BUSY_TIMEOUT_MS = 5000
+
+def migrate_v1(conn):
+    """Version 1: chat history table (matches databases from older versions)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            user_message TEXT NOT NULL,
+            assistant_response TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_timestamp ON chat_history(timestamp)")
+
+def migrate_v2(conn):
+    """Version 2: FTS5 index over chat_history, kept in sync by triggers"""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE chat_fts USING fts5(
+                user_message, assistant_response,
+                content='chat_history', content_rowid='id'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: /search keeps using LIKE
+        return
+    
+    conn.execute('''
+        CREATE TRIGGER chat_fts_insert AFTER INSERT ON chat_history BEGIN
+            INSERT INTO chat_fts (rowid, user_message, assistant_response)
+            VALUES (new.id, new.user_message, new.assistant_response);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER chat_fts_delete AFTER DELETE ON chat_history BEGIN
+            INSERT INTO chat_fts (chat_fts, rowid, user_message, assistant_response)
+            VALUES ('delete', old.id, old.user_message, old.assistant_response);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER chat_fts_update AFTER UPDATE ON chat_history BEGIN
+            INSERT INTO chat_fts (chat_fts, rowid, user_message, assistant_response)
+            VALUES ('delete', old.id, old.user_message, old.assistant_response);
+            INSERT INTO chat_fts (rowid, user_message, assistant_response)
+            VALUES (new.id, new.user_message, new.assistant_response);
+        END
+    ''')
+    
+    # One-time backfill of the history written before the index existed
+    conn.execute("INSERT INTO chat_fts (chat_fts) VALUES ('rebuild')")
+
+def migrate_v3(conn):
+    """Version 3: conversation threads, each keeping Ollama's context tokens"""
+    conn.execute('''
+        CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            created TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            model TEXT NOT NULL,
+            context BLOB,
+            summary TEXT
+        )
+    ''')
+    # Turns from before threads existed keep a NULL conversation_id
+    conn.execute("ALTER TABLE chat_history ADD COLUMN conversation_id INTEGER REFERENCES conversations(id)")
+    conn.execute("CREATE INDEX idx_chat_history_conversation ON chat_history(conversation_id, id)")
+
+def local_user_name():
+    """Name of the OS user running this process"""
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "local"
+
+def migrate_v4(conn):
+    """Version 4: users; every turn and thread belongs to one user"""
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created TEXT NOT NULL
+        )
+    ''')
+    conn.execute("ALTER TABLE chat_history ADD COLUMN user_id INTEGER REFERENCES users(id)")
+    conn.execute("ALTER TABLE conversations ADD COLUMN user_id INTEGER REFERENCES users(id)")
+    conn.execute("CREATE INDEX idx_chat_history_user ON chat_history(user_id, timestamp)")
+    conn.execute("CREATE INDEX idx_conversations_user ON conversations(user_id, updated)")
+    
+    # Until now every OS user ran a private database, so existing history
+    # belongs to the user who upgrades it
+    if conn.execute("SELECT 1 FROM chat_history LIMIT 1").fetchone():
+        cursor = conn.execute("INSERT INTO users (name, created) VALUES (?, ?)",
+                              (local_user_name(), datetime.now().isoformat()))
+        conn.execute("UPDATE chat_history SET user_id = ?", (cursor.lastrowid,))
+        conn.execute("UPDATE conversations SET user_id = ?", (cursor.lastrowid,))
+
+def migrate_v5(conn):
+    """Version 5: response cache for repeated prompts; history marks replies served from it"""
+    conn.execute('''
+        CREATE TABLE response_cache (
+            key TEXT PRIMARY KEY,
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            context BLOB,
+            size INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created TEXT NOT NULL,
+            last_used TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_response_cache_last_used ON response_cache(last_used)")
+    
+    # Lookup counters for the hit rate shown by /cache
+    conn.execute("CREATE TABLE response_cache_stats (lookups INTEGER NOT NULL, hits INTEGER NOT NULL)")
+    conn.execute("INSERT INTO response_cache_stats (lookups, hits) VALUES (0, 0)")
+    
+    conn.execute("ALTER TABLE chat_history ADD COLUMN cached INTEGER NOT NULL DEFAULT 0")
+
+def migrate_v6(conn):
+    """Version 6: prompt embeddings for semantic search and the similar-question cache"""
+    conn.execute('''
+        CREATE TABLE turn_embeddings (
+            turn_id INTEGER PRIMARY KEY REFERENCES chat_history(id),
+            user_id INTEGER REFERENCES users(id),
+            model TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_turn_embeddings_user ON turn_embeddings(user_id, turn_id)")
+    
+    # AUTOINCREMENT ids never go back, so an in-memory index can load new rows by id
+    conn.execute('''
+        CREATE TABLE cache_embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL UNIQUE REFERENCES response_cache(key),
+            model TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER response_cache_delete AFTER DELETE ON response_cache BEGIN
+            DELETE FROM cache_embeddings WHERE key = old.key;
+        END
+    ''')
+
+def normalize_prompt(prompt):
+    """Cache form of a prompt: differences in case and whitespace do not count"""
+    return ' '.join(prompt.casefold().split())
+
+def prompt_cache_key(arguments, prompt):
+    """Response cache key: model and options of ollama.generate arguments, and the normalized prompt"""
+    key = json.dumps([arguments['model'], arguments['options'], normalize_prompt(prompt)], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def unit_vector(values):
+    """An embedding as a float32 vector of length 1, so dot products are cosine similarities"""
+    import numpy as np
+    
+    vector = np.asarray(values, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+# Search hits are wrapped in these markers by snippet() and highlighted on display
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+def fts_query(query):
+    """
+    Turn user input into an FTS5 query: every word must match,
+    "quoted text" matches a phrase and word* matches a prefix
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        text = phrase if phrase else word
+        prefix = not phrase and text.endswith('*')
+        text = text.rstrip('*').replace('"', '""')
+        if text.strip():
+            terms.append(f'"{text}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+# Schema migrations, applied in order; the database stores the last one applied.
+# To change the schema, append a function here - never edit an old one.
+MIGRATIONS = [migrate_v1, migrate_v2, migrate_v3, migrate_v4, migrate_v5, migrate_v6]
+
+class VectorIndex:
+    """
+    Embeddings in one contiguous float32 matrix, one row per item.
+    
+    Rows have length 1, so the cosine similarity to every row is a single
+    matrix-vector product. Rows stored in the database since the last
+    search are appended in place (capacity doubles when full); last_id is
+    the database id of the newest row loaded.
+    """
+    
+    def __init__(self):
+        self.ids = []
+        self.matrix = None
+        self.last_id = 0
+        self.discarded = 0
+    
+    def __len__(self):
+        return len(self.ids) - self.discarded
+    
+    def append(self, ids, vectors):
+        """Add one row per id from a (len(ids), dimensions) float32 array"""
+        import numpy as np
+        
+        count = len(self.ids)
+        needed = count + len(ids)
+        if self.matrix is None or needed > len(self.matrix):
+            grown = np.empty((max(needed, 2 * count, 64), vectors.shape[1]), dtype=np.float32)
+            if count:
+                grown[:count] = self.matrix[:count]
+            self.matrix = grown
+        self.matrix[count:needed] = vectors
+        self.ids.extend(ids)
+    
+    def discard(self, item):
+        """Forget an item whose database row is gone; compacts once half the rows are gone"""
+        index = self.ids.index(item)
+        self.ids[index] = None
+        self.matrix[index] = 0
+        self.discarded += 1
+        
+        if self.discarded * 2 > len(self.ids):
+            keep = [index for index, item in enumerate(self.ids) if item is not None]
+            self.matrix = self.matrix[keep]
+            self.ids = [self.ids[index] for index in keep]
+            self.discarded = 0
+    
+    def search(self, vector, k):
+        """The k items most similar to a unit vector, as (item, cosine similarity), best first"""
+        import numpy as np
+        
+        count = len(self.ids)
+        if not count:
+            return []
+        scores = self.matrix[:count] @ vector
+        
+        # Partial sort: only the top k are ordered
+        k = min(k, count)
+        top = np.argpartition(scores, count - k)[count - k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.ids[index], float(scores[index])) for index in top if self.ids[index] is not None]
+
 class GemmaChat:
-    def __init__(self, db_path="chat_history.db"):
+    def __init__(self, db_path="chat_history.db", user=None, conn=None):
         self.console = Console()
         self.db_path = db_path
         self.model = "gemma3:1b"
-        self.init_database()
         
+        # Server sessions share the server's connection (see ChatServer)
+        self.conn = conn
+        self.owns_conn = conn is None
+        if conn is None:
+            self.init_database()
+        else:
+            self.detect_features()
+        
+        # History and threads are kept per user
+        self.user = user or local_user_name()
+        self.user_id = self.user_id_for(self.user)
+        
+        # Current thread: created with its first message. context holds the
+        # token state Ollama returned after the last turn, so the next turn
+        # only evaluates the new message; preamble carries a summary into a
+        # fresh context once the old one was compacted
+        self.conversation_id = None
+        self.context = None
+        self.preamble = None
+        
+        self.warmup = None
+        self.warmup_error = None
+        
+        # Semantic search over this user's questions, and the similar-question
+        # cache over everyone's cached ones (off unless similar_threshold is
+        # set). Embeddings switch off for the session after the first failure
+        self.history_index = VectorIndex()
+        self.cache_index = VectorIndex()
+        self.similar_threshold = None
+        self.embeddings_enabled = True
+        self.embedding_error = None
+    
     def init_database(self):
-        """Initialize SQLite database for chat history"""
-        conn = sqlite3.connect(self.db_path)
+        """Open the session's SQLite connection and bring the schema up to date"""
+        # One connection for the whole session; autocommit mode, so each
+        # statement is its own short transaction unless transaction() is used
+        self.conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                                    isolation_level=None, cached_statements=64)
         
-        # Check existing table structure
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(chat_history)")
-        columns = [row[1] for row in cursor.fetchall()]
+        # WAL lets many users read while one writes; NORMAL sync is safe in WAL mode
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
         
-        if not columns:  # Create table if not exists
-            conn.execute('''
-                CREATE TABLE chat_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    user_message TEXT NOT NULL,
-                    assistant_response TEXT NOT NULL
-                )
-            ''')
+        self.migrate()
+        self.detect_features()
+    
+    def detect_features(self):
+        """Check which optional parts of the schema this database has"""
+        # The index only exists where SQLite has FTS5
+        self.fts_enabled = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chat_fts'").fetchone() is not None
+    
+    def user_id_for(self, name):
+        """Row id of a user, added on first use"""
+        self.conn.execute("INSERT OR IGNORE INTO users (name, created) VALUES (?, ?)",
+                          (name, datetime.now().isoformat()))
+        return self.conn.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()[0]
+    
+    @contextmanager
+    def transaction(self):
+        """Group statements into one write transaction"""
+        # IMMEDIATE takes the write lock up front, so concurrent sessions
+        # wait (busy_timeout) instead of failing halfway through
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+    
+    def migrate(self):
+        """Apply pending schema migrations, tracked in the schema_version table"""
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+            current = row[0] or 0
             
-        conn.commit()
-        conn.close()
+            for version, migration in enumerate(MIGRATIONS[current:], current + 1):
+                migration(conn)
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+    
+    def close(self):
+        """Close the database connection at the end of the session"""
+        if self.conn is not None and self.owns_conn:
+            self.conn.close()
+            self.conn = None
         
     def check_ollama_connection(self):
         """Check Ollama connection and model availability"""
+        import ollama
+        
         try:
-            # Direct model test instead of list() to handle version differences
-            test_response = ollama.generate(model=self.model, prompt="test")
-            if test_response:
-                self.console.print(f"[green]✅ Ollama connected - {self.model}[/green]")
-                return True
+            # Lightweight readiness check: reads the model's metadata without
+            # loading it (start_warmup loads it in the background)
+            ollama.show(self.model)
+            self.console.print(f"[green]✅ Ollama connected - {self.model}[/green]")
+            return True
             
         except Exception as e:
             self.console.print(f"[red]❌ Ollama connection error: {e}[/red]")
@@ -118,55 +488,511 @@ class GemmaChat:
             self.console.print("[yellow]💡 Run: ollama pull gemma3:1b[/yellow]")
             return False
     
-    def send_message(self, message):
-        """Send message to Gemma and get response"""
+    def start_warmup(self):
+        """Load the model on a background thread while the welcome screen renders"""
+        def warm_up():
+            import ollama
+            try:
+                # An empty prompt only loads the model, nothing is generated; with
+                # another num_ctx than the chat's, Ollama would load it again
+                ollama.generate(model=self.model, prompt="", options={'num_ctx': CONTEXT_WINDOW},
+                                keep_alive=KEEP_ALIVE)
+            except Exception as e:
+                # Reported by the first message instead of interrupting the prompt
+                self.warmup_error = e
+            # Loads the embedding model too (or finds out it is missing)
+            self.embed("warm-up")
+        
+        self.warmup = threading.Thread(target=warm_up, name="model-warmup", daemon=True)
+        self.warmup.start()
+    
+    def response_panel(self, response, note=None):
+        """Gemma's response panel, also used for each frame while streaming"""
+        from rich.markdown import Markdown
+        
+        if response:
+            body = Markdown(response + (f"\n\n*{note}*" if note else ""))
+        else:
+            body = Text(note or "🤔 Gemma is thinking...", style="dim")
+        return Panel(
+            body,
+            title="[bold cyan]🤖 Gemma[/bold cyan]",
+            border_style="cyan"
+        )
+    
+    def send_message(self, message, use_cache=True):
+        """
+        Send message to Gemma and show the response while it is generated.
+        
+        A repeated question is answered from the response cache unless
+        use_cache is False; the fresh reply then replaces the cached one.
+        """
+        import ollama
+        from rich.live import Live
+        
+        started = time.perf_counter()
+        parts = []
+        note = None
+        final = None
+        
+        if self.warmup_error is not None:
+            self.console.print(f"[yellow]Model warm-up failed: {self.warmup_error}[/yellow]")
+            self.warmup_error = None
+        self.report_embedding_error()
+        
+        self.ensure_conversation(message)
+        if self.context_full(message):
+            self.compact_context()
+        
+        arguments = self.generate_arguments(message)
+        cache_key = self.response_cache_key(arguments)
+        cached = self.cached_response(cache_key) if use_cache else None
+        
+        # The embedding is needed up front only to look for similar questions;
+        # otherwise it is made once the reply is on screen
+        vector = None
+        if cached is None and use_cache and cache_key is not None and self.similar_threshold is not None:
+            vector = self.embed(message)
+            cached = self.similar_cached_response(arguments, message, vector)
+        
+        if cached is not None:
+            response, context, prompt = cached
+            self.console.print(self.response_panel(response))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.finish_cached_turn(message, response, context, vector if vector is not None else self.embed(message))
+            self.display_cache_hit(elapsed_ms, message, prompt)
+            return response
+        
         try:
-            with self.console.status("[bold blue]🤔 Gemma is thinking..."):
-                response = ollama.generate(model=self.model, prompt=message)
-                assistant_response = response['response']
-            
-            # Save to history
-            self.save_to_history(message, assistant_response)
-            return assistant_response
-            
+            stream = ollama.generate(**arguments, stream=True)
+            with Live(self.response_panel(""), console=self.console, auto_refresh=False,
+                      vertical_overflow="visible") as live:
+                try:
+                    last_refresh = 0.0
+                    for chunk in stream:
+                        parts.append(chunk['response'])
+                        if chunk.get('done'):
+                            final = chunk
+                        now = time.monotonic()
+                        if now - last_refresh >= 1 / STREAM_REFRESH_PER_SECOND:
+                            live.update(self.response_panel(''.join(parts)), refresh=True)
+                            last_refresh = now
+                except KeyboardInterrupt:
+                    # Ctrl+C stops this response only; what arrived so far is kept
+                    note = "(interrupted)"
+                finally:
+                    # Closing the stream ends the request, so Ollama stops generating
+                    stream.close()
+                    live.update(self.response_panel(''.join(parts), note), refresh=True)
+        
         except Exception as e:
             error_msg = f"Error: {e}"
             self.console.print(f"[red]{error_msg}[/red]")
-            return error_msg
+            if not parts:
+                return error_msg
+            note = "(incomplete)"
+        
+        if vector is None:
+            vector = self.embed(message)
+        assistant_response, stats = self.finish_turn(message, parts, note, final, cache_key, vector)
+        self.display_turn_stats(stats)
+        return assistant_response
     
-    def save_to_history(self, user_message, assistant_response):
-        """Save conversation to SQLite database"""
-        # TODO: Add user session tracking
-        # TODO: Add conversation threading
+    def context_full(self, message):
+        """Whether the thread's context has no room left for another turn"""
+        return bool(self.context) and len(self.context) + len(message) // 3 > CONTEXT_WINDOW * CONTEXT_BUDGET
+    
+    def generate_arguments(self, message, **options):
+        """Arguments for ollama.generate to continue the current thread with message"""
+        prompt = message
+        if self.preamble:
+            prompt = f"{self.preamble}\n\n{message}"
+        # Only the new prompt is evaluated; earlier turns come from the context
+        return {'model': self.model, 'prompt': prompt, 'context': self.context or None,
+                'options': {'num_ctx': CONTEXT_WINDOW, **options}, 'keep_alive': KEEP_ALIVE}
+    
+    def finish_turn(self, message, parts, note, final, cache_key=None, vector=None):
+        """
+        Record a finished (or cut short) turn, with the message's embedding
+        if there is one; a finished reply is also cached under cache_key.
+        
+        Returns the response as saved and the turn's prompt statistics
+        (None when Ollama did not finish the turn).
+        """
+        assistant_response = ''.join(parts)
+        if note:
+            assistant_response += f"\n\n{note}"
+        
+        # An interrupted turn returns no context; the thread keeps the previous one
+        stats = None
+        if final is not None and final.get('context'):
+            self.context = list(final['context'])
+            self.preamble = None
+            stats = {
+                'prompt_tokens': final.get('prompt_eval_count') or 0,
+                'prompt_ms': (final.get('prompt_eval_duration') or 0) / 1e6,
+                'context_tokens': len(self.context)
+            }
+        
+        # Save to history
+        self.save_to_history(message, assistant_response, vector=vector)
+        if cache_key is not None and stats is not None and not note:
+            self.cache_response(cache_key, message, assistant_response, vector)
+        return assistant_response, stats
+    
+    def finish_cached_turn(self, message, response, context, vector=None):
+        """Record a turn answered from the response cache"""
+        # The cached context continues the thread as if Gemma had just replied
+        self.context = list(array('i', context)) if context else None
+        self.preamble = None
+        self.save_to_history(message, response, cached=True, vector=vector)
+    
+    def response_cache_key(self, arguments):
+        """
+        Response cache key for ollama.generate arguments: model, options and
+        normalized prompt. None when the reply depends on earlier turns.
+        """
+        if arguments['context']:
+            return None
+        return prompt_cache_key(arguments, arguments['prompt'])
+    
+    def cached_response(self, cache_key):
+        """The cached (response, context, prompt) for a key unless missing or expired; counted for /cache"""
+        if cache_key is None:
+            return None
+        
+        now = datetime.now()
+        with self.transaction() as conn:
+            row = conn.execute('''
+                SELECT response, context, prompt FROM response_cache WHERE key = ? AND created > ?
+            ''', (cache_key, (now - CACHE_TTL).isoformat())).fetchone()
+            conn.execute("UPDATE response_cache_stats SET lookups = lookups + 1, hits = hits + ?",
+                         (row is not None,))
+            if row is not None:
+                conn.execute("UPDATE response_cache SET hits = hits + 1, last_used = ? WHERE key = ?",
+                             (now.isoformat(), cache_key))
+        return row
+    
+    def similar_cached_response(self, arguments, message, vector):
+        """
+        The cached (response, context, prompt) for the most similar earlier
+        question, if it is at least similar_threshold alike and was asked
+        with the same model and options; counted as a hit for /cache.
+        """
+        if vector is None or self.preamble:
+            return None
+        
+        self.refresh_index(self.cache_index, '''
+            SELECT id, key, vector FROM cache_embeddings WHERE model = ? AND id > ? ORDER BY id
+        ''', (EMBED_MODEL,))
+        
+        now = datetime.now()
+        for key, similarity in self.cache_index.search(vector, 5):
+            if similarity < self.similar_threshold:
+                break
+            row = self.conn.execute("SELECT response, context, prompt, created FROM response_cache WHERE key = ?",
+                                    (key,)).fetchone()
+            if row is None:
+                # Evicted since it was indexed
+                self.cache_index.discard(key)
+                continue
+            
+            response, context, prompt, created = row
+            # Same model and options: the key is the one this message would have had with that wording
+            if created <= (now - CACHE_TTL).isoformat() or prompt_cache_key(arguments, prompt) != key:
+                continue
+            with self.transaction() as conn:
+                conn.execute("UPDATE response_cache_stats SET hits = hits + 1")
+                conn.execute("UPDATE response_cache SET hits = hits + 1, last_used = ? WHERE key = ?",
+                             (now.isoformat(), key))
+            return response, context, prompt
+        return None
+    
+    def cache_response(self, cache_key, message, response, vector=None):
+        """Cache a reply with the context it left, then evict down to CACHE_MAX_BYTES"""
+        now = datetime.now()
+        context = array('i', self.context).tobytes() if self.context else None
+        size = len(response.encode('utf-8')) + len(context or b'')
+        with self.transaction() as conn:
+            # A refreshed reply (/fresh) keeps the hit count of the one it replaces
+            conn.execute('''
+                INSERT INTO response_cache (key, prompt, response, context, size, created, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET response = excluded.response, context = excluded.context,
+                    size = excluded.size, created = excluded.created, last_used = excluded.last_used
+            ''', (cache_key, normalize_prompt(message), response, context, size,
+                  now.isoformat(), now.isoformat()))
+            if vector is not None:
+                conn.execute("INSERT OR IGNORE INTO cache_embeddings (key, model, vector) VALUES (?, ?, ?)",
+                             (cache_key, EMBED_MODEL, vector.tobytes()))
+            
+            # Expired replies go first, then the least recently used until the rest fits
+            conn.execute("DELETE FROM response_cache WHERE created <= ?", ((now - CACHE_TTL).isoformat(),))
+            conn.execute('''
+                DELETE FROM response_cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS total
+                        FROM response_cache
+                    ) WHERE total > ?
+                )
+            ''', (CACHE_MAX_BYTES,))
+    
+    def cache_stats(self, clear=False):
+        """Response cache size and hit rate, after emptying the cache if clear is set"""
+        if clear:
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM response_cache")
+                conn.execute("UPDATE response_cache_stats SET lookups = 0, hits = 0")
+        
+        entries, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        lookups, hits = self.conn.execute("SELECT lookups, hits FROM response_cache_stats").fetchone()
+        top = self.conn.execute(
+            "SELECT prompt, hits FROM response_cache WHERE hits > 0 ORDER BY hits DESC LIMIT 5").fetchall()
+        return {'entries': entries, 'bytes': size, 'lookups': lookups, 'hits': hits, 'top': top}
+    
+    def display_cache_hit(self, elapsed_ms, message, prompt):
+        """One dim line saying the reply came from the response cache, and for which question"""
+        similar = f" for \"{prompt}\"" if prompt != normalize_prompt(message) else ""
+        self.console.print(Text(f"⚡ Answered from the response cache{similar} in {elapsed_ms:.0f} ms "
+                                f"(/fresh <message> asks Gemma again)", style="dim"))
+    
+    def display_cache_stats(self, stats):
+        """Show the response cache's size, hit rate and most repeated questions"""
+        rate = stats['hits'] / stats['lookups'] * 100 if stats['lookups'] else 0.0
+        self.console.print(f"[cyan]⚡ Response cache: {stats['entries']} replies, "
+                           f"{stats['bytes'] / 1024:.0f}/{CACHE_MAX_BYTES // 1024} KB · "
+                           f"{stats['hits']} of {stats['lookups']} lookups answered ({rate:.0f}%)[/cyan]")
+        for prompt, hits in stats['top']:
+            self.console.print(Text(f"  {hits}× ", style="green") + self.display_text(prompt, 60))
+    
+    def display_turn_stats(self, stats):
+        """One dim line on how much of the turn Ollama had to evaluate"""
+        if stats:
+            self.console.print(
+                f"[dim]{stats['prompt_tokens']} prompt tokens evaluated in {stats['prompt_ms']:.0f} ms · "
+                f"context {stats['context_tokens']}/{CONTEXT_WINDOW} tokens[/dim]")
+    
+    def ensure_conversation(self, first_message):
+        """Start a thread, titled after its first message, unless one is active"""
+        if self.conversation_id is not None:
+            return
+        now = datetime.now().isoformat()
+        title = ' '.join(first_message.split())[:40]
+        cursor = self.conn.execute('''
+            INSERT INTO conversations (title, created, updated, model, user_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (title, now, now, self.model, self.user_id))
+        self.conversation_id = cursor.lastrowid
+    
+    def new_conversation(self):
+        """Leave the current thread; the next message starts a new one"""
+        self.conversation_id = None
+        self.context = None
+        self.preamble = None
+    
+    def switch_conversation(self, conversation_id):
+        """Continue an earlier thread where it left off"""
+        row = self.conn.execute('''
+            SELECT model, context, summary FROM conversations WHERE id = ? AND user_id = ?
+        ''', (conversation_id, self.user_id)).fetchone()
+        if row is None:
+            return False
+        
+        model, context, summary = row
+        self.conversation_id = conversation_id
+        self.context = None
+        self.preamble = None
+        if context and model == self.model:
+            self.context = array('i', context).tolist()
+        elif summary:
+            self.preamble = f"Summary of our conversation so far: {summary}"
+        else:
+            # Context tokens from another model are meaningless to this one
+            self.preamble = self.replay_preamble()
+        return True
+    
+    def list_conversations(self, limit=20):
+        """Recent threads with their number of turns"""
+        cursor = self.conn.execute('''
+            SELECT c.id, c.updated, c.title, COUNT(h.id)
+            FROM conversations c
+            LEFT JOIN chat_history h ON h.conversation_id = c.id
+            WHERE c.user_id = ?
+            GROUP BY c.id
+            ORDER BY c.updated DESC
+            LIMIT ?
+        ''', (self.user_id, limit))
+        return cursor.fetchall()
+    
+    def compact_context(self):
+        """
+        Replace a context that filled its token budget with a summary.
+        
+        The model summarizes the thread from its own context; the summary
+        then opens a fresh context with the next message. If that fails,
+        the most recent turns are replayed as text instead.
+        """
+        import ollama
+        
+        try:
+            with self.console.status("[bold blue]📝 Summarizing the conversation so far..."):
+                response = ollama.generate(**self.summary_arguments())
+            summary = response['response'].strip()
+        except Exception as e:
+            self.console.print(f"[yellow]Could not summarize the conversation ({e}); keeping recent turns[/yellow]")
+            summary = None
+        
+        self.apply_summary(summary)
+    
+    def summary_arguments(self):
+        """Arguments for ollama.generate to summarize the thread from its context"""
+        return {'model': self.model, 'prompt': SUMMARY_PROMPT, 'context': self.context,
+                'options': {'num_ctx': CONTEXT_WINDOW}, 'keep_alive': KEEP_ALIVE}
+    
+    def apply_summary(self, summary):
+        """Open a fresh context with the summary (or recent turns if there is none)"""
+        self.context = None
+        self.preamble = (f"Summary of our conversation so far: {summary}" if summary
+                         else self.replay_preamble())
+        self.conn.execute("UPDATE conversations SET context = NULL, summary = ? WHERE id = ?",
+                          (summary, self.conversation_id))
+    
+    def replay_preamble(self):
+        """The latest turns of the current thread as text, within REPLAY_CHARS"""
+        cursor = self.conn.execute('''
+            SELECT user_message, assistant_response FROM chat_history
+            WHERE conversation_id = ?
+            ORDER BY id DESC
+        ''', (self.conversation_id,))
+        
+        turns = []
+        used = 0
+        for user_message, assistant_response in cursor:
+            turn = f"User: {user_message}\nAssistant: {assistant_response}"
+            if used + len(turn) > REPLAY_CHARS:
+                break
+            turns.append(turn)
+            used += len(turn)
+        
+        if not turns:
+            return None
+        return "Our conversation so far:\n\n" + "\n\n".join(reversed(turns))
+    
+    def save_to_history(self, user_message, assistant_response, cached=False, vector=None):
+        """Save conversation to SQLite database, with the message's embedding if there is one"""
         # TODO: Add message categorization
-        # TODO: Add full-text search indexing
         
-        conn = sqlite3.connect(self.db_path)
-        conn.execute('''
-            INSERT INTO chat_history (timestamp, user_message, assistant_response)
-            VALUES (?, ?, ?)
-        ''', (datetime.now().isoformat(), user_message, assistant_response))
-        conn.commit()
-        conn.close()
+        # Statements are reused from the connection's statement cache
+        now = datetime.now().isoformat()
+        context = array('i', self.context).tobytes() if self.context else None
+        with self.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO chat_history (timestamp, user_message, assistant_response, conversation_id,
+                                          user_id, cached)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (now, user_message, assistant_response, self.conversation_id, self.user_id, cached))
+            if vector is not None:
+                conn.execute("INSERT INTO turn_embeddings (turn_id, user_id, model, vector) VALUES (?, ?, ?, ?)",
+                             (cursor.lastrowid, self.user_id, EMBED_MODEL, vector.tobytes()))
+            if self.conversation_id is not None:
+                conn.execute('''
+                    UPDATE conversations SET updated = ?, model = ?, context = ? WHERE id = ?
+                ''', (now, self.model, context, self.conversation_id))
+    
+    def embed_arguments(self, text):
+        """Arguments for ollama.embed"""
+        return {'model': EMBED_MODEL, 'input': text, 'keep_alive': KEEP_ALIVE}
+    
+    def embed(self, text):
+        """Unit-length embedding of text, or None once embeddings turned out to be unavailable"""
+        if not self.embeddings_enabled:
+            return None
+        try:
+            import ollama
+            return unit_vector(ollama.embed(**self.embed_arguments(text))['embeddings'][0])
+        except Exception as e:
+            # Includes a missing numpy; chat goes on without semantic features
+            self.disable_embeddings(e)
+            return None
+    
+    def disable_embeddings(self, error):
+        """Stop embedding for the rest of the session; the error is reported once"""
+        self.embeddings_enabled = False
+        self.embedding_error = error
+    
+    def report_embedding_error(self):
+        if self.embedding_error is not None:
+            self.console.print(f"[yellow]Semantic search is off: {self.embedding_error}[/yellow]")
+            self.console.print(f"[yellow]💡 It needs numpy and: ollama pull {EMBED_MODEL}[/yellow]")
+            self.embedding_error = None
+    
+    def refresh_index(self, index, query, params):
+        """Append embeddings stored since the index was last read; query selects (id, item, vector)"""
+        import numpy as np
+        
+        rows = self.conn.execute(query, (*params, index.last_id)).fetchall()
+        if rows:
+            vectors = np.frombuffer(b''.join(row[2] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            index.append([row[1] for row in rows], vectors)
+            index.last_id = rows[-1][0]
+    
+    def similar_history(self, vector, limit=10):
+        """This user's turns with the questions closest in meaning to an embedding, best first"""
+        self.refresh_index(self.history_index, '''
+            SELECT turn_id, turn_id, vector FROM turn_embeddings
+            WHERE user_id = ? AND model = ? AND turn_id > ?
+            ORDER BY turn_id
+        ''', (self.user_id, EMBED_MODEL))
+        
+        rows = []
+        for turn_id, _ in self.history_index.search(vector, limit):
+            row = self.conn.execute('''
+                SELECT timestamp, user_message, assistant_response, cached FROM chat_history WHERE id = ?
+            ''', (turn_id,)).fetchone()
+            if row is not None:
+                rows.append(row)
+        return rows
+    
+    def search_similar(self, query):
+        """Turns whose questions mean much the same as query (None without embeddings)"""
+        vector = self.embed(query)
+        if vector is None:
+            return None
+        return self.similar_history(vector)
     
     def search_history(self, query):
-        """Search chat history with keywords"""
+        """Search chat history with keywords, best matches first"""
         # TODO: Implement advanced search (date range, regex, categories)
-        # TODO: Add search result ranking
-        # TODO: Add search highlighting
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.execute('''
-            SELECT timestamp, user_message, assistant_response 
+        match = fts_query(query) if self.fts_enabled else ''
+        if match:
+            # bm25 ranking with the matching words highlighted in short snippets
+            cursor = self.conn.execute(f'''
+                SELECT h.timestamp,
+                       snippet(chat_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 6),
+                       snippet(chat_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 10),
+                       h.cached
+                FROM chat_fts
+                JOIN chat_history h ON h.id = chat_fts.rowid
+                WHERE chat_fts MATCH ? AND h.user_id = ?
+                ORDER BY bm25(chat_fts)
+                LIMIT 20
+            ''', (match, self.user_id))
+            return cursor.fetchall()
+        
+        # Fallback without FTS5: substring scan over the whole history
+        pattern = '%' + re.sub(r'([%_\\])', r'\\\1', query) + '%'
+        cursor = self.conn.execute('''
+            SELECT timestamp, user_message, assistant_response, cached
             FROM chat_history 
-            WHERE user_message LIKE ? OR assistant_response LIKE ?
+            WHERE (user_message LIKE ? ESCAPE '\\' OR assistant_response LIKE ? ESCAPE '\\')
+              AND user_id = ?
             ORDER BY timestamp DESC
             LIMIT 20
-        ''', (f'%{query}%', f'%{query}%'))
+        ''', (pattern, pattern, self.user_id))
         
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        return cursor.fetchall()
     
     def show_recent_history(self, limit=10):
         """Show recent chat history"""
@@ -174,17 +1000,15 @@ class GemmaChat:
         # TODO: Add date filtering
         # TODO: Add export functionality
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.execute('''
-            SELECT timestamp, user_message, assistant_response 
+        cursor = self.conn.execute('''
+            SELECT timestamp, user_message, assistant_response, cached
             FROM chat_history 
+            WHERE user_id = ?
             ORDER BY timestamp DESC 
             LIMIT ?
-        ''', (limit,))
+        ''', (self.user_id, limit))
         
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        return cursor.fetchall()
     
     def display_history(self, history_data, title="History"):
         """Display history in table format"""
@@ -197,21 +1021,53 @@ class GemmaChat:
         table.add_column("User", style="green", width=30)
         table.add_column("Gemma", style="cyan", width=50)
         
-        for timestamp, user_msg, assistant_msg in history_data:
-            # Truncate long messages
-            user_display = (user_msg[:25] + "...") if len(user_msg) > 25 else user_msg
-            assistant_display = (assistant_msg[:45] + "...") if len(assistant_msg) > 45 else assistant_msg
-            
+        for timestamp, user_msg, assistant_msg, cached in history_data:
             table.add_row(
                 timestamp.split('T')[1][:8],  # Time only
-                user_display,
-                assistant_display
+                self.display_text(user_msg, 25),
+                # ⚡ marks a reply served from the response cache
+                Text("⚡ ") + self.display_text(assistant_msg, 43) if cached else self.display_text(assistant_msg, 45)
             )
         
         self.console.print(table)
     
+    def display_conversations(self, conversations):
+        """Display conversation threads, the current one marked"""
+        if not conversations:
+            self.console.print("[yellow]🧵 No conversations yet[/yellow]")
+            return
+        
+        table = Table(title="Conversations", show_header=True, header_style="bold blue")
+        table.add_column("ID", style="green", justify="right")
+        table.add_column("Updated", style="dim", width=16)
+        table.add_column("Title", style="cyan", width=40)
+        table.add_column("Turns", justify="right")
+        
+        for conversation_id, updated, title, turns in conversations:
+            marker = " ◀" if conversation_id == self.conversation_id else ""
+            table.add_row(str(conversation_id), updated.replace('T', ' ')[:16],
+                          Text(title + marker), str(turns))
+        
+        self.console.print(table)
+    
+    def display_text(self, message, max_length):
+        """Truncate a message for the history table; search snippets get highlights instead"""
+        if HIGHLIGHT_START not in message:
+            # Truncate long messages
+            return Text((message[:max_length] + "...") if len(message) > max_length else message)
+        
+        text = Text()
+        for part in re.split(f'({HIGHLIGHT_START}.*?{HIGHLIGHT_END})', message):
+            if part.startswith(HIGHLIGHT_START):
+                text.append(part.strip(HIGHLIGHT_START + HIGHLIGHT_END), style="bold yellow")
+            else:
+                text.append(part)
+        return text
+    
     def display_welcome(self):
         """Display welcome message with educational notes"""
+        from rich.markdown import Markdown
+        
         welcome_text = """
 🤖 **Gemma 3 CLI Chat - Educational Starter Kit**
 
@@ -220,7 +1076,13 @@ class GemmaChat:
 **Commands:**
 - `/help` - Show help
 - `/history` - Show recent history
-- `/search <keyword>` - Search history
+- `/search <keyword>` - Search history ("phrase", prefix*)
+- `/similar <question>` - Find questions with the same meaning
+- `/new` - Start a new conversation
+- `/threads` - List conversations
+- `/switch <id>` - Continue an earlier conversation
+- `/fresh <message>` - Ask Gemma, skipping the response cache
+- `/cache [clear]` - Response cache hit rate (or empty it)
 - `/clear` - Clear screen
 - `/exit` or `/quit` - Exit
 
@@ -239,6 +1101,7 @@ class GemmaChat:
 - Authentication system
 
 **Multi-User Setup:**
+- One shared server: `--serve`, then `--connect` from each account
 - Experiment with SSH access from various devices
 - Test limits and learn resource management
 - Perfect for hands-on learning environments
@@ -261,10 +1124,16 @@ class GemmaChat:
         commands = [
             ("/help", "Show this help", "Context-sensitive help, tutorials"),
             ("/history [num]", "Show recent history", "Pagination, date filters, export"),
-            ("/search <keyword>", "Search history", "Advanced search, regex, ranking"),
+            ("/search <keyword>", "Search history: words, \"phrases\", prefix*", "Date ranges, categories"),
+            ("/similar <question>", "Find earlier questions by meaning", "Search answers too, clustering"),
             ("/clear", "Clear screen", "Theme switching, layout options"),
             ("/exit, /quit", "Exit app", "Session saving, graceful shutdown"),
-            ("Regular message", "Chat with Gemma", "Conversation threading, context")
+            ("/new", "Start a new conversation", "Thread titles, tags"),
+            ("/threads", "List conversations", "Search within a thread"),
+            ("/switch <id>", "Continue an earlier conversation", "Branching, export"),
+            ("/fresh <message>", "Ask Gemma again instead of using the cache", "Expiry per topic"),
+            ("/cache [clear]", "Response cache hit rate, or empty it", "Per-class caches, preloaded answers"),
+            ("Regular message", "Chat with Gemma (remembers the conversation)", "System prompts, personas")
         ]
         
         for cmd, desc, todo in commands:
@@ -282,14 +1151,19 @@ class GemmaChat:
         self.console.print("7. Add system monitoring and resource usage")
         self.console.print("8. Create multi-language support")
     
-    def run(self):
+    def run(self, show_timing=False):
         """Main application loop"""
         # Connection check
         if not self.check_ollama_connection():
             return
         
+        # The model loads while the welcome screen renders and the user types
+        self.start_warmup()
         self.display_welcome()
         
+        if show_timing:
+            self.console.print(f"[dim]⏱ Ready in {(time.perf_counter() - STARTED) * 1000:.0f} ms[/dim]")
+        
         try:
             while True:
                 # User input
@@ -326,6 +1200,45 @@ class GemmaChat:
                             results = self.search_history(args)
                             self.display_history(results, f"Search Results: '{args}'")
                     
+                    elif command == '/similar':
+                        if not args:
+                            self.console.print("[red]❌ Please enter a question: /similar how do plants eat[/red]")
+                        else:
+                            results = self.search_similar(args)
+                            if results is None:
+                                self.console.print("[yellow]Semantic search is unavailable - "
+                                                   f"it needs numpy and: ollama pull {EMBED_MODEL}[/yellow]")
+                            else:
+                                self.display_history(results, f"Similar Questions: '{args}'")
+                    
+                    elif command == '/new':
+                        self.new_conversation()
+                        self.console.print("[green]🧵 New conversation - Gemma starts fresh[/green]")
+                    
+                    elif command == '/threads':
+                        self.display_conversations(self.list_conversations())
+                    
+                    elif command == '/switch':
+                        try:
+                            if self.switch_conversation(int(args)):
+                                self.console.print(f"[green]🧵 Continuing conversation {int(args)}[/green]")
+                            else:
+                                self.console.print(f"[red]❌ No conversation {int(args)}[/red]")
+                        except ValueError:
+                            self.console.print("[red]❌ Please enter a conversation id: /switch 3[/red]")
+                    
+                    elif command == '/fresh':
+                        if not args:
+                            self.console.print("[red]❌ Please enter a message: /fresh what is photosynthesis[/red]")
+                        else:
+                            self.send_message(args, use_cache=False)
+                    
+                    elif command == '/cache':
+                        if args not in ('', 'clear'):
+                            self.console.print("[red]❌ Use /cache or /cache clear[/red]")
+                        else:
+                            self.display_cache_stats(self.cache_stats(clear=args == 'clear'))
+                    
                     elif command == '/clear':
                         os.system('clear' if os.name == 'posix' else 'cls')
                         self.display_welcome()
@@ -335,36 +1248,563 @@ class GemmaChat:
                         self.console.print("[yellow]💡 Type /help for available commands[/yellow]")
                 
                 else:
-                    # Regular chat
-                    response = self.send_message(user_input)
-                    
-                    # Display Gemma's response
-                    response_panel = Panel(
-                        Markdown(response),
-                        title="[bold cyan]🤖 Gemma[/bold cyan]",
-                        border_style="cyan"
-                    )
-                    self.console.print(response_panel)
+                    # Regular chat; the response is displayed while it streams in
+                    self.send_message(user_input)
         
         except KeyboardInterrupt:
             self.console.print("\n[yellow]👋 Interrupted with Ctrl+C[/yellow]")
         except Exception as e:
             self.console.print(f"\n[red]❌ Unexpected error: {e}[/red]")
+        finally:
+            self.close()
+
+class ChatJob:
+    """One message waiting for (or being answered by) the model"""
+    
+    def __init__(self, connection, text, vector=None):
+        self.connection = connection
+        self.text = text
+        self.vector = vector
+        self.task = None
+
+class ChatServer:
+    """
+    Multi-user chat server: many sessions, one process, one Ollama model.
+    
+    Clients connect over a Unix socket (users are identified by the
+    socket's peer credentials, so each Ubuntu account gets its own history)
+    or over TCP (users name themselves; only for trusted networks). The
+    protocol is one JSON object per line; see ChatClient.
+    
+    Messages wait in per-user queues. Generation slots (max_inflight) are
+    handed out round-robin across the users with waiting messages, so a user
+    who sends many messages cannot push everyone else back, and each reply
+    is capped at SERVER_MAX_TOKENS so no single turn holds a slot for long.
+    All sessions share one SQLite connection and one ollama.AsyncClient.
+    """
+    
+    def __init__(self, db_path="chat_history.db", socket_path=SERVER_SOCKET, host=None, port=None,
+                 max_inflight=SERVER_MAX_INFLIGHT, max_queued=SERVER_MAX_QUEUED, similar_threshold=None):
+        self.console = Console()
+        self.similar_threshold = similar_threshold
+        self.db_path = db_path
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.database = None
+        self.client = None
+        
+        # Round-robin scheduling state: waiting jobs per user, and the users
+        # that have any, in the order they will be served
+        self.queues = {}
+        self.ready = []
+        self.inflight = 0
+    
+    def run(self):
+        """Serve until interrupted"""
+        import asyncio
+        
+        # Opens the database and applies migrations; sessions share its connection
+        self.database = GemmaChat(self.db_path)
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            self.console.print("\n[yellow]👋 Server stopped[/yellow]")
+        finally:
+            self.database.close()
+    
+    async def serve(self):
+        import asyncio
+        import ollama
+        
+        self.client = ollama.AsyncClient()
+        if self.port is not None:
+            server = await asyncio.start_server(self.handle_connection, self.host or "127.0.0.1", self.port)
+            where = f"{self.host or '127.0.0.1'}:{self.port}"
+        else:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            server = await asyncio.start_unix_server(self.handle_connection, self.socket_path)
+            # Every local account may connect; the peer credentials tell them apart
+            os.chmod(self.socket_path, 0o666)
+            where = self.socket_path
+        
+        self.console.print(f"[green]✅ Chat server on {where} - {self.database.model}, "
+                           f"{self.max_inflight} generation(s) at a time[/green]")
+        async with server:
+            await server.serve_forever()
+    
+    def peer_user(self, writer):
+        """OS user on the other end of a Unix socket (None for TCP or where unsupported)"""
+        sock = writer.get_extra_info('socket')
+        if sock is None or sock.family != getattr(socket, 'AF_UNIX', None) or not hasattr(socket, 'SO_PEERCRED'):
+            return None
+        import pwd
+        import struct
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', credentials)
+        try:
+            return pwd.getpwuid(uid).pw_name
+        except KeyError:
+            return f"uid{uid}"
+    
+    async def handle_connection(self, reader, writer):
+        """One client connection: a session for its user, until it disconnects"""
+        user = self.peer_user(writer)
+        connection = {'writer': writer, 'session': None, 'job': None}
+        
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    kind = request['type']
+                except (ValueError, KeyError, TypeError):
+                    await self.send(connection, {'type': 'error', 'message': 'Invalid request'})
+                    continue
+                
+                try:
+                    user = await self.dispatch(connection, user, kind, request)
+                except ConnectionError:
+                    raise
+                except (ValueError, TypeError) as e:
+                    await self.send(connection, {'type': 'error', 'message': f"Invalid request: {e}"})
+                except Exception as e:
+                    # One bad request must not take the whole connection down
+                    self.console.print(f"[red]Request from {user or 'unknown user'} failed: {e}[/red]")
+                    await self.send(connection, {'type': 'error', 'message': 'The request failed'})
+        except ConnectionError:
+            pass
+        finally:
+            self.cancel(connection)
+            writer.close()
+            if connection['session'] is not None:
+                self.console.print(f"[dim]{connection['session'].user} disconnected[/dim]")
+    
+    async def dispatch(self, connection, user, kind, request):
+        """Carry out one request; returns the connection's user, which hello settles"""
+        if kind == 'hello':
+            # The peer's OS account wins over the name the client claims
+            user = user or str(request.get('user') or 'guest')[:64]
+            session = GemmaChat(user=user, conn=self.database.conn)
+            session.model = self.database.model
+            session.similar_threshold = self.similar_threshold
+            # One index of cached questions serves every session
+            session.cache_index = self.database.cache_index
+            connection['session'] = session
+            self.console.print(f"[dim]{user} connected[/dim]")
+            await self.send(connection, {'type': 'hello', 'user': user, 'model': session.model})
+        elif connection['session'] is None:
+            await self.send(connection, {'type': 'error', 'message': 'Say hello first'})
+        elif kind == 'message':
+            await self.submit(connection, str(request.get('text', '')), request.get('cache', True))
+        elif kind == 'cancel':
+            self.cancel(connection)
+        elif kind == 'similar':
+            vector = await self.embed(str(request.get('query', '')))
+            if vector is None:
+                await self.send(connection, {'type': 'error', 'message': 'Semantic search is unavailable'})
+            else:
+                await self.send(connection, {'type': 'rows',
+                                             'rows': connection['session'].similar_history(vector)})
+        else:
+            await self.send(connection, self.answer(connection['session'], kind, request))
+        return user
+    
+    @staticmethod
+    def integer_field(request, name, default):
+        """An integer field of a request; ValueError names the field when it is not one"""
+        value = request.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"{name} must be an integer")
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer") from None
+    
+    def answer(self, session, kind, request):
+        """Reply to a history or thread request; these never wait for the model"""
+        if kind == 'history':
+            limit = self.integer_field(request, 'limit', 10)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            return {'type': 'rows', 'rows': session.show_recent_history(limit)}
+        if kind == 'search':
+            return {'type': 'rows', 'rows': session.search_history(str(request.get('query', '')))}
+        if kind == 'threads':
+            return {'type': 'rows', 'rows': session.list_conversations(),
+                    'conversation_id': session.conversation_id}
+        if kind == 'new':
+            session.new_conversation()
+            return {'type': 'ok', 'conversation_id': None}
+        if kind == 'switch':
+            found = session.switch_conversation(self.integer_field(request, 'id', 0))
+            return {'type': 'ok' if found else 'error', 'message': 'No such conversation',
+                    'conversation_id': session.conversation_id}
+        if kind == 'cache':
+            return {'type': 'cache', 'stats': session.cache_stats(clear=bool(request.get('clear')))}
+        return {'type': 'error', 'message': f"Unknown request: {kind}"}
+    
+    async def send(self, connection, event):
+        writer = connection['writer']
+        writer.write(json.dumps(event).encode('utf-8') + b'\n')
+        await writer.drain()
+    
+    async def submit(self, connection, text, use_cache=True):
+        """Answer a message from the response cache, or queue it behind the user's earlier ones"""
+        session = connection['session']
+        user = session.user
+        if connection['job'] is not None:
+            await self.send(connection, {'type': 'error', 'message': 'A reply is still being generated'})
+            return
+        
+        # Cache hits need no generation slot, so they never wait in line
+        vector = None
+        if use_cache:
+            arguments = session.generate_arguments(text, num_predict=SERVER_MAX_TOKENS)
+            cache_key = session.response_cache_key(arguments)
+            cached = session.cached_response(cache_key)
+            if cached is None and cache_key is not None and self.similar_threshold is not None:
+                vector = await self.embed(text)
+                cached = session.similar_cached_response(arguments, text, vector)
+            
+            if cached is not None:
+                response, context, prompt = cached
+                if vector is None:
+                    vector = await self.embed(text)
+                # Threads start with an answered message; a queued one starts it in generate()
+                session.ensure_conversation(text)
+                session.finish_cached_turn(text, response, context, vector)
+                await self.send(connection, {'type': 'token', 'text': response})
+                await self.send(connection, {'type': 'done', 'note': None, 'stats': None, 'cached': True,
+                                             'prompt': prompt, 'conversation_id': session.conversation_id})
+                return
+        
+        queue = self.queues.setdefault(user, [])
+        if len(queue) >= self.max_queued:
+            await self.send(connection, {'type': 'error', 'message': 'Too many messages waiting, try again soon'})
+            return
+        
+        job = ChatJob(connection, text, vector)
+        connection['job'] = job
+        queue.append(job)
+        if user not in self.ready:
+            self.ready.append(user)
+        self.schedule()
+        
+        if job.task is None:
+            # Users served before this one in the current round
+            await self.send(connection, {'type': 'queued', 'position': self.ready.index(user) + 1})
+    
+    def schedule(self):
+        """Start waiting jobs, one user at a time, while generation slots are free"""
+        import asyncio
+        
+        while self.inflight < self.max_inflight and self.ready:
+            user = self.ready.pop(0)
+            queue = self.queues[user]
+            job = queue.pop(0)
+            if queue:
+                # Back of the line until every other waiting user had a turn
+                self.ready.append(user)
+            else:
+                del self.queues[user]
+            
+            self.inflight += 1
+            job.task = asyncio.create_task(self.generate(job))
+            job.task.add_done_callback(self.job_finished)
+    
+    def job_finished(self, task):
+        self.inflight -= 1
+        self.schedule()
+    
+    def cancel(self, connection):
+        """Stop the connection's job: drop it from its queue, or interrupt its generation"""
+        job = connection['job']
+        if job is None:
+            return
+        if job.task is not None:
+            job.task.cancel()
+            return
+        
+        user = connection['session'].user
+        queue = self.queues.get(user, [])
+        if job in queue:
+            queue.remove(job)
+            if not queue:
+                del self.queues[user]
+                self.ready.remove(user)
+        connection['job'] = None
+        
+        writer = connection['writer']
+        if not writer.is_closing():
+            writer.write(json.dumps({'type': 'done', 'note': '(cancelled)'}).encode('utf-8') + b'\n')
+    
+    async def generate(self, job):
+        """Stream one reply to its client and record the turn"""
+        import asyncio
+        
+        connection = job.connection
+        session = connection['session']
+        parts = []
+        note = None
+        final = None
+        cache_key = None
+        
+        try:
+            session.ensure_conversation(job.text)
+            if session.context_full(job.text):
+                try:
+                    response = await self.client.generate(**session.summary_arguments())
+                    summary = response['response'].strip()
+                except Exception:
+                    summary = None
+                session.apply_summary(summary)
+            
+            arguments = session.generate_arguments(job.text, num_predict=SERVER_MAX_TOKENS)
+            cache_key = session.response_cache_key(arguments)
+            stream = await self.client.generate(**arguments, stream=True)
+            try:
+                async for chunk in stream:
+                    parts.append(chunk['response'])
+                    if chunk.get('done'):
+                        final = chunk
+                    await self.send(connection, {'type': 'token', 'text': chunk['response']})
+            finally:
+                # Closing the stream ends the request, so Ollama stops generating
+                await stream.aclose()
+        except asyncio.CancelledError:
+            note = "(interrupted)"
+        except Exception as e:
+            note = "(incomplete)"
+            if not parts:
+                connection['job'] = None
+                await self.send_quietly(connection, {'type': 'error', 'message': f"Error: {e}"})
+                return
+        
+        vector = job.vector
+        if vector is None:
+            try:
+                vector = await self.embed(job.text)
+            except asyncio.CancelledError:
+                # Cancelled after the reply was complete: save the turn without it
+                pass
+        
+        connection['job'] = None
+        _, stats = session.finish_turn(job.text, parts, note, final, cache_key, vector)
+        await self.send_quietly(connection, {'type': 'done', 'note': note, 'stats': stats,
+                                             'conversation_id': session.conversation_id})
+    
+    async def embed(self, text):
+        """GemmaChat.embed without blocking the other sessions"""
+        if not self.database.embeddings_enabled:
+            return None
+        try:
+            response = await self.client.embed(**self.database.embed_arguments(text))
+            return unit_vector(response['embeddings'][0])
+        except Exception as e:
+            self.database.disable_embeddings(e)
+            self.console.print(f"[yellow]Semantic search is off: {e}[/yellow]")
+            return None
+    
+    async def send_quietly(self, connection, event):
+        """Send, ignoring a client that has gone away"""
+        try:
+            await self.send(connection, event)
+        except ConnectionError:
+            pass
+
+class ChatClient(GemmaChat):
+    """
+    Thin terminal client for ChatServer.
+    
+    Reuses GemmaChat's command loop and display; history, threads and
+    replies come from the server instead of a local database and Ollama.
+    """
+    
+    def __init__(self, address=SERVER_SOCKET, user=None):
+        self.console = Console()
+        self.address = address
+        self.user = user or local_user_name()
+        self.model = None
+        self.conversation_id = None
+        self.sock = None
+        self.stream = None
+    
+    def check_ollama_connection(self):
+        """Connect to the server instead of Ollama"""
+        try:
+            if ':' in self.address and not self.address.startswith('/'):
+                host, port = self.address.rsplit(':', 1)
+                self.sock = socket.create_connection((host, int(port)))
+            else:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(self.address)
+            self.stream = self.sock.makefile('rwb')
+            hello = self.request({'type': 'hello', 'user': self.user})
+        except (OSError, ValueError) as e:
+            self.console.print(f"[red]❌ Cannot reach the chat server at {self.address}: {e}[/red]")
+            self.console.print("[yellow]💡 Start one with: python cli-chat.py --serve[/yellow]")
+            return False
+        
+        self.user = hello['user']
+        self.model = hello['model']
+        self.console.print(f"[green]✅ Connected to {self.address} as {self.user} - {self.model}[/green]")
+        return True
+    
+    def start_warmup(self):
+        """The server keeps the model loaded"""
+    
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+    
+    def send(self, event):
+        self.stream.write(json.dumps(event).encode('utf-8') + b'\n')
+        self.stream.flush()
+    
+    def receive(self):
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("the server closed the connection")
+        return json.loads(line)
+    
+    def request(self, event):
+        self.send(event)
+        return self.receive()
+    
+    def send_message(self, message, use_cache=True):
+        """Send a message and show the reply while the server streams it"""
+        from rich.live import Live
+        
+        started = time.perf_counter()
+        parts = []
+        note = None
+        stats = None
+        cached = None
+        
+        self.send({'type': 'message', 'text': message, 'cache': use_cache})
+        with Live(self.response_panel(""), console=self.console, auto_refresh=False,
+                  vertical_overflow="visible") as live:
+            last_refresh = 0.0
+            while True:
+                try:
+                    event = self.receive()
+                except KeyboardInterrupt:
+                    # Ctrl+C stops this response only; the server still sends "done"
+                    self.send({'type': 'cancel'})
+                    continue
+                except (ConnectionError, OSError, ValueError) as e:
+                    note = f"(connection lost: {e})"
+                    break
+                
+                if event['type'] == 'token':
+                    parts.append(event['text'])
+                    now = time.monotonic()
+                    if now - last_refresh >= 1 / STREAM_REFRESH_PER_SECOND:
+                        live.update(self.response_panel(''.join(parts)), refresh=True)
+                        last_refresh = now
+                elif event['type'] == 'queued':
+                    live.update(self.response_panel("", f"⏳ Waiting for the model ({event['position']} in line)"),
+                                refresh=True)
+                elif event['type'] == 'done':
+                    note = event.get('note')
+                    stats = event.get('stats')
+                    cached = event.get('prompt') if event.get('cached') else None
+                    self.conversation_id = event.get('conversation_id', self.conversation_id)
+                    break
+                else:
+                    note = event.get('message', 'Error')
+                    break
+            
+            live.update(self.response_panel(''.join(parts), note), refresh=True)
+        
+        if cached is not None:
+            self.display_cache_hit((time.perf_counter() - started) * 1000, message, cached)
+        self.display_turn_stats(stats)
+        return ''.join(parts)
+    
+    def show_recent_history(self, limit=10):
+        return self.request({'type': 'history', 'limit': limit}).get('rows', [])
+    
+    def search_history(self, query):
+        return self.request({'type': 'search', 'query': query}).get('rows', [])
+    
+    def search_similar(self, query):
+        reply = self.request({'type': 'similar', 'query': query})
+        return reply['rows'] if reply['type'] == 'rows' else None
+    
+    def list_conversations(self, limit=20):
+        reply = self.request({'type': 'threads'})
+        self.conversation_id = reply.get('conversation_id')
+        return reply.get('rows', [])
+    
+    def cache_stats(self, clear=False):
+        return self.request({'type': 'cache', 'clear': clear})['stats']
+    
+    def new_conversation(self):
+        self.conversation_id = self.request({'type': 'new'}).get('conversation_id')
+    
+    def switch_conversation(self, conversation_id):
+        reply = self.request({'type': 'switch', 'id': conversation_id})
+        self.conversation_id = reply.get('conversation_id')
+        return reply['type'] == 'ok'
 
 def main():
     """Main function with educational information"""
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ['-h', '--help']:
-            print("""
+    import argparse
+    
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-h', '--help', action='store_true')
+    parser.add_argument('--timing', action='store_true')
+    parser.add_argument('--db', default="chat_history.db")
+    parser.add_argument('--serve', action='store_true')
+    parser.add_argument('--socket', default=SERVER_SOCKET)
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--max-inflight', type=int, default=SERVER_MAX_INFLIGHT)
+    parser.add_argument('--connect', nargs='?', const=SERVER_SOCKET)
+    parser.add_argument('--similar-cache', nargs='?', type=float, const=SIMILAR_CACHE_THRESHOLD)
+    args = parser.parse_args()
+    
+    if args.help:
+        print("""
 Gemma 3 CLI Chat Application - Educational Starter Kit
 
 This is a MINIMAL version designed for learning and extension.
 
 Usage:
     python gemma_chat.py
+    python gemma_chat.py --timing    (report launch-to-prompt time)
+    python gemma_chat.py --db PATH   (history database, default chat_history.db)
+    python gemma_chat.py --similar-cache [THRESHOLD]
+                                     (answer questions worded differently from a
+                                      cached one, cosine similarity >= 0.92)
+
+Server Mode (one model, many users):
+    python gemma_chat.py --serve [--socket PATH | --host ADDR --port N] [--max-inflight N]
+                                 [--similar-cache [THRESHOLD]]
+    python gemma_chat.py --connect [PATH | host:port]
+
+    The server listens on a Unix socket (default /tmp/gemma-chat.sock) and
+    tells users apart by their Ubuntu account; with --port it listens on TCP
+    and trusts the name each client sends (no authentication - use only on
+    trusted networks). Replies are generated --max-inflight at a time
+    (default 2), taking turns between users, so nobody waits behind
+    someone else's long queue.
+
+    No model at hand? python fake_ollama.py starts a stand-in Ollama;
+    point the server at it with OLLAMA_HOST=127.0.0.1:11435
 
 Prerequisites:
     pip install ollama rich
+    pip install numpy                (optional: /similar and --similar-cache)
+    ollama pull nomic-embed-text     (embeddings for the same)
 
 Ollama Setup:
     1. Install Ollama: https://ollama.ai/
@@ -378,7 +1818,7 @@ Educational Philosophy:
     - Resource-conscious design for developing regions
 
 Multi-User Setup (Ubuntu):
-    - Each Ubuntu account can run their own instance
+    - Run one --serve instance; each Ubuntu account connects with --connect
     - Access from any device: Chrome, smartphone, Chromebook
     - Concurrent users: 10+ on a 70k yen mini PC
     - Perfect for educational institutions with limited resources
@@ -394,11 +1834,20 @@ TODO for Students:
     8. Add monitoring and logging
 
 Remember: This is a foundation, not a destination!
-            """)
-            return
+        """)
+        return
+    
+    if args.serve:
+        ChatServer(args.db, args.socket, args.host, args.port, max(1, args.max_inflight),
+                   similar_threshold=args.similar_cache).run()
+        return
     
-    app = GemmaChat()
-    app.run()
+    if args.connect:
+        app = ChatClient(args.connect)
+    else:
+        app = GemmaChat(args.db)
+        app.similar_threshold = args.similar_cache
+    app.run(show_timing=args.timing)
 
 if __name__ == "__main__":
     main()
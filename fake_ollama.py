@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama server for testing cli-chat.py without a model
+
+Speaks enough of the Ollama HTTP API for the chat app and its server mode:
+/api/version, /api/tags, /api/show, /api/generate (streaming or not) and
+/api/embed. Responses are deterministic and generated at a fixed pace, so
+timing and fairness can be observed on any machine:
+
+- The first request (and any after keep_alive expired, or with another
+  options.num_ctx than the loaded model) waits --load-seconds, like a model
+  being loaded
+- Prompt evaluation costs --prompt-ms per new token; tokens passed back in
+  `context` are free, as with Ollama's KV cache
+- Each generated token takes --token-ms
+- Embeddings (--embed-model) hash words and their letter trigrams into a
+  fixed-size vector, so texts sharing words and spellings come out similar
+
+Required packages:
+none (standard library only)
+
+Usage:
+python fake_ollama.py
+python fake_ollama.py --port 11435 --token-ms 50
+OLLAMA_HOST=127.0.0.1:11435 python cli-chat.py
+"""
+
+import argparse
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Length of fake embeddings
+EMBED_DIMENSIONS = 256
+
+# Context length a model is loaded with when a request does not set num_ctx
+DEFAULT_NUM_CTX = 2048
+
+class FakeModel:
+    """Deterministic stand-in for a loaded model"""
+
+    def __init__(self, name, load_seconds, prompt_ms, token_ms, words, embed_name):
+        self.name = name
+        self.embed_name = embed_name
+        self.load_seconds = load_seconds
+        self.prompt_ms = prompt_ms
+        self.token_ms = token_ms
+        self.words = words
+        self.loaded_until = 0.0
+        self.num_ctx = None
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def load(self, keep_alive=300, num_ctx=None):
+        """Simulate loading the model unless it is still in memory with the same context length"""
+        num_ctx = num_ctx or DEFAULT_NUM_CTX
+        with self.lock:
+            self.requests += 1
+            if time.monotonic() > self.loaded_until or num_ctx != self.num_ctx:
+                time.sleep(self.load_seconds)
+                self.num_ctx = num_ctx
+            self.loaded_until = time.monotonic() + keep_alive
+
+    @staticmethod
+    def tokens(text):
+        """One token per word, as stable ids"""
+        return [zlib.crc32(word.encode('utf-8')) % 50000 for word in text.split()]
+
+    def reply(self, prompt):
+        """The words of the reply to a prompt"""
+        words = prompt.split()
+        echo = ' '.join(words[-8:]) if words else ''
+        filler = ['token'] * max(0, self.words - len(echo.split()) - 3)
+        return ['You', 'said:'] + echo.split() + ['.'] + filler
+
+    @staticmethod
+    def embedding(text):
+        """Unit vector of hashed word and letter-trigram features"""
+        vector = [0.0] * EMBED_DIMENSIONS
+        for word in re.findall(r'\w+', text.casefold()):
+            features = [(word, 1.0)]
+            padded = f" {word} "
+            features += [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                code = zlib.crc32(feature.encode('utf-8'))
+                vector[code % EMBED_DIMENSIONS] += weight if code & 0x80000000 else -weight
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+def parse_keep_alive(value):
+    """Seconds from Ollama's keep_alive (number of seconds or "30m"-style duration)"""
+    if value is None:
+        return 300
+    if isinstance(value, (int, float)):
+        return value
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        model = self.server.model
+        if self.path == '/api/version':
+            self.send_json({'version': '0.0.0-fake'})
+        elif self.path == '/api/tags':
+            self.send_json({'models': [{'name': model.name, 'model': model.name,
+                                        'modified_at': '2025-01-01T00:00:00Z',
+                                        'size': 0, 'digest': 'fake', 'details': {}}]})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        model = self.server.model
+
+        if request.get('model', request.get('name')) not in (model.name, model.embed_name, None):
+            self.send_json({'error': f"model '{request.get('model')}' not found"}, 404)
+        elif self.path == '/api/show':
+            self.send_json({'modelfile': '', 'parameters': '', 'template': '{{ .Prompt }}',
+                            'details': {'family': 'fake', 'parameter_size': '0B'}, 'model_info': {}})
+        elif self.path == '/api/generate':
+            self.generate(request)
+        elif self.path == '/api/embed':
+            inputs = request.get('input', '')
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self.send_json({'model': model.embed_name, 'embeddings': [model.embedding(text) for text in inputs],
+                            'total_duration': 0, 'load_duration': 0,
+                            'prompt_eval_count': sum(len(model.tokens(text)) for text in inputs)})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def generate(self, request):
+        model = self.server.model
+        started = time.perf_counter()
+        options = request.get('options') or {}
+        model.load(parse_keep_alive(request.get('keep_alive')), options.get('num_ctx'))
+        load_ns = int((time.perf_counter() - started) * 1e9)
+
+        prompt = request.get('prompt', '')
+        base = {'model': model.name, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+        if not prompt:
+            # An empty prompt only loads the model
+            self.send_json(dict(base, response='', done=True, done_reason='load', load_duration=load_ns))
+            return
+
+        # Only the new prompt is evaluated; the context is already "cached"
+        prompt_tokens = model.tokens(prompt)
+        time.sleep(len(prompt_tokens) * model.prompt_ms / 1000)
+        prompt_ns = int(len(prompt_tokens) * model.prompt_ms * 1e6)
+
+        limit = options.get('num_predict')
+        words = model.reply(prompt)
+        if limit is not None and limit >= 0:
+            words = words[:limit]
+
+        stream = request.get('stream', True)
+        if stream:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+
+        pieces = []
+        try:
+            for index, word in enumerate(words):
+                time.sleep(model.token_ms / 1000)
+                piece = word if index == 0 else ' ' + word
+                pieces.append(piece)
+                if stream:
+                    self.wfile.write((json.dumps(dict(base, response=piece, done=False)) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: stop generating, like Ollama
+            return
+
+        context = list(request.get('context') or []) + prompt_tokens + model.tokens(''.join(pieces))
+        final = dict(base, done=True, done_reason='stop', context=context,
+                     total_duration=int((time.perf_counter() - started) * 1e9),
+                     load_duration=load_ns, prompt_eval_count=len(prompt_tokens),
+                     prompt_eval_duration=prompt_ns, eval_count=len(pieces),
+                     eval_duration=int(len(pieces) * model.token_ms * 1e6))
+
+        if stream:
+            self.wfile.write((json.dumps(dict(final, response='')) + '\n').encode('utf-8'))
+        else:
+            self.send_json(dict(final, response=''.join(pieces)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for testing cli-chat.py")
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=11435, help='Port to listen on (default: %(default)s)')
+    parser.add_argument('--model', default='gemma3:1b', help='Model name to answer for (default: %(default)s)')
+    parser.add_argument('--load-seconds', type=float, default=1.0,
+                        help='Simulated model load time (default: %(default)s)')
+    parser.add_argument('--prompt-ms', type=float, default=2.0,
+                        help='Milliseconds per evaluated prompt token (default: %(default)s)')
+    parser.add_argument('--token-ms', type=float, default=30.0,
+                        help='Milliseconds per generated token (default: %(default)s)')
+    parser.add_argument('--words', type=int, default=40, help='Words per reply (default: %(default)s)')
+    parser.add_argument('--embed-model', default='nomic-embed-text',
+                        help='Embedding model name to answer for (default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.model = FakeModel(args.model, args.load_seconds, args.prompt_ms, args.token_ms, args.words,
+                             args.embed_model)
+    server.verbose = args.verbose
+
+    print(f"Fake Ollama serving {args.model} on http://{args.host}:{args.port}")
+    print(f"Use: OLLAMA_HOST={args.host}:{args.port} python cli-chat.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
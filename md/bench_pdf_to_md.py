@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for .PDF to .md (pdf_to_md.py)
+
+Generates a reproducible corpus of synthetic PDFs with PyMuPDF, then measures
+each stage of PDFToMarkdownConverter on every document:
+
+- analyze: analyze_pdf_structure()
+- extract: extract_structured_content()
+- markdown: generate_markdown()
+- end_to_end: convert_file() (analysis, extraction, streaming Markdown output)
+
+Every measurement runs in a fresh child process, so earlier runs cannot
+warm caches for later ones and the reported peak RSS is not inflated by
+them. The markdown stage needs extracted elements, which its child process
+prepares untimed first: its peak RSS includes that extraction, and the
+peak reached by the preparation alone is reported next to it (setup MB).
+A child process that dies (out of memory, a crash) marks its stage as
+failed instead of stopping the run. Results are printed as a table and
+saved as JSON, so runs from different commits can be compared with --compare.
+
+Required packages:
+pip install pymupdf
+
+Usage:
+python bench_pdf_to_md.py
+python bench_pdf_to_md.py --quick
+python bench_pdf_to_md.py --scale 4 --output results.json
+python bench_pdf_to_md.py --compare results-before.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+
+try:
+    import pymupdf as fitz  # PyMuPDF
+except ImportError:
+    # PyMuPDF before 1.24.3 only has the fitz name (later versions print a
+    # deprecation notice to stdout when it is imported)
+    import fitz
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from pdf_to_md import PDFToMarkdownConverter
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then not reported
+    resource = None
+
+# Bump when the generator changes, so old corpus files are not reused
+CORPUS_VERSION = 1
+
+STAGES = ['analyze', 'extract', 'markdown', 'end_to_end']
+
+# name: (pages, settings); pages are multiplied by --scale
+PROFILES = {
+    'small_text': (5, {'body_size': 11, 'list_ratio': 0.1}),
+    'large_text': (500, {'body_size': 11, 'list_ratio': 0.1}),
+    'mixed_fonts': (100, {'body_size': 10, 'list_ratio': 0.1, 'font_sizes': [8, 9, 10, 12, 15, 18, 24]}),
+    'list_heavy': (100, {'body_size': 11, 'list_ratio': 0.6}),
+    'long_paragraphs': (100, {'body_size': 11, 'list_ratio': 0.0, 'long_paragraphs': True}),
+    'sparse_images': (100, {'body_size': 11, 'list_ratio': 0.0, 'image_pages': 0.8}),
+}
+
+QUICK_PROFILES = ['small_text', 'mixed_fonts', 'list_heavy']
+
+WORDS = ("the of and to in is that for it as with was on be by this are from at or "
+         "document structure reader heading paragraph list converter learning local "
+         "access information community school water energy health market report").split()
+
+def generate_pdf(path, pages, settings, seed):
+    """
+    Write one synthetic PDF to path.
+
+    The same (pages, settings, seed) always produce the same document, so
+    results stay comparable across runs and machines.
+    """
+    rng = random.Random(seed)
+    body_size = settings['body_size']
+    font_sizes = settings.get('font_sizes')
+    doc = fitz.open()
+
+    for page_num in range(pages):
+        page = doc.new_page()
+
+        # Mostly empty, image-like pages: a few drawn shapes and a caption
+        if rng.random() < settings.get('image_pages', 0.0):
+            for _ in range(rng.randint(3, 12)):
+                x, y = rng.uniform(40, 400), rng.uniform(60, 600)
+                page.draw_rect(fitz.Rect(x, y, x + rng.uniform(40, 150), y + rng.uniform(40, 150)),
+                               color=(0, 0, 0), fill=(rng.random(), rng.random(), rng.random()))
+            page.insert_text((72, 780), f"Figure {page_num + 1}", fontsize=9)
+            continue
+
+        y = 60
+        if page_num % 10 == 0:
+            page.insert_text((72, y), f"Chapter {page_num // 10 + 1}", fontsize=22)
+            y += 34
+        page.insert_text((72, y), f"Section {page_num + 1}.1 {' '.join(rng.sample(WORDS, 3))}", fontsize=16)
+        y += 26
+
+        if settings.get('long_paragraphs'):
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(300, 500))) + '.'
+            page.insert_textbox(fitz.Rect(72, y, 523, 800), text, fontsize=body_size)
+            continue
+
+        item = 1
+        while y < 780:
+            roll = rng.random()
+            if roll < settings['list_ratio']:
+                marker = rng.choice(['-', '*', f"{item}.", f"{item})"])
+                line = f"{marker} {' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9)))}"
+                item += 1
+            else:
+                line = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 14)))
+            size = rng.choice(font_sizes) if font_sizes else body_size
+            page.insert_text((72, y), line, fontsize=size)
+            y += size * 1.4
+
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def build_corpus(corpus_dir, profile_names, scale):
+    """Generate (or reuse) the corpus; returns a list of (name, path, pages)."""
+    corpus_dir = Path(corpus_dir)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    corpus = []
+
+    for index, name in enumerate(profile_names):
+        base_pages, settings = PROFILES[name]
+        pages = max(1, int(base_pages * scale))
+        path = corpus_dir / f"{name}-{pages}p-v{CORPUS_VERSION}.pdf"
+        if not path.exists():
+            print(f"Generating {path.name} ...")
+            generate_pdf(str(path), pages, settings, seed=1000 + index)
+        corpus.append((name, str(path), pages))
+
+    return corpus
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _run_stage(stage, pdf_path, workers, queue):
+    """Child process body: run one stage once and report its measurements."""
+    converter = PDFToMarkdownConverter(quiet=True, workers=workers)
+    elements = None
+    setup_rss = None
+
+    # generate_markdown needs extracted elements; that preparation is not timed,
+    # but it stays in this process's peak RSS
+    if stage == 'markdown':
+        elements = converter.extract_structured_content(pdf_path)
+        setup_rss = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'out.md')
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        if stage == 'analyze':
+            converter.analyze_pdf_structure(pdf_path)
+            element_count = 0
+        elif stage == 'extract':
+            element_count = len(converter.extract_structured_content(pdf_path))
+        elif stage == 'markdown':
+            converter.generate_markdown(elements)
+            element_count = len(elements)
+        else:
+            element_count = converter.convert_file(pdf_path, output_path)['elements']
+
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+
+    queue.put({'wall_seconds': wall, 'cpu_seconds': cpu, 'elements': element_count,
+               'peak_rss_mb': peak_rss_mb(), 'setup_rss_mb': setup_rss})
+
+def _stage_result(process, queue):
+    """Wait for a child's measurements; None if it exited without sending them."""
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                break
+    # The child may have sent its result just before exiting
+    try:
+        return queue.get(timeout=1)
+    except Empty:
+        return None
+
+def measure(stage, pdf_path, pages, workers, repeat):
+    """
+    Run a stage `repeat` times in fresh processes and keep the fastest run.
+
+    If a child process dies without results, the stage is reported as
+    failed (with 'error' set and no timings) and not run again.
+    """
+    context = multiprocessing.get_context('spawn')
+    best = None
+
+    for _ in range(repeat):
+        queue = context.Queue()
+        process = context.Process(target=_run_stage, args=(stage, pdf_path, workers, queue))
+        process.start()
+        result = _stage_result(process, queue)
+        process.join()
+        if result is None:
+            return {'error': f"child process exited with code {process.exitcode}",
+                    'wall_seconds': None, 'cpu_seconds': None, 'elements': None,
+                    'peak_rss_mb': None, 'setup_rss_mb': None,
+                    'pages_per_second': None, 'elements_per_second': None}
+        if best is None or result['wall_seconds'] < best['wall_seconds']:
+            best = result
+
+    best['error'] = None
+
+    wall = best['wall_seconds']
+    best['pages_per_second'] = pages / wall if wall > 0 else 0.0
+    best['elements_per_second'] = best['elements'] / wall if wall > 0 and best['elements'] else 0.0
+    return best
+
+def git_commit():
+    """Current git commit of the repository, if available."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=Path(__file__).resolve().parent,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    """Print one row per document and stage."""
+    print(f"\n{'document':<18} {'stage':<11} {'wall s':>8} {'cpu s':>8} "
+          f"{'pages/s':>9} {'elems/s':>10} {'RSS MB':>8} {'setup MB':>9}")
+    for row in results:
+        if row['error']:
+            print(f"{row['document']:<18} {row['stage']:<11} failed: {row['error']}")
+            continue
+        rss = f"{row['peak_rss_mb']:.1f}" if row['peak_rss_mb'] is not None else '-'
+        setup = f"{row['setup_rss_mb']:.1f}" if row['setup_rss_mb'] is not None else '-'
+        print(f"{row['document']:<18} {row['stage']:<11} {row['wall_seconds']:>8.3f} "
+              f"{row['cpu_seconds']:>8.3f} {row['pages_per_second']:>9.1f} "
+              f"{row['elements_per_second']:>10.0f} {rss:>8} {setup:>9}")
+    if any(row['setup_rss_mb'] is not None for row in results):
+        print("RSS MB of the markdown stage includes its untimed extraction (setup MB).")
+
+def print_comparison(results, baseline_path):
+    """Print wall time ratios against an earlier results file."""
+    with open(baseline_path, 'r', encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+
+    before = {(row['document'], row['stage']): row for row in baseline['results']}
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    print(f"{'document':<18} {'stage':<11} {'before s':>9} {'after s':>9} {'speedup':>8}")
+
+    for row in results:
+        old = before.get((row['document'], row['stage']))
+        if old is None or row['error'] or old.get('error') or row['wall_seconds'] <= 0:
+            continue
+        print(f"{row['document']:<18} {row['stage']:<11} {old['wall_seconds']:>9.3f} "
+              f"{row['wall_seconds']:>9.3f} {old['wall_seconds'] / row['wall_seconds']:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the .PDF to .md converter on a synthetic corpus")
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'pdf_to_md_bench'),
+                        help='Where generated PDFs are kept between runs (default: %(default)s)')
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES),
+                        help='Documents to benchmark (default: all)')
+    parser.add_argument('--quick', action='store_true',
+                        help=f"Only run {', '.join(QUICK_PROFILES)} at reduced size")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiply the page count of every document (default: 1.0)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help='Stages to measure (default: all)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Converter worker processes (default: 1)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per measurement; the fastest is kept (default: 3)')
+    parser.add_argument('-o', '--output', default='bench_results.json',
+                        help='JSON results file (default: %(default)s)')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    profile_names = args.profiles or (QUICK_PROFILES if args.quick else list(PROFILES))
+    scale = args.scale * (0.2 if args.quick else 1.0)
+    corpus = build_corpus(args.corpus_dir, profile_names, scale)
+
+    results = []
+    for name, path, pages in corpus:
+        for stage in args.stages:
+            print(f"Measuring {name} / {stage} ...")
+            row = {'document': name, 'pages': pages, 'stage': stage}
+            row.update(measure(stage, path, pages, args.workers, max(1, args.repeat)))
+            results.append(row)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': args.workers,
+            'scale': scale,
+            'repeat': args.repeat,
+            'corpus_version': CORPUS_VERSION
+        },
+        'results': results
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print_results(results)
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    main()
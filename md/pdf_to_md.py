@@ -6,10 +6,10 @@ Educational starter kit for document processing and accessibility
 Required packages:
 pip install pymupdf
 
-OCR Extension Hints:
-# Add 'pip install pdf2image pytesseract pillow' and system tesseract for scanned PDFs
-# Use pytesseract.image_to_data() with confidence thresholds to filter low-quality text
-# Convert PDF pages to images first with convert_from_path() before OCR processing
+OCR for scanned pages (optional):
+pip install pytesseract pillow   (plus the system tesseract program)
+Run with --ocr: pages without a usable text layer are rendered with PyMuPDF
+and recognised with pytesseract.image_to_data(), dropping low-confidence words
 
 Educational Philosophy:
 - Start with simple text extraction, build understanding before complexity
@@ -21,15 +21,890 @@ Usage:
 python pdf_to_md.py document.pdf
 python pdf_to_md.py document.pdf output.md
 python pdf_to_md.py document.pdf --verbose
+python pdf_to_md.py manual.pdf --workers 4
+python pdf_to_md.py --batch pdf_folder/ --output-dir markdown/ --workers 4
+python pdf_to_md.py slow.pdf --profile --metrics-json metrics.json
+python pdf_to_md.py book.pdf --pages 1-20,45
+python pdf_to_md.py scanned.pdf --ocr --ocr-lang eng+deu --page-cache cache.db
+cat scan.pdf | python pdf_to_md.py - > scan.md
 
 """
 
-import fitz  # PyMuPDF - lightweight and reliable PDF processing
+try:
+    import pymupdf as fitz  # PyMuPDF - lightweight and reliable PDF processing
+except ImportError:
+    # PyMuPDF before 1.24.3 only has the fitz name (later versions print a
+    # deprecation notice to stdout when it is imported)
+    import fitz
 import re
 import sys
 import os
 import argparse
+import asyncio
+import contextlib
+import glob
+import hashlib
+import heapq
+import http
+import io
+import json
+import mmap
+import multiprocessing
+import sqlite3
+import time
+import zlib
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing.connection import wait
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; memory is then read from /proc only
+    resource = None
+
+# Upper bound on pages per process pool task, so results stay small
+PAGES_PER_TASK = 16
+
+# Spare characters reserved in the streamed statistics header
+HEADER_RESERVE = 64
+
+# Batch mode skip manifest (bump the version when the output format changes)
+MANIFEST_NAME = '.pdf_to_md_manifest.json'
+MANIFEST_VERSION = 1
+MANIFEST_SAVE_INTERVAL = 50
+BATCH_SLOWEST_FILES = 10
+
+# Page-level extraction cache (bump the version when element contents change)
+PAGE_CACHE_VERSION = 4
+DEFAULT_PAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+# OCR fallback: pages with fewer characters than this (and an image) are OCR'd
+OCR_MIN_CHARS = 20
+OCR_DEFAULT_DPI = 300
+OCR_MIN_CONFIDENCE = 30
+OCR_CACHE_VERSION = 1
+
+# Adaptive headings: histogram bin width (points) and count, text seen before
+# a document's font profile is fixed, and how much a heading must exceed the
+# body size (both a ratio and an absolute step have to be met)
+FONT_BIN_WIDTH = 0.5
+FONT_BIN_COUNT = 200
+ADAPTIVE_SETTLE_CHARS = 20000
+ADAPTIVE_HEADING_RATIO = 1.15
+ADAPTIVE_HEADING_STEP = 1.0
+
+# Running header/footer detection: vertical position bands per page (NO_BAND
+# when a line's position is unknown), bands at the top and at the bottom that
+# may hold running lines, pages compared on either side of a page, and the
+# share of those pages a line has to repeat on
+POSITION_BANDS = 40
+NO_BAND = 255
+RUNNING_EDGE_BANDS = 4
+RUNNING_WINDOW = 5
+RUNNING_MIN_SHARE = 0.4
+RUNNING_MIN_PAGES = 3
+
+# Running lines whose numbers may differ from page to page: a bare number or
+# a page number such as "Page 7", "- 7 -", "7 of 30" or "p. 7/30"
+RUNNING_PAGE_NUMBER = re.compile(r'(?:page|p\.)?\s*[-\u2013\u2014]?\s*\d+\s*[-\u2013\u2014]?'
+                                 r'(?:\s*(?:of|/)\s*\d+)?')
+
+# Chunked output: manifest file name and format version, headings that may
+# start a new chunk (levels 1..CHUNK_SPLIT_LEVEL), default pages per chunk,
+# and size bounds in characters (smaller chunks are not split at headings,
+# larger ones are split at the next page boundary)
+CHUNK_MANIFEST_NAME = 'index.json'
+CHUNK_MANIFEST_VERSION = 1
+CHUNK_SPLIT_LEVEL = 2
+CHUNK_PAGES = 10
+CHUNK_MIN_CHARS = 2000
+CHUNK_MAX_CHARS = 200000
+
+# Resource governor: a supervised worker gets this much extra time before it
+# is killed, so its own check between pages can stop cleanly first
+GOVERNOR_GRACE_SECONDS = 5.0
+GOVERNOR_MEMORY_HARD_FACTOR = 1.25
+GOVERNOR_POLL_SECONDS = 0.25
+
+# HTTP service mode
+SERVICE_QUEUE_SIZE = 16
+SERVICE_MAX_UPLOAD_MB = 200
+SERVICE_RECENT_JOBS = 100
+
+class ConversionError(Exception):
+    """Raised when a PDF cannot be converted (unreadable file, no text, ...)."""
+
+class ResourceLimitExceeded(ConversionError):
+    """Raised when a document exceeds its time or memory budget before any content was produced."""
+
+# Interned content types: elements store the index into this list
+CONTENT_TYPES = ['paragraph', 'heading', 'list_item']
+PARAGRAPH, HEADING, LIST_ITEM = 0, 1, 2
+
+# Statistics counter updated for each built-in content type
+TYPE_STATS = {
+    PARAGRAPH: 'paragraphs_created',
+    HEADING: 'headings_detected',
+    LIST_ITEM: 'list_items_found'
+}
+
+# Formatting bits packed into ContentElements.flags
+FLAG_BOLD = 1
+FLAG_ITALIC = 2
+
+def content_type_code(content_type):
+    """Return the interned code for a content type name, registering new names."""
+    try:
+        return CONTENT_TYPES.index(content_type)
+    except ValueError:
+        CONTENT_TYPES.append(content_type)
+        return len(CONTENT_TYPES) - 1
+
+class ContentElements:
+    """
+    Compact columnar store for extracted content elements.
+    
+    Instead of one dictionary (plus a nested formatting dictionary) per line,
+    each attribute is kept in its own column: font sizes and page numbers in
+    typed arrays, bold/italic packed into one flag byte and the content type
+    as an index into CONTENT_TYPES. The markers column holds where a list
+    marker ends in the text (0 if there is none), and bands the line's
+    vertical position on its page in POSITION_BANDS steps (NO_BAND if
+    unknown). Only the line texts remain Python objects.
+    
+    On a synthetic 5,000-page document (about 90,000 lines), the extracted
+    elements take about 11 MB instead of about 45 MB as dictionaries
+    (measured with tracemalloc), and the garbage collector has almost
+    nothing left to traverse.
+    
+    Indexing and iteration return ElementView objects, which behave like the
+    old dictionaries (element['text'], element['formatting']['bold'], ...),
+    so existing code that works with element dictionaries keeps working.
+    """
+    
+    __slots__ = ('texts', 'font_sizes', 'pages', 'flags', 'types', 'markers', 'bands')
+    
+    def __init__(self, elements=()):
+        self.texts = []
+        self.font_sizes = array('d')
+        self.pages = array('I')
+        self.flags = array('B')
+        self.types = array('B')
+        self.markers = array('I')
+        self.bands = array('B')
+        self.extend(elements)
+    
+    def add(self, text, font_size, page, type_code, flags=0, marker_end=0, band=NO_BAND):
+        """Fast path: append one element from its column values."""
+        self.texts.append(text)
+        self.font_sizes.append(font_size)
+        self.pages.append(page)
+        self.types.append(type_code)
+        self.flags.append(flags)
+        self.markers.append(marker_end)
+        self.bands.append(band)
+    
+    def append(self, element, marker_end=0):
+        """Append one element given as a dictionary (or ElementView)."""
+        formatting = element.get('formatting') or {}
+        flags = ((FLAG_BOLD if formatting.get('bold') else 0)
+                 | (FLAG_ITALIC if formatting.get('italic') else 0))
+        self.add(element['text'], element['font_size'], element['page'],
+                 content_type_code(element['type']), flags, marker_end)
+    
+    def extend(self, elements):
+        """Append elements from another ContentElements or any iterable of dictionaries."""
+        if isinstance(elements, ContentElements):
+            self.texts.extend(elements.texts)
+            self.font_sizes.extend(elements.font_sizes)
+            self.pages.extend(elements.pages)
+            self.flags.extend(elements.flags)
+            self.types.extend(elements.types)
+            self.markers.extend(elements.markers)
+            self.bands.extend(elements.bands)
+        else:
+            for element in elements:
+                self.append(element)
+    
+    def subset(self, indexes):
+        """A new store with the elements at the given (ascending) indexes."""
+        subset = ContentElements()
+        for name in self.__slots__:
+            column = getattr(self, name)
+            selected = [column[index] for index in indexes]
+            setattr(subset, name, selected if name == 'texts' else array(column.typecode, selected))
+        return subset
+    
+    def set_page(self, page):
+        """Assign every element to one page number (used for cached pages)."""
+        self.pages = array('I', [page]) * len(self.texts)
+    
+    def to_columns(self):
+        """Plain lists of the columns (without page numbers), e.g. for JSON storage."""
+        return {
+            'texts': self.texts,
+            'font_sizes': self.font_sizes.tolist(),
+            'flags': self.flags.tolist(),
+            'types': [CONTENT_TYPES[code] for code in self.types],
+            'markers': self.markers.tolist(),
+            'bands': self.bands.tolist()
+        }
+    
+    @classmethod
+    def from_columns(cls, columns, page):
+        """Rebuild a page's elements from to_columns() output."""
+        elements = cls()
+        elements.texts = list(columns['texts'])
+        elements.font_sizes = array('d', columns['font_sizes'])
+        elements.flags = array('B', columns['flags'])
+        elements.types = array('B', [content_type_code(name) for name in columns['types']])
+        elements.markers = array('I', columns['markers'])
+        elements.bands = array('B', columns['bands'])
+        elements.set_page(page)
+        return elements
+    
+    def __getstate__(self):
+        # Custom content types may have different codes in another process,
+        # so the type names travel with the pickled columns
+        return {
+            'texts': self.texts,
+            'font_sizes': self.font_sizes,
+            'pages': self.pages,
+            'flags': self.flags,
+            'types': self.types,
+            'markers': self.markers,
+            'bands': self.bands,
+            'type_names': list(CONTENT_TYPES)
+        }
+    
+    def __setstate__(self, state):
+        self.texts = state['texts']
+        self.font_sizes = state['font_sizes']
+        self.pages = state['pages']
+        self.flags = state['flags']
+        self.markers = state['markers']
+        self.bands = state['bands']
+        type_names = state['type_names']
+        if CONTENT_TYPES[:len(type_names)] == type_names:
+            self.types = state['types']
+        else:
+            self.types = array('B', [content_type_code(type_names[code]) for code in state['types']])
+    
+    def __len__(self):
+        return len(self.texts)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ElementView(self, i) for i in range(*index.indices(len(self.texts)))]
+        if index < 0:
+            index += len(self.texts)
+        if not 0 <= index < len(self.texts):
+            raise IndexError("content element index out of range")
+        return ElementView(self, index)
+    
+    def __iter__(self):
+        for index in range(len(self.texts)):
+            yield ElementView(self, index)
+
+class ElementView(Mapping):
+    """
+    Read-only dictionary view of one element in a ContentElements store.
+    
+    Provides the keys of the original element dictionaries: text, font_size,
+    page, type and formatting.
+    """
+    
+    __slots__ = ('_store', '_index')
+    
+    _KEYS = ('text', 'font_size', 'page', 'type', 'formatting')
+    
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+    
+    def __getitem__(self, key):
+        store, index = self._store, self._index
+        if key == 'text':
+            return store.texts[index]
+        if key == 'font_size':
+            return store.font_sizes[index]
+        if key == 'page':
+            return store.pages[index]
+        if key == 'type':
+            return CONTENT_TYPES[store.types[index]]
+        if key == 'formatting':
+            flags = store.flags[index]
+            return {'bold': bool(flags & FLAG_BOLD), 'italic': bool(flags & FLAG_ITALIC)}
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return iter(self._KEYS)
+    
+    def __len__(self):
+        return len(self._KEYS)
+    
+    def __repr__(self):
+        return repr(dict(self))
+
+class FontSizeHistogram:
+    """
+    Font sizes of a document, weighted by character count, in fixed bins.
+    
+    Bins are FONT_BIN_WIDTH points wide and centred on multiples of the
+    width, so 10.98 pt and 11.02 pt land in the same bin. The histogram has
+    a fixed size however long the document is, and can be updated page by
+    page while extraction is still running.
+    """
+    
+    def __init__(self):
+        self.weights = array('d', bytes(8 * FONT_BIN_COUNT))
+        self.total_chars = 0
+    
+    def add(self, font_size, chars):
+        index = min(FONT_BIN_COUNT - 1, max(0, round(font_size / FONT_BIN_WIDTH)))
+        self.weights[index] += chars
+        self.total_chars += chars
+    
+    def add_elements(self, elements):
+        """Add every element of a ContentElements store."""
+        for font_size, text in zip(elements.font_sizes, elements.texts):
+            self.add(font_size, len(text))
+    
+    def body_size(self):
+        """The size most of the text is set in (None while empty)."""
+        if not self.total_chars:
+            return None
+        weights = self.weights
+        return weights.index(max(weights)) * FONT_BIN_WIDTH
+    
+    def profile(self, max_tiers=3):
+        """
+        Derive body size, heading threshold and heading tiers.
+        
+        Sizes above the threshold are grouped into runs of adjacent bins;
+        the largest run becomes tier 1 (h1), the next one tier 2, and so on.
+        tiers holds the lower size bound of each tier, largest first.
+        """
+        body_size = self.body_size()
+        if body_size is None:
+            return None
+        
+        threshold = max(body_size * ADAPTIVE_HEADING_RATIO, body_size + ADAPTIVE_HEADING_STEP)
+        tiers = []
+        index = FONT_BIN_COUNT - 1
+        while index >= 0 and len(tiers) < max_tiers:
+            if self.weights[index] and index * FONT_BIN_WIDTH > threshold:
+                while index > 0 and self.weights[index - 1] and (index - 1) * FONT_BIN_WIDTH > threshold:
+                    index -= 1
+                tiers.append(index * FONT_BIN_WIDTH - FONT_BIN_WIDTH / 2)
+            index -= 1
+        
+        return {'body_size': body_size, 'heading_threshold': threshold, 'tiers': tiers}
+
+class AdaptiveHeadings:
+    """
+    Streaming stage that decides which lines are headings by font size,
+    using the document's own font profile instead of fixed point sizes.
+    
+    Extraction classifies lines by their text only and leaves the size
+    decision open. This stage feeds every page into a FontSizeHistogram and
+    holds pages back only until ADAPTIVE_SETTLE_CHARS characters have been
+    seen (or the document ends). At that point the profile is fixed, the
+    held pages are resolved and every later page passes straight through,
+    so the document is still parsed once and streamed.
+    
+    The profile is stored as converter.font_profile, where
+    _determine_heading_level() finds the heading tiers.
+    """
+    
+    def __init__(self, converter, settle_chars=ADAPTIVE_SETTLE_CHARS):
+        self.converter = converter
+        self.settle_chars = settle_chars
+        self.histogram = FontSizeHistogram()
+    
+    def resolve_pages(self, page_elements):
+        """Pass (page_number, elements) through, with headings decided."""
+        converter = self.converter
+        converter.font_profile = None
+        held = deque()
+        
+        for page_number, elements in page_elements:
+            self.histogram.add_elements(elements)
+            if converter.font_profile is None:
+                held.append((page_number, elements))
+                if self.histogram.total_chars < self.settle_chars:
+                    continue
+                self._settle()
+                while held:
+                    yield self._resolve(*held.popleft())
+            else:
+                yield self._resolve(page_number, elements)
+        
+        if held:
+            self._settle()
+            while held:
+                yield self._resolve(*held.popleft())
+    
+    def _settle(self):
+        profile = self.histogram.profile()
+        self.converter.font_profile = profile
+        if profile is None:
+            # No text at all: nothing to measure, the fixed threshold applies
+            self.converter.log("Font profile: no text to measure, using the fixed heading threshold")
+            return
+        self.converter.log(f"Font profile after {self.histogram.total_chars} characters: "
+                           f"body {profile['body_size']:g} pt, headings above "
+                           f"{profile['heading_threshold']:.1f} pt, tiers {profile['tiers']}")
+    
+    def _resolve(self, page_number, elements):
+        """Turn large lines into headings and count the final content types."""
+        profile = self.converter.font_profile
+        threshold = profile['heading_threshold'] if profile is not None else self.converter.heading_font_threshold
+        stats = self.converter.stats
+        types = elements.types
+        
+        for index, font_size in enumerate(elements.font_sizes):
+            if font_size > threshold:
+                types[index] = HEADING
+                elements.markers[index] = 0
+            stat = TYPE_STATS.get(types[index])
+            if stat is not None:
+                stats[stat] += 1
+        
+        return page_number, elements
+
+class RunningLineFilter:
+    """
+    Streaming stage that removes running headers, footers and page numbers.
+    
+    Only lines in the top and bottom RUNNING_EDGE_BANDS position bands are
+    candidates, and never headings or lines set larger than the body text
+    (so "Chapter 1", "Chapter 2", ... at the top of each page stay). Each
+    candidate is reduced to a hash of its normalized text (lower case, and
+    for page numbers matching RUNNING_PAGE_NUMBER digits replaced, so
+    "Page 7" matches "Page 8") together with its position band. A line is dropped when the same key occurs on at least
+    RUNNING_MIN_SHARE of the pages within RUNNING_WINDOW pages on either
+    side (and on at least RUNNING_MIN_PAGES pages). Neighbouring bands count
+    as the same position, so small shifts do not hide a repeat.
+    
+    The index holds hashes only, for the pages inside the window, and just
+    RUNNING_WINDOW pages of elements wait for their lookahead. Both are
+    independent of document length, and pages can come from any extraction
+    path, including the process pool.
+    """
+    
+    def __init__(self, converter, window=RUNNING_WINDOW, min_share=RUNNING_MIN_SHARE):
+        self.converter = converter
+        self.window = window
+        self.min_share = min_share
+        self.counts = {}  # key -> pages in the window that contain it
+        self.fonts = FontSizeHistogram()  # every line seen so far, for the body size
+    
+    @staticmethod
+    def line_key(text, band):
+        """Hash of a line's normalized text and position band."""
+        normalized = ' '.join(text.lower().split())
+        if RUNNING_PAGE_NUMBER.fullmatch(normalized):
+            normalized = re.sub(r'\d+', '#', normalized)
+        return hash((normalized, band))
+    
+    def filter_pages(self, page_elements):
+        """Pass (page_number, elements) through without running lines."""
+        ahead = deque()   # (page_number, elements, keys, hashes) still waiting for lookahead
+        behind = deque()  # hash sets of passed pages still inside the window
+        
+        for page_number, elements in page_elements:
+            self.fonts.add_elements(elements)
+            keys = self._page_keys(elements)
+            hashes = self._page_hashes(keys)
+            ahead.append((page_number, elements, keys, hashes))
+            self._count(hashes, 1)
+            if len(ahead) > self.window:
+                yield self._decide(ahead, behind)
+        
+        while ahead:
+            yield self._decide(ahead, behind)
+    
+    def _page_keys(self, elements):
+        """Keys of the candidate lines of a page, by element index."""
+        low = RUNNING_EDGE_BANDS
+        high = POSITION_BANDS - RUNNING_EDGE_BANDS
+        keys = {}
+        for index, band in enumerate(elements.bands):
+            if band < low or high <= band < POSITION_BANDS:
+                keys[index] = (band, elements.texts[index])
+        return keys
+    
+    def _page_hashes(self, keys):
+        """Line hashes a page counts under, with band tolerance."""
+        hashes = set()
+        for band, text in keys.values():
+            for near_band in (band - 1, band, band + 1):
+                hashes.add(self.line_key(text, near_band))
+        return hashes
+    
+    def _count(self, hashes, delta):
+        """Add (or remove) a page's line hashes to the window counts."""
+        counts = self.counts
+        for key in hashes:
+            count = counts.get(key, 0) + delta
+            if count:
+                counts[key] = count
+            else:
+                del counts[key]
+    
+    def _prominent(self, elements, index):
+        """Whether a line is a heading or set larger than the body text so far."""
+        if elements.types[index] == HEADING:
+            return True
+        body_size = self.fonts.body_size()
+        return body_size is not None and elements.font_sizes[index] > body_size + FONT_BIN_WIDTH
+    
+    def _decide(self, ahead, behind):
+        page_number, elements, keys, hashes = ahead.popleft()
+        window_pages = len(behind) + 1 + len(ahead)
+        needed = max(RUNNING_MIN_PAGES, round(self.min_share * window_pages + 0.4999))
+        
+        counts = self.counts
+        dropped = {index for index, (band, text) in keys.items()
+                   if counts.get(self.line_key(text, band), 0) >= needed
+                   and not self._prominent(elements, index)}
+        
+        behind.append(hashes)
+        if len(behind) > self.window:
+            self._count(behind.popleft(), -1)
+        
+        if not dropped:
+            return page_number, elements
+        
+        converter = self.converter
+        converter.stats['running_lines_removed'] += len(dropped)
+        if not converter.adaptive_headings:
+            # Undo the type counts made during extraction
+            for index in dropped:
+                stat = TYPE_STATS.get(elements.types[index])
+                if stat is not None:
+                    converter.stats[stat] -= 1
+        
+        return page_number, elements.subset([index for index in range(len(elements))
+                                             if index not in dropped])
+
+# Built-in list marker patterns, tried in this order
+LIST_MARKER_PATTERNS = [
+    r'^\s*[-*+]\s+',           # Bullet lists: -, *, +
+    r'^\s*\d+\.\s+',           # Numbered lists: 1., 2., etc.
+    r'^\s*\d+\)\s+',           # Numbered lists: 1), 2), etc.
+    r'^\s*[a-zA-Z]\.\s+',      # Letter lists: a., b., etc.
+    r'^\s*[ivx]+\.\s+',        # Roman numerals: i., ii., etc.
+]
+
+def is_short_uppercase_title(text):
+    """Short uppercase text often indicates headings or titles."""
+    return len(text) < 80 and text.isupper() and len(text) > 5
+
+def is_short_label(text):
+    """Text ending with colon often indicates section headers."""
+    return len(text) < 100 and text.endswith(':')
+
+class ConversionMetrics:
+    """
+    Wall and CPU time per pipeline stage, plus the slowest pages.
+    
+    Stages: open, analyze, get_text (PyMuPDF parsing), ocr (rendering and
+    Tesseract, only for pages without text), classification (turning text
+    blocks into elements), page_cache, markdown, write and total.
+    analyze includes the parsing of its sample pages, which is also counted
+    under get_text. With worker processes, page-level stages are summed over
+    all workers, so they can add up to more than the total wall time.
+    
+    Only the slowest pages are kept (in a small heap), so the metrics stay
+    small even for very large documents. Metrics from workers or from
+    several files can be combined with merge(), and to_dict() returns plain
+    data for JSON output.
+    """
+    
+    def __init__(self, slow_page_count=10):
+        self.slow_page_count = slow_page_count
+        self.stages = {}
+        self.pages_timed = 0
+        self._slow_pages = []  # Min-heap of (wall, page_number, cpu)
+    
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to the named stage."""
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_wall, time.process_time() - start_cpu)
+    
+    def add(self, name, wall, cpu, calls=1):
+        """Add measured time to a stage."""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0}
+        stage['wall_seconds'] += wall
+        stage['cpu_seconds'] += cpu
+        stage['calls'] += calls
+    
+    def record_page(self, page_number, wall, cpu):
+        """Record how long one page took, keeping only the slowest pages."""
+        self.pages_timed += 1
+        entry = (wall, page_number, cpu)
+        if len(self._slow_pages) < self.slow_page_count:
+            heapq.heappush(self._slow_pages, entry)
+        elif entry > self._slow_pages[0]:
+            heapq.heapreplace(self._slow_pages, entry)
+    
+    def slowest_pages(self):
+        """The slowest pages, slowest first, as dictionaries."""
+        return [{'page': page_number, 'wall_seconds': wall, 'cpu_seconds': cpu}
+                for wall, page_number, cpu in sorted(self._slow_pages, reverse=True)]
+    
+    def merge(self, other, include_pages=True):
+        """
+        Add the measurements of another ConversionMetrics (or its to_dict()).
+        
+        Use include_pages=False when combining different documents, where
+        page numbers would be ambiguous.
+        """
+        if isinstance(other, ConversionMetrics):
+            other = other.to_dict()
+        
+        for name, stage in other['stages'].items():
+            self.add(name, stage['wall_seconds'], stage['cpu_seconds'], stage['calls'])
+        
+        if not include_pages:
+            return
+        
+        # Page counts are added as a whole; slow pages go through the heap
+        self.pages_timed += other['pages_timed']
+        for page in other['slowest_pages']:
+            self.pages_timed -= 1
+            self.record_page(page['page'], page['wall_seconds'], page['cpu_seconds'])
+    
+    def to_dict(self):
+        """Plain data version of the metrics, suitable for JSON."""
+        return {
+            'stages': {name: dict(stage) for name, stage in self.stages.items()},
+            'pages_timed': self.pages_timed,
+            'slowest_pages': self.slowest_pages()
+        }
+    
+    def report_lines(self):
+        """Human readable summary, one line per stage and slow page."""
+        lines = ["Stage timings (wall / CPU seconds):"]
+        for name, stage in self.stages.items():
+            lines.append(f"  {name:<15} {stage['wall_seconds']:9.3f} / {stage['cpu_seconds']:9.3f}"
+                         f"  ({stage['calls']} calls)")
+        
+        if self._slow_pages:
+            lines.append(f"Slowest pages (of {self.pages_timed}):")
+            for page in self.slowest_pages():
+                lines.append(f"  page {page['page']:<6} {page['wall_seconds']:9.3f} s wall, "
+                             f"{page['cpu_seconds']:.3f} s CPU")
+        
+        return lines
+
+def process_rss_mb(pid=None):
+    """
+    Current resident memory of a process (default: this one) in MB.
+    
+    Read from /proc where available. Elsewhere only this process can be
+    measured, through its peak RSS; None means it cannot be measured.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'r') as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    
+    if pid is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return None
+
+class ResourceLimits:
+    """
+    Time and memory budgets for converting one document.
+    
+    document_seconds and page_seconds limit the wall time of a whole document
+    and of a single page, memory_mb caps the resident memory of the
+    converting process, and documents_per_worker recycles batch worker
+    processes after that many documents. None disables a limit.
+    
+    A converter with limits checks them between pages and stops cleanly,
+    keeping the pages done so far (see PDFToMarkdownConverter.incomplete).
+    A page that hangs inside PyMuPDF never reaches that check, so batch runs
+    additionally supervise their workers from outside (GovernedPool).
+    """
+    
+    def __init__(self, document_seconds=None, page_seconds=None, memory_mb=None,
+                 documents_per_worker=None):
+        self.document_seconds = document_seconds
+        self.page_seconds = page_seconds
+        self.memory_mb = memory_mb
+        self.documents_per_worker = documents_per_worker
+    
+    def supervised(self):
+        """True when worker processes need an outside supervisor."""
+        return any(limit is not None for limit in (self.document_seconds, self.page_seconds,
+                                                    self.memory_mb, self.documents_per_worker))
+    
+    def exceeded(self, document_seconds, page_seconds, rss_mb=None):
+        """Return the reason a budget is exceeded, or None if all are kept."""
+        if self.page_seconds is not None and page_seconds > self.page_seconds:
+            return f"page took {page_seconds:.2f} s (page budget {self.page_seconds:g} s)"
+        if self.document_seconds is not None and document_seconds > self.document_seconds:
+            return f"document took {document_seconds:.2f} s (budget {self.document_seconds:g} s)"
+        if self.memory_mb is not None:
+            if rss_mb is None:
+                rss_mb = process_rss_mb()
+            if rss_mb is not None and rss_mb > self.memory_mb:
+                return f"memory reached {rss_mb:.0f} MB (ceiling {self.memory_mb:g} MB)"
+        return None
+
+class LineClassifier:
+    """
+    Rule engine that classifies one line of text in a single pass.
+    
+    Pattern rules are compiled once into a single combined regular
+    expression, so every line is tested against all of them with one match
+    call. The match also tells where a list marker ends, so the Markdown
+    stage does not need another regular expression to strip it. Patterns
+    that cannot share that expression, because they have groups of their
+    own (backreferences would be renumbered) or global inline flags such
+    as (?i), are compiled and matched separately, still in rule order.
+    Predicate rules (plain functions of the text) run afterwards, in the
+    order they were registered.
+    
+    Register your own rules with add_pattern() and add_predicate(). When the
+    converter uses worker processes, predicates must be module-level
+    functions so that they can be sent to the workers.
+    """
+    
+    def __init__(self):
+        self.pattern_rules = []    # (content_type, pattern, strip_marker)
+        self.predicate_rules = []  # (content_type, predicate)
+        self._compiled = False
+        
+        for pattern in LIST_MARKER_PATTERNS:
+            self.add_pattern('list_item', pattern)
+        self.add_predicate('heading', is_short_uppercase_title)
+        self.add_predicate('heading', is_short_label)
+    
+    def add_pattern(self, content_type, pattern, strip_marker=True, first=False):
+        """
+        Classify lines matching pattern (at the start of the line) as content_type.
+        
+        With strip_marker, the matched text is treated as a marker and left
+        out of the Markdown output (as for list bullets). Rules added with
+        first=True are tried before all existing pattern rules.
+        
+        Raises re.error for a pattern that does not compile.
+        """
+        rule = (content_type, pattern, strip_marker)
+        if first:
+            self.pattern_rules.insert(0, rule)
+        else:
+            self.pattern_rules.append(rule)
+        try:
+            # Report invalid patterns when they are registered, not on the first line
+            self._compile()
+        except re.error:
+            self.pattern_rules.remove(rule)
+            self._compiled = False
+            raise
+    
+    def add_predicate(self, content_type, predicate, first=False):
+        """Classify lines for which predicate(text) is true as content_type."""
+        rule = (content_type, predicate)
+        if first:
+            self.predicate_rules.insert(0, rule)
+        else:
+            self.predicate_rules.append(rule)
+        self._compiled = False
+    
+    @staticmethod
+    def _combinable(pattern):
+        """Whether pattern can be one alternative of a combined expression."""
+        try:
+            return re.compile(f"(?:{pattern})").groups == 0
+        except re.error:
+            # Global inline flags are only allowed at the very start
+            return False
+    
+    def _compile(self):
+        """Build the combined patterns and the lookup tables used by classify()."""
+        # (regex, result) for a separate pattern, (regex, {group name: result})
+        # for a run of combined ones
+        self._matchers = []
+        groups = {}
+        for index, (content_type, pattern, strip_marker) in enumerate(self.pattern_rules):
+            result = (content_type_code(content_type), strip_marker)
+            if self._combinable(pattern):
+                groups[f"_rule{index}"] = (pattern, result)
+                continue
+            self._add_combined(groups)
+            groups = {}
+            self._matchers.append((re.compile(pattern), result))
+        self._add_combined(groups)
+        
+        self._predicates = [(content_type_code(content_type), predicate)
+                            for content_type, predicate in self.predicate_rules]
+        self._compiled = True
+    
+    def _add_combined(self, groups):
+        """Compile a run of combinable pattern rules into one alternation."""
+        if groups:
+            combined = re.compile('|'.join(f"(?P<{name}>{pattern})" for name, (pattern, _) in groups.items()))
+            self._matchers.append((combined, {name: result for name, (_, result) in groups.items()}))
+    
+    def classify(self, text):
+        """
+        Return (type_code, marker_end) for a line of text.
+        
+        type_code indexes CONTENT_TYPES; text[marker_end:] is the line
+        without its list marker (marker_end is 0 when nothing is stripped).
+        """
+        if not self._compiled:
+            self._compile()
+        
+        for regex, results in self._matchers:
+            match = regex.match(text)
+            if match is not None:
+                type_code, strip_marker = results if isinstance(results, tuple) else results[match.lastgroup]
+                return type_code, (match.end() if strip_marker else 0)
+        
+        for type_code, predicate in self._predicates:
+            if predicate(text):
+                return type_code, 0
+        
+        return PARAGRAPH, 0
+    
+    def signature(self):
+        """Stable description of the rules, used in cache keys."""
+        return ([list(rule) for rule in self.pattern_rules]
+                + [[content_type, f"{predicate.__module__}.{predicate.__qualname__}"]
+                   for content_type, predicate in self.predicate_rules])
+    
+    def __getstate__(self):
+        # Compiled tables hold interned codes of this process; rebuild them after unpickling
+        return {'pattern_rules': self.pattern_rules, 'predicate_rules': self.predicate_rules}
+    
+    def __setstate__(self, state):
+        self.pattern_rules = state['pattern_rules']
+        self.predicate_rules = state['predicate_rules']
+        self._compiled = False
 
 class PDFToMarkdownConverter:
     """
@@ -49,27 +924,77 @@ class PDFToMarkdownConverter:
     - Advanced layout analysis
     """
     
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, workers=1, quiet=False, page_cache=None, classifier=None,
+                 ocr=None, limits=None):
         """
         Initialize converter with configurable settings.
         
         The verbose flag demonstrates how to build user-friendly tools
         that provide appropriate feedback during long-running operations.
+        The workers setting splits page extraction across processes, so
+        large documents can use every core of the machine. The quiet flag
+        keeps warnings out of the console (batch mode collects them instead).
+        An optional PageCache lets unchanged pages skip extraction entirely.
+        A LineClassifier with custom rules can be passed as classifier.
+        An OCREngine as ocr turns on the OCR fallback for image-only pages.
+        ResourceLimits as limits stop a conversion that runs over its budget.
         """
         self.verbose = verbose
+        self.quiet = quiet
+        self.warnings = []
+        self.page_cache = page_cache
+        self.ocr = ocr
+        self.limits = limits
+        self.workers = max(1, int(workers))
         
         # These thresholds can be adjusted based on document types
         # Students should experiment with different values for their use cases
         self.heading_font_threshold = 14.0  # Fonts larger than this become headings
         self.line_spacing_threshold = 1.5    # Line spacing for paragraph breaks
         
+        # Or measure the body size of each document and derive headings from it
+        # (see AdaptiveHeadings); font_profile holds the last measurement
+        self.adaptive_headings = False
+        self.font_profile = None
+        
+        # Remove running headers, footers and page numbers (see RunningLineFilter)
+        self.strip_running_lines = False
+        
+        # Keyword arguments for ChunkedMarkdownWriter; when set, convert_file
+        # writes a directory of chunks instead of a single Markdown file
+        self.chunking = None
+        
+        # Text rules are compiled once here instead of for every line
+        self.classifier = classifier if classifier is not None else LineClassifier()
+        
+        # Parsed pages and page cache lookups shared between the analysis
+        # and extraction stages
+        self._page_cache_doc = None
+        self._page_dict_cache = {}
+        self._page_entries = {}
+        
         # Statistics tracking for educational feedback
-        self.stats = {
+        self.stats = self._new_stats()
+        
+        # Timing per stage and per page, replaced for every converted file
+        self.metrics = ConversionMetrics()
+        
+        # Why the last conversion stopped early (None when it completed), and
+        # an optional callback(page_number, offset, element_count, stats)
+        # run after every page written by convert_file
+        self.incomplete = None
+        self.progress = None
+    
+    def _new_stats(self):
+        """Return a fresh set of statistics counters."""
+        return {
             'pages_processed': 0,
             'text_blocks_found': 0,
             'headings_detected': 0,
             'paragraphs_created': 0,
-            'list_items_found': 0
+            'list_items_found': 0,
+            'pages_ocr': 0,
+            'running_lines_removed': 0
         }
     
     def log(self, message):
@@ -82,61 +1007,47 @@ class PDFToMarkdownConverter:
         if self.verbose:
             print(f"[.PDF to .md] {message}")
     
-    def analyze_pdf_structure(self, pdf_path):
+    def warn(self, message):
+        """
+        Report a problem the user should see even without --verbose.
+        
+        Warnings are also kept in self.warnings, so batch runs can
+        summarize them instead of printing them for every file.
+        """
+        self.warnings.append(message)
+        if not self.quiet:
+            print(message)
+    
+    def analyze_pdf_structure(self, pdf_path, doc=None, pages=None):
         """
         Analyze PDF to understand its structure and content type.
         
         This analysis helps determine the best processing strategy
         and provides educational insights about document characteristics.
+        
+        An already open document can be passed as doc. The parsed sample
+        pages (or their page cache lookups) are then kept, so the extraction
+        stage reuses them instead of parsing or looking up the same pages a
+        second time.
+        With a page selection (see select_pages), only selected pages are sampled.
+        
         Returns a dictionary with analysis results.
         """
+        owns_doc = doc is None
         try:
-            doc = fitz.open(pdf_path)
-            analysis = {
-                'total_pages': len(doc),
-                'has_text_content': False,
-                'avg_chars_per_page': 0,
-                'font_sizes_found': set(),
-                'estimated_type': 'unknown'
-            }
-            
-            total_chars = 0
-            sample_pages = min(3, len(doc))  # Sample first 3 pages for analysis
-            
-            self.log(f"Analyzing {sample_pages} sample pages from {len(doc)} total pages")
-            
-            for page_num in range(sample_pages):
-                page = doc[page_num]
-                
-                # Extract text with formatting information
-                blocks = page.get_text("dict")
-                page_chars = 0
-                
-                for block in blocks.get("blocks", []):
-                    if block.get("type") == 0:  # Text blocks only
-                        for line in block.get("lines", []):
-                            for span in line.get("spans", []):
-                                text = span.get("text", "").strip()
-                                if text:
-                                    page_chars += len(text)
-                                    font_size = span.get("size", 0)
-                                    analysis['font_sizes_found'].add(round(font_size, 1))
-                
-                total_chars += page_chars
+            if owns_doc:
+                doc = open_pdf(pdf_path)
             
-            # Calculate metrics for document type detection
-            analysis['avg_chars_per_page'] = total_chars / sample_pages if sample_pages > 0 else 0
-            analysis['has_text_content'] = analysis['avg_chars_per_page'] > 50
+            # Sample the first 3 (selected) pages for analysis
+            sample = select_pages(pages, len(doc))[:3]
+            sample_pages = len(sample)
             
-            # Determine document type based on content analysis
-            if analysis['avg_chars_per_page'] > 200:
-                analysis['estimated_type'] = 'text_rich'
-            elif analysis['avg_chars_per_page'] > 50:
-                analysis['estimated_type'] = 'text_sparse'
-            else:
-                analysis['estimated_type'] = 'image_based'
+            self.log(f"Analyzing {sample_pages} sample pages from {len(doc)} total pages")
             
-            doc.close()
+            # Extract text with formatting information (or reuse cached page summaries)
+            summaries = [self._sample_page_summary(doc, page_num, keep=not owns_doc)
+                         for page_num in sample]
+            analysis = self._analysis_from_summaries(len(doc), summaries)
             
             self.log(f"Analysis complete: {analysis['estimated_type']} document with {analysis['avg_chars_per_page']:.1f} chars/page")
             
@@ -145,6 +1056,121 @@ class PDFToMarkdownConverter:
         except Exception as e:
             self.log(f"Analysis failed: {e}")
             return {'estimated_type': 'error', 'error': str(e)}
+        finally:
+            if owns_doc and doc is not None:
+                doc.close()
+    
+    def analysis_from_page_dicts(self, total_pages, page_dicts):
+        """
+        Compute the document analysis from pages that were already parsed.
+        
+        page_dicts are results of page.get_text("dict") for the sampled pages.
+        Keeping this separate from file access means the analysis can be
+        derived from data the pipeline already holds.
+        """
+        summaries = [self._page_text_summary(blocks) for blocks in page_dicts]
+        return self._analysis_from_summaries(total_pages, summaries)
+    
+    def _page_text_summary(self, blocks):
+        """
+        Reduce a parsed page to what the analysis needs: (char_count, font_sizes).
+        
+        The summary is small enough to be stored in the page cache.
+        """
+        page_chars = 0
+        font_sizes = set()
+        
+        for block in blocks.get("blocks", []):
+            if block.get("type") == 0:  # Text blocks only
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        text = span.get("text", "").strip()
+                        if text:
+                            page_chars += len(text)
+                            font_size = span.get("size", 0)
+                            font_sizes.add(round(font_size, 1))
+        
+        return page_chars, font_sizes
+    
+    def _sample_page_summary(self, doc, page_num, keep):
+        """Text summary of an analysis sample page, from the page cache if possible."""
+        if self.page_cache is not None:
+            key = self._page_key(doc, page_num)
+            if keep:
+                # Extraction takes this lookup over, so each page is counted once
+                entry = self.page_cache.get(key)
+                self._use_page_doc(doc)
+                self._page_entries[page_num] = (key, entry)
+            else:
+                entry = self.page_cache.get(key, count=False)
+            if entry is not None:
+                page_chars, font_sizes = entry['summary']
+                return page_chars, set(font_sizes)
+        
+        return self._page_text_summary(self._get_page_dict(doc, page_num, keep=keep))
+    
+    def _analysis_from_summaries(self, total_pages, summaries):
+        """Build the analysis dictionary from per-page (char_count, font_sizes) summaries."""
+        analysis = {
+            'total_pages': total_pages,
+            'has_text_content': False,
+            'avg_chars_per_page': 0,
+            'font_sizes_found': set(),
+            'estimated_type': 'unknown'
+        }
+        
+        total_chars = 0
+        sample_pages = len(summaries)
+        
+        for page_chars, font_sizes in summaries:
+            total_chars += page_chars
+            analysis['font_sizes_found'].update(font_sizes)
+        
+        # Calculate metrics for document type detection
+        analysis['avg_chars_per_page'] = total_chars / sample_pages if sample_pages > 0 else 0
+        analysis['has_text_content'] = analysis['avg_chars_per_page'] > 50
+        
+        # Determine document type based on content analysis
+        if analysis['avg_chars_per_page'] > 200:
+            analysis['estimated_type'] = 'text_rich'
+        elif analysis['avg_chars_per_page'] > 50:
+            analysis['estimated_type'] = 'text_sparse'
+        else:
+            analysis['estimated_type'] = 'image_based'
+        
+        return analysis
+    
+    def _get_page_dict(self, doc, page_num, keep=False):
+        """
+        Return page.get_text("dict") for a page, parsing it at most once.
+        
+        Pages parsed with keep=True stay in a small per-document cache until
+        they are requested again without keep, which hands them over to the
+        extraction stage and frees the cache entry.
+        """
+        self._use_page_doc(doc)
+        page_dict = self._page_dict_cache.pop(page_num, None)
+        if page_dict is None:
+            with self.metrics.stage('get_text'):
+                page_dict = doc[page_num].get_text("dict")
+        
+        if keep:
+            self._page_dict_cache[page_num] = page_dict
+        
+        return page_dict
+    
+    def _use_page_doc(self, doc):
+        """Start over with the per-document caches when doc is a different document."""
+        if doc is not self._page_cache_doc:
+            self._page_cache_doc = doc
+            self._page_dict_cache = {}
+            self._page_entries = {}
+    
+    def _release_page_cache(self):
+        """Drop cached page dictionaries and lookups and the reference to their document."""
+        self._page_cache_doc = None
+        self._page_dict_cache = {}
+        self._page_entries = {}
     
     def extract_structured_content(self, pdf_path):
         """
@@ -154,28 +1180,17 @@ class PDFToMarkdownConverter:
         information about fonts, positions, and formatting that helps determine
         document structure (headings, paragraphs, lists).
         
-        Returns a list of content elements with type and formatting metadata.
+        When more than one worker is configured, the page range is split
+        across a process pool. The merged result keeps the exact page order,
+        so the output is identical to the serial path.
+        
+        Returns content elements with type and formatting metadata, as a
+        ContentElements store.
         """
         try:
-            doc = fitz.open(pdf_path)
-            content_elements = []
-            
-            self.log(f"Processing {len(doc)} pages for content extraction")
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                self.stats['pages_processed'] += 1
-                
-                # Get text blocks with detailed formatting information
-                blocks = page.get_text("dict")
-                
-                for block in blocks.get("blocks", []):
-                    if block.get("type") == 0:  # Process text blocks only
-                        self.stats['text_blocks_found'] += 1
-                        block_elements = self._process_text_block(block, page_num + 1)
-                        content_elements.extend(block_elements)
-            
-            doc.close()
+            content_elements = ContentElements()
+            for _, page_elements in self.iter_page_elements(pdf_path):
+                content_elements.extend(page_elements)
             
             self.log(f"Extraction complete: {len(content_elements)} content elements found")
             
@@ -183,91 +1198,431 @@ class PDFToMarkdownConverter:
             
         except Exception as e:
             self.log(f"Content extraction failed: {e}")
-            return []
+            return ContentElements()
     
-    def _process_text_block(self, block, page_number):
+    def iter_markdown(self, pdf_path, pages=None):
         """
-        Process individual text blocks to extract lines with formatting information.
+        Yield (page_number, markdown) for a PDF, one page at a time.
         
-        This internal method shows how to handle the detailed structure that
-        PyMuPDF provides, converting it into a more manageable format for
-        document structure analysis.
+        Nothing is written to disk and no statistics header is produced,
+        which suits indexers and interactive previews: the first page is
+        available as soon as it is converted, and pages after the point where
+        the caller stops iterating are never parsed. pages selects pages
+        like the --pages option, e.g. "1-20,45".
+        
+        A paragraph that continues on the next page is emitted with the page
+        where it ends. Joining all chunks gives the document body. For
+        chunks on disk, see ChunkedMarkdownWriter.
         """
-        elements = []
+        body = MarkdownBody(self)
+        last_page = None
         
-        for line in block.get("lines", []):
-            line_text = ""
-            font_sizes = []
-            font_flags = []
-            
-            # Combine all spans in a line while tracking formatting
-            for span in line.get("spans", []):
-                text = span.get("text", "").strip()
-                if text:
-                    line_text += text + " "
-                    font_sizes.append(span.get("size", 12))
-                    font_flags.append(span.get("flags", 0))
-            
-            # Create content element if line has meaningful text
-            if line_text.strip():
-                avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-                
-                element = {
-                    'text': line_text.strip(),
-                    'font_size': avg_font_size,
-                    'page': page_number,
-                    'type': self._classify_content_type(line_text.strip(), avg_font_size),
-                    'formatting': {
-                        'bold': any(f & 2**4 for f in font_flags),  # Bold flag
-                        'italic': any(f & 2**1 for f in font_flags)  # Italic flag
-                    }
-                }
-                
-                elements.append(element)
+        for page_number, elements in self.iter_page_elements(pdf_path, pages=pages):
+            body.add_elements(elements)
+            lines = body.take_lines()
+            last_page = page_number
+            if lines:
+                yield page_number, '\n'.join(lines) + '\n'
         
-        return elements
+        body.finish()
+        lines = body.take_lines()
+        if lines:
+            yield last_page, '\n'.join(lines) + '\n'
+    
+    def iter_page_elements(self, pdf_path, doc=None, pages=None):
+        """
+        Yield (page_number, content_elements) for every page, in page order.
+        
+        This generator is the streaming counterpart of extract_structured_content:
+        only a bounded number of pages is held in memory at any time, which
+        lets very large documents convert in roughly constant memory.
+        
+        Pass an already open document as doc to share it (and its page
+        cache) with analyze_pdf_structure. pages limits the work to a page
+        selection (see select_pages); other pages are never parsed, and a
+        caller that stops iterating early stops the extraction too.
+        
+        With strip_running_lines, the pages pass through RunningLineFilter,
+        and with adaptive_headings through AdaptiveHeadings; both hold back a
+        few pages only.
+        """
+        owns_doc = doc is None
+        if owns_doc:
+            doc = open_pdf(pdf_path)
+        try:
+            page_numbers = select_pages(pages, len(doc))
+            
+            self.log(f"Processing {len(page_numbers)} of {len(doc)} pages for content extraction")
+            
+            extracted = self._iter_extracted_pages(pdf_path, doc, page_numbers)
+            if self.strip_running_lines:
+                extracted = RunningLineFilter(self).filter_pages(extracted)
+            if self.adaptive_headings:
+                extracted = AdaptiveHeadings(self).resolve_pages(extracted)
+            yield from extracted
+        finally:
+            self._release_page_cache()
+            if owns_doc:
+                doc.close()
+    
+    def _iter_extracted_pages(self, pdf_path, doc, page_numbers):
+        """Extract the selected pages serially, in a page pool or in the OCR pipeline."""
+        if self.workers > 1 and len(page_numbers) > 1:
+            # Pages already parsed during analysis are finished here,
+            # the remaining ones go to the process pool
+            first = 0
+            while (first < len(page_numbers) and self._page_cache_doc is doc
+                   and (page_numbers[first] in self._page_dict_cache
+                        or page_numbers[first] in self._page_entries)):
+                yield page_numbers[first] + 1, self._page_elements(doc, page_numbers[first])
+                first += 1
+            
+            if first < len(page_numbers):
+                yield from self._iter_parallel_pages(pdf_path, page_numbers[first:])
+        elif self.ocr is not None and self.ocr.workers > 1 and len(page_numbers) > 1:
+            yield from self._iter_ocr_pipeline(pdf_path, doc, page_numbers)
+        else:
+            for page_num in page_numbers:
+                yield page_num + 1, self._page_elements(doc, page_num)
+    
+    def _page_elements(self, doc, page_num):
+        """
+        Content elements for one page of an open document.
+        
+        With a page cache configured, pages whose content did not change
+        since an earlier conversion are served from the cache, together with
+        their statistics, and are never parsed.
+        """
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        
+        if self.page_cache is None:
+            elements = self._extract_page(self._page_blocks(doc, page_num), page_num + 1)
+        else:
+            elements = self._cached_page_elements(doc, page_num)
+        
+        self.metrics.record_page(page_num + 1, time.perf_counter() - start_wall,
+                                 time.process_time() - start_cpu)
+        return elements
+    
+    def _page_blocks(self, doc, page_num):
+        """
+        The parsed text of a page: its text layer, or OCR output for
+        image-only pages when an OCR engine is configured.
+        """
+        blocks = self._get_page_dict(doc, page_num)
+        if self.ocr is not None and self.ocr.needs_ocr(blocks):
+            with self.metrics.stage('ocr'):
+                blocks = self.ocr.page_blocks(doc[page_num])
+        return blocks
+    
+    def _cached_page_elements(self, doc, page_num):
+        """Look a page up in the page cache, extracting and storing it on a miss."""
+        key, elements = self._page_cache_lookup(doc, page_num)
+        if elements is not None:
+            return elements
+        return self._store_page(key, self._page_blocks(doc, page_num), page_num)
+    
+    def _page_cache_lookup(self, doc, page_num):
+        """Return (key, elements) for a page; elements is None on a cache miss."""
+        # Sample pages were already looked up during the analysis
+        looked_up = self._page_entries.pop(page_num, None) if self._page_cache_doc is doc else None
+        if looked_up is not None:
+            key, entry = looked_up
+        else:
+            with self.metrics.stage('page_cache'):
+                key = self._page_key(doc, page_num)
+                entry = self.page_cache.get(key)
+        
+        if entry is None:
+            return key, None
+        
+        self._page_dict_cache.pop(page_num, None)
+        self._merge_stats(entry['stats'])
+        # The same page may have moved since it was cached
+        return key, ContentElements.from_columns(entry['elements'], page_num + 1)
+    
+    def _page_key(self, doc, page_num):
+        """Page cache key of a page under the current settings."""
+        return self.page_cache.page_key(doc[page_num], self._settings_key(),
+                                        include_images=self.ocr is not None)
+    
+    def _store_page(self, key, blocks, page_num):
+        """Extract a page from its parsed blocks and add it to the page cache."""
+        stats_before = dict(self.stats)
+        elements = self._extract_page(blocks, page_num + 1)
+        page_chars, font_sizes = self._page_text_summary(blocks)
+        
+        with self.metrics.stage('page_cache'):
+            self.page_cache.put(key, {
+                'elements': elements.to_columns(),
+                'stats': {name: value - stats_before.get(name, 0) for name, value in self.stats.items()},
+                'summary': [page_chars, sorted(font_sizes)]
+            })
+        
+        return elements
+    
+    def _extract_page(self, blocks, page_number):
+        """
+        Extract the content elements of a single page.
+        
+        blocks is the page.get_text("dict") result for the page. This is the
+        unit of work shared by the serial path and the process pool workers.
+        """
+        page_elements = ContentElements()
+        self.stats['pages_processed'] += 1
+        if blocks.get("ocr"):
+            self.stats['pages_ocr'] += 1
+        
+        page_height = blocks.get("height")
+        with self.metrics.stage('classification'):
+            for block in blocks.get("blocks", []):
+                if block.get("type") == 0:  # Process text blocks only
+                    self.stats['text_blocks_found'] += 1
+                    self._process_text_block(block, page_number, page_elements, page_height)
+        
+        return page_elements
+    
+    def _iter_parallel_pages(self, pdf_path, page_numbers):
+        """
+        Extract pages with a process pool, yielding them in page order.
+        
+        Each worker opens its own document, because fitz documents cannot
+        be shared between processes. Only a small window of page ranges is
+        in flight at once, so results never pile up in memory faster than
+        the consumer handles them. Worker statistics are added to self.stats,
+        and their page cache hits and misses to self.page_cache.
+        If the consumer stops early, queued ranges are cancelled.
+        """
+        # A few ranges per worker keeps the pool busy when pages differ in cost,
+        # and a cap on range length keeps each result small
+        page_count = len(page_numbers)
+        parts = max(self.workers * 4, -(-page_count // PAGES_PER_TASK))
+        page_ranges = [page_numbers[start:stop]
+                       for start, stop in _split_page_range(page_count, parts)]
+        config = self._worker_config()
+        
+        self.log(f"Using {self.workers} workers for {len(page_ranges)} page ranges")
+        
+        # Every worker opens the document once and keeps it for all its ranges
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_page_worker,
+                                       initargs=(_shareable_source(pdf_path), config))
+        try:
+            pending = deque()
+            next_range = 0
+            while pending or next_range < len(page_ranges):
+                while next_range < len(page_ranges) and len(pending) < self.workers * 2:
+                    page_range = page_ranges[next_range]
+                    pending.append((page_range, executor.submit(_extract_pages_worker, page_range)))
+                    next_range += 1
+                
+                page_range, future = pending.popleft()
+                pages, stats, metrics, (hits, misses) = future.result()
+                self._merge_stats(stats)
+                self.metrics.merge(metrics)
+                if self.page_cache is not None:
+                    self.page_cache.hits += hits
+                    self.page_cache.misses += misses
+                for page_num, page_elements in zip(page_range, pages):
+                    yield page_num + 1, page_elements
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _iter_ocr_pipeline(self, pdf_path, doc, page_numbers):
+        """
+        Serial extraction with OCR pages handed to a process pool.
+        
+        Text pages are extracted here as usual. Pages that need OCR are
+        rendered and recognised by self.ocr.workers processes in the
+        background, so several scanned pages are worked on at once while the
+        text pages after them keep being extracted. Pages are still yielded
+        in page order. At most two OCR pages per worker are in flight, and
+        extracted pages waiting behind them are bounded as well.
+        """
+        window = self.ocr.workers * 2
+        executor = ProcessPoolExecutor(max_workers=self.ocr.workers, initializer=_init_ocr_worker,
+                                       initargs=(_shareable_source(pdf_path), self.ocr))
+        try:
+            pending = deque()  # (page_num, cache key, elements or OCR future)
+            in_flight = 0
+            for page_num in page_numbers:
+                start_wall = time.perf_counter()
+                start_cpu = time.process_time()
+                
+                key = elements = None
+                if self.page_cache is not None:
+                    key, elements = self._page_cache_lookup(doc, page_num)
+                if elements is None:
+                    blocks = self._get_page_dict(doc, page_num)
+                    if self.ocr.needs_ocr(blocks):
+                        elements = executor.submit(_ocr_page_worker, page_num)
+                        in_flight += 1
+                    elif key is None:
+                        elements = self._extract_page(blocks, page_num + 1)
+                    else:
+                        elements = self._store_page(key, blocks, page_num)
+                
+                self.metrics.record_page(page_num + 1, time.perf_counter() - start_wall,
+                                         time.process_time() - start_cpu)
+                pending.append((page_num, key, elements))
+                
+                # Hand over everything that is ready; wait only when the window is full
+                while pending and (in_flight >= window or len(pending) > window * PAGES_PER_TASK
+                                   or not isinstance(pending[0][2], Future) or pending[0][2].done()):
+                    if isinstance(pending[0][2], Future):
+                        in_flight -= 1
+                    yield self._finish_pipelined_page(*pending.popleft())
+            
+            while pending:
+                yield self._finish_pipelined_page(*pending.popleft())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _finish_pipelined_page(self, page_num, key, elements):
+        """Complete a page from _iter_ocr_pipeline, classifying OCR results."""
+        if isinstance(elements, Future):
+            blocks, metrics = elements.result()
+            self.metrics.merge(metrics, include_pages=False)
+            if key is None:
+                elements = self._extract_page(blocks, page_num + 1)
+            else:
+                elements = self._store_page(key, blocks, page_num)
+        
+        return page_num + 1, elements
+    
+    def _worker_settings(self):
+        """
+        Collect the settings a worker process needs to classify content
+        exactly like this converter does.
+        """
+        return {
+            'heading_font_threshold': self.heading_font_threshold,
+            'line_spacing_threshold': self.line_spacing_threshold,
+            'adaptive_headings': self.adaptive_headings,
+            'strip_running_lines': self.strip_running_lines,
+        }
+    
+    def _worker_config(self):
+        """Everything a worker process needs to build an equivalent converter."""
+        return {
+            'settings': self._worker_settings(),
+            'classifier': self.classifier,
+            'page_cache': self.page_cache,
+            'ocr': self.ocr,
+            'limits': self.limits
+        }
+    
+    def _settings_key(self):
+        """Stable text form of the classifier settings, used in cache keys."""
+        return json.dumps({'settings': self._worker_settings(),
+                           'rules': self.classifier.signature(),
+                           'ocr': self.ocr.signature() if self.ocr is not None else None},
+                          sort_keys=True)
+    
+    def _merge_stats(self, stats):
+        """Add statistics counters collected elsewhere (e.g. by a worker)."""
+        for key, value in stats.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+    
+    def _process_text_block(self, block, page_number, elements=None, page_height=None):
+        """
+        Process individual text blocks to extract lines with formatting information.
+        
+        This internal method shows how to handle the detailed structure that
+        PyMuPDF provides, converting it into a more manageable format for
+        document structure analysis.
+        
+        Lines are appended to elements (a ContentElements store), which is
+        created when not given, and the store is returned. With page_height,
+        each line also records its vertical position band.
+        """
+        if elements is None:
+            elements = ContentElements()
+        
+        for line in block.get("lines", []):
+            line_text = ""
+            font_sizes = []
+            font_flags = 0
+            
+            # Combine all spans in a line while tracking formatting
+            for span in line.get("spans", []):
+                text = span.get("text", "").strip()
+                if text:
+                    line_text += text + " "
+                    font_sizes.append(span.get("size", 12))
+                    font_flags |= span.get("flags", 0)
+            
+            # Create content element if line has meaningful text
+            line_text = line_text.strip()
+            if line_text:
+                avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
+                
+                flags = 0
+                if font_flags & 2**4:  # Bold flag
+                    flags |= FLAG_BOLD
+                if font_flags & 2**1:  # Italic flag
+                    flags |= FLAG_ITALIC
+                
+                # Font size based classification (most reliable for digital PDFs).
+                # Adaptive headings judge the size later, once the document's
+                # font profile is known, and count the types then
+                if avg_font_size > self.heading_font_threshold and not self.adaptive_headings:
+                    type_code, marker_end = HEADING, 0
+                else:
+                    type_code, marker_end = self.classifier.classify(line_text)
+                
+                if not self.adaptive_headings:
+                    stat = TYPE_STATS.get(type_code)
+                    if stat is not None:
+                        self.stats[stat] += 1
+                
+                band = NO_BAND
+                if page_height and "bbox" in line:
+                    y0, y1 = line["bbox"][1], line["bbox"][3]
+                    band = min(POSITION_BANDS - 1, max(0, int((y0 + y1) / 2 / page_height * POSITION_BANDS)))
+                
+                elements.add(line_text, avg_font_size, page_number, type_code, flags, marker_end, band)
+        
+        return elements
     
     def _classify_content_type(self, text, font_size):
         """
         Classify text content into structural types: heading, paragraph, list_item.
         
         This classification logic is intentionally simple and extensible.
-        Students can enhance this with machine learning approaches,
-        more sophisticated pattern matching, or domain-specific rules.
+        Font size decides first; the text rules live in self.classifier,
+        where students can register their own patterns, or plug in machine
+        learning approaches and domain-specific rules.
         """
         
         # Font size based classification (most reliable for digital PDFs)
         if font_size > self.heading_font_threshold:
-            self.stats['headings_detected'] += 1
-            return 'heading'
-        
-        # Pattern-based classification for special content types
-        list_patterns = [
-            r'^\s*[-*+]\s+',           # Bullet lists: -, *, +
-            r'^\s*\d+\.\s+',           # Numbered lists: 1., 2., etc.
-            r'^\s*\d+\)\s+',           # Numbered lists: 1), 2), etc.
-            r'^\s*[a-zA-Z]\.\s+',      # Letter lists: a., b., etc.
-            r'^\s*[ivx]+\.\s+',        # Roman numerals: i., ii., etc.
-        ]
-        
-        for pattern in list_patterns:
-            if re.match(pattern, text):
-                self.stats['list_items_found'] += 1
-                return 'list_item'
+            type_code = HEADING
+        else:
+            type_code, _ = self.classifier.classify(text)
         
-        # Short uppercase text often indicates headings or titles
-        if len(text) < 80 and text.isupper() and len(text) > 5:
-            self.stats['headings_detected'] += 1
-            return 'heading'
+        stat = TYPE_STATS.get(type_code)
+        if stat is not None:
+            self.stats[stat] += 1
         
-        # Text ending with colon often indicates section headers
-        if len(text) < 100 and text.endswith(':'):
-            self.stats['headings_detected'] += 1
-            return 'heading'
+        return CONTENT_TYPES[type_code]
+    
+    def _elements_from_dicts(self, content_elements):
+        """
+        Build a ContentElements store from element dictionaries.
         
-        # Default classification
-        self.stats['paragraphs_created'] += 1
-        return 'paragraph'
+        List markers are located with the classifier, so list items coming
+        from outside the extraction stage are formatted the same way.
+        """
+        elements = ContentElements()
+        for element in content_elements:
+            marker_end = 0
+            if element['type'] == 'list_item':
+                type_code, marker_end = self.classifier.classify(element['text'])
+                if type_code != LIST_ITEM:
+                    marker_end = 0
+            elements.append(element, marker_end)
+        return elements
     
     def generate_markdown(self, content_elements):
         """
@@ -281,77 +1636,166 @@ class PDFToMarkdownConverter:
         if not content_elements:
             return "# Conversion Error\n\nNo content could be extracted from the PDF."
         
-        markdown_lines = []
-        current_paragraph_lines = []
-        heading_counter = {'h1': 0, 'h2': 0, 'h3': 0}
-        
         self.log(f"Generating Markdown from {len(content_elements)} content elements")
         
         # Add document header with conversion metadata
-        markdown_lines.extend([
+        markdown_lines = self._markdown_header_lines(len(content_elements))
+        
+        body = MarkdownBody(self)
+        body.add_elements(content_elements)
+        body.finish()
+        markdown_lines.extend(body.take_lines())
+        
+        result = '\n'.join(markdown_lines)
+        
+        self.log(f"Markdown generation complete: {len(result)} characters, {len(markdown_lines)} lines")
+        
+        return result
+    
+    def _markdown_header_lines(self, element_count, padding="", stats=None):
+        """
+        Build the document header with conversion statistics.
+        
+        The optional padding fills the blank line before the separator. The
+        streaming writer uses it to reserve room for the final numbers.
+        stats defaults to self.stats.
+        """
+        return [
             "# Converted Document",
-            "",
-            f"**Conversion Statistics:**",
-            f"- Pages processed: {self.stats['pages_processed']}",
-            f"- Content elements: {len(content_elements)}",
-            f"- Headings detected: {self.stats['headings_detected']}",
-            f"- Paragraphs created: {self.stats['paragraphs_created']}",
-            f"- List items found: {self.stats['list_items_found']}",
-            "",
+            ""
+        ] + self._statistics_lines(element_count, stats) + [
+            padding,
             "---",
             ""
-        ])
+        ]
+    
+    def _statistics_lines(self, element_count, stats=None):
+        """The conversion statistics block of the header (or trailer)."""
+        stats = self.stats if stats is None else stats
+        return [
+            f"**Conversion Statistics:**",
+            f"- Pages processed: {stats['pages_processed']}",
+            f"- Content elements: {element_count}",
+            f"- Headings detected: {stats['headings_detected']}",
+            f"- Paragraphs created: {stats['paragraphs_created']}",
+            f"- List items found: {stats['list_items_found']}"
+        ]
+    
+    def _fitted_header(self, element_count, reserved, stats=None):
+        """The statistics header, padded to exactly `reserved` characters."""
+        header = '\n'.join(self._markdown_header_lines(element_count, stats=stats))
+        padding = reserved - len(header)
+        if padding < 0:
+            raise ValueError("Statistics header does not fit in the reserved space")
+        return '\n'.join(self._markdown_header_lines(element_count, " " * padding, stats=stats))
+    
+    def _incomplete_note(self, reason):
+        """Closing note of a document that was not converted completely."""
+        return f"\n\n> **Incomplete conversion:** {reason}\n"
+    
+    def write_markdown_stream(self, page_elements, output_file):
+        """
+        Write Markdown to a text file while pages are still being extracted.
         
-        for element in content_elements:
-            content_type = element['type']
-            text = element['text']
+        page_elements is an iterable of (page_number, content_elements), such
+        as iter_page_elements(). Each page is turned into Markdown and written
+        immediately, with the paragraph buffer carried across page boundaries.
+        
+        The statistics header is only known at the end. For seekable files, a
+        placeholder of fixed size is written first and patched in place
+        afterwards; its spare room is filled with spaces on the blank line
+        before the separator, which Markdown renders as an empty line.
+        Streams that cannot seek (pipes, stdout) get the statistics as a
+        trailer at the end of the document instead, and their title is held
+        back until the first body text: a document without any elements
+        writes nothing at all, so the caller can still report the failure
+        cleanly. When self.incomplete is set by the time the pages run out,
+        a note with the reason closes the body.
+        
+        Returns a dictionary with element, character and line counts.
+        """
+        metrics = self.metrics
+        seekable = output_file.seekable()
+        if seekable:
+            placeholder = '\n'.join(self._markdown_header_lines(0, " " * HEADER_RESERVE))
+            with metrics.stage('write'):
+                header_start = output_file.tell()
+                output_file.write(placeholder)
+            pending = ''
+        else:
+            placeholder = '\n'.join(self._markdown_header_lines(0)[:2])
+            header_start = 0
+            pending = placeholder
+        
+        body = MarkdownBody(self)
+        counts = {'elements': 0, 'characters': len(placeholder),
+                  'newlines': placeholder.count('\n'), 'last_char': placeholder[-1:]}
+        
+        def write_lines():
+            nonlocal pending
+            with metrics.stage('markdown'):
+                lines = body.take_lines()
+                if not lines:
+                    return
+                chunk = '\n' + '\n'.join(lines)
             
-            if content_type == 'heading':
-                # Flush any accumulated paragraph content before adding heading
-                if current_paragraph_lines:
-                    paragraph_text = ' '.join(current_paragraph_lines)
-                    markdown_lines.append(self._format_paragraph(paragraph_text))
-                    markdown_lines.append("")
-                    current_paragraph_lines = []
-                
-                # Determine heading level based on font size and content
-                heading_level = self._determine_heading_level(element)
-                heading_marker = '#' * heading_level
-                
-                # Track heading statistics
-                heading_key = f'h{heading_level}'
-                if heading_key in heading_counter:
-                    heading_counter[heading_key] += 1
-                
-                markdown_lines.append(f"{heading_marker} {text}")
-                markdown_lines.append("")
-                
-            elif content_type == 'list_item':
-                # Flush paragraph content before starting list
-                if current_paragraph_lines:
-                    paragraph_text = ' '.join(current_paragraph_lines)
-                    markdown_lines.append(self._format_paragraph(paragraph_text))
-                    markdown_lines.append("")
-                    current_paragraph_lines = []
-                
-                # Clean up list item text and format as Markdown list
-                clean_text = re.sub(r'^\s*[-*+\d+\.\)\w\.]?\s*', '', text)
-                markdown_lines.append(f"- {clean_text}")
-                
-            else:  # paragraph content
-                # Accumulate paragraph lines for better text flow
-                current_paragraph_lines.append(text)
+            with metrics.stage('write'):
+                output_file.write(pending + chunk)
+            pending = ''
+            counts['characters'] += len(chunk)
+            counts['newlines'] += chunk.count('\n')
+            counts['last_char'] = chunk[-1]
         
-        # Handle any remaining paragraph content
-        if current_paragraph_lines:
-            paragraph_text = ' '.join(current_paragraph_lines)
-            markdown_lines.append(self._format_paragraph(paragraph_text))
+        for _, elements in page_elements:
+            counts['elements'] += len(elements)
+            with metrics.stage('markdown'):
+                body.add_elements(elements)
+            write_lines()
         
-        result = '\n'.join(markdown_lines)
+        with metrics.stage('markdown'):
+            body.finish()
+        write_lines()
         
-        self.log(f"Markdown generation complete: {len(result)} characters, {len(markdown_lines)} lines")
+        element_count = counts['elements']
+        if not seekable and element_count == 0:
+            # Nothing was written; the caller reports the empty document
+            return {'elements': 0, 'characters': 0, 'lines': 0}
         
-        return result
+        if self.incomplete:
+            note = self._incomplete_note(self.incomplete)
+            with metrics.stage('write'):
+                output_file.write(pending + note)
+            pending = ''
+            counts['characters'] += len(note)
+            counts['newlines'] += note.count('\n')
+            counts['last_char'] = note[-1]
+        
+        if seekable:
+            # Patch the real statistics into the reserved header space
+            header = self._fitted_header(element_count, len(placeholder))
+            with metrics.stage('write'):
+                end_position = output_file.tell()
+                output_file.seek(header_start)
+                output_file.write(header)
+                output_file.seek(end_position)
+        else:
+            trailer = '\n'.join(["", "", "---", ""] + self._statistics_lines(element_count) + [""])
+            with metrics.stage('write'):
+                output_file.write(pending + trailer)
+            counts['characters'] += len(trailer)
+            counts['newlines'] += trailer.count('\n')
+            counts['last_char'] = trailer[-1]
+        
+        char_count = counts['characters']
+        line_count = counts['newlines'] + (0 if counts['last_char'] == '\n' else 1)
+        
+        self.log(f"Markdown generation complete: {char_count} characters, {line_count} lines")
+        
+        return {
+            'elements': element_count,
+            'characters': char_count,
+            'lines': line_count
+        }
     
     def _determine_heading_level(self, element):
         """
@@ -364,8 +1808,17 @@ class PDFToMarkdownConverter:
         font_size = element['font_size']
         text = element['text']
         
+        profile = self.font_profile if self.adaptive_headings else None
+        if profile is not None:
+            # Tiers measured on this document, largest first
+            for level, lower_bound in enumerate(profile['tiers'], 1):
+                if font_size >= lower_bound:
+                    return level
+            if font_size > profile['heading_threshold']:
+                return min(3, len(profile['tiers']) + 1)
+        
         # Font size based levels (most reliable for digital documents)
-        if font_size > 20:
+        elif font_size > 20:
             return 1
         elif font_size > 16:
             return 2
@@ -404,7 +1857,22 @@ class PDFToMarkdownConverter:
         
         return text
     
-    def convert_pdf_to_markdown(self, pdf_path, output_path=None):
+    def _write_to_file_object(self, page_elements, output_file):
+        """Stream Markdown into a caller's file object, text or binary."""
+        if isinstance(output_file, (io.RawIOBase, io.BufferedIOBase)):
+            text_file = io.TextIOWrapper(output_file, encoding='utf-8')
+            try:
+                return self.write_markdown_stream(page_elements, text_file)
+            finally:
+                # Hand the binary file back to the caller still open
+                text_file.flush()
+                text_file.detach()
+        
+        result = self.write_markdown_stream(page_elements, output_file)
+        output_file.flush()
+        return result
+    
+    def convert_pdf_to_markdown(self, pdf_path, output_path=None, pages=None):
         """
         Main conversion method that orchestrates the entire PDF to Markdown process.
         
@@ -412,128 +1880,1982 @@ class PDFToMarkdownConverter:
         1. Input validation and setup
         2. Document analysis and structure detection
         3. Content extraction with formatting preservation
-        4. Markdown generation and formatting
-        5. Output file creation and error handling
+        4. Markdown generation, streamed page by page into the output file
+        5. Error handling and reporting
+        
+        pdf_path may also be PDF data in memory (bytes, memoryview, mmap),
+        and output_path may be any writable text file object, such as
+        sys.stdout. pages optionally limits the conversion to a selection
+        like "1-20,45".
         
         Returns True on success, False on failure.
         """
         
-        self.log(f"Starting PDF to Markdown conversion: {pdf_path}")
+        self.log(f"Starting PDF to Markdown conversion: {describe_source(pdf_path)}")
         
         # Validate input file
-        if not os.path.exists(pdf_path):
+        if is_pdf_path(pdf_path) and not os.path.exists(pdf_path):
             print(f"Error: PDF file not found: {pdf_path}")
             return False
         
         # Determine output file path
         if output_path is None:
+            if not is_pdf_path(pdf_path):
+                print("Error: An output path or file object is required for in-memory PDFs")
+                return False
             pdf_name = Path(pdf_path).stem
-            output_path = f"{pdf_name}.md"
+            output_path = f"{pdf_name}_chunks" if self.chunking is not None else f"{pdf_name}.md"
         
-        self.log(f"Output will be written to: {output_path}")
+        output_name = output_path if isinstance(output_path, (str, os.PathLike)) else getattr(
+            output_path, 'name', '<file object>')
+        self.log(f"Output will be written to: {output_name}")
         
         try:
-            # Step 1: Analyze document structure
-            analysis = self.analyze_pdf_structure(pdf_path)
-            
-            if analysis['estimated_type'] == 'error':
-                print(f"Error: Cannot process PDF: {analysis.get('error', 'Unknown error')}")
-                return False
+            result = self.convert_file(pdf_path, output_path, pages=pages)
             
-            if analysis['estimated_type'] == 'image_based':
-                print("Warning: This appears to be a scanned/image-based PDF.")
-                print("Text extraction may be limited. Consider adding OCR capabilities.")
-                print("See OCR extension hints in the source code comments.")
+        except ConversionError as e:
+            print(f"Error: {e}")
+            return False
             
-            # Step 2: Extract structured content
-            content_elements = self.extract_structured_content(pdf_path)
+        except Exception as e:
+            print(f"Conversion failed: {e}")
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            return False
+        
+        # Report success with statistics
+        analysis = result['analysis']
+        
+        print(f"Conversion successful!")
+        print(f"Output file: {output_name}")
+        print(f"Generated {result['lines']} lines, {result['characters']} characters")
+        print(f"Document analysis: {analysis['estimated_type']} with {analysis['avg_chars_per_page']:.1f} chars/page")
+        
+        if self.verbose:
+            print("\nDetailed Statistics:")
+            for key, value in self.stats.items():
+                print(f"  {key.replace('_', ' ').title()}: {value}")
+        
+        print("\nThe generated Markdown file is ready for use with document readers,")
+        print("note-taking applications, or further processing.")
+        
+        return True
+    
+    def _governed_pages(self, page_elements, output_file, started):
+        """
+        Pass pages through to the writer, enforcing self.limits between pages.
+        
+        When a budget is exceeded, iteration stops after the page that
+        exceeded it and self.incomplete records why; the pages written so far
+        are kept. self.progress, if set, is told about every page once it
+        has been written (the writer asks for the next page only then).
+        """
+        element_count = 0
+        try:
+            requested = time.perf_counter()
+            for page_number, elements in page_elements:
+                page_seconds = time.perf_counter() - requested
+                element_count += len(elements)
+                yield page_number, elements
+                
+                if self.progress is not None:
+                    output_file.flush()
+                    self.progress(page_number, output_file.tell(), element_count, dict(self.stats))
+                
+                if self.limits is not None:
+                    reason = self.limits.exceeded(time.perf_counter() - started, page_seconds)
+                    if reason:
+                        self.incomplete = f"stopped after page {page_number}: {reason}"
+                        return
+                requested = time.perf_counter()
+        finally:
+            page_elements.close()
+    
+    def _raise_no_content(self):
+        """Raise the error for a conversion that produced no elements."""
+        if self.incomplete:
+            raise ResourceLimitExceeded(f"No content before the limit was reached ({self.incomplete})")
+        raise ConversionError("No text content could be extracted from the PDF.")
+    
+    def convert_file(self, pdf_path, output_path, pages=None):
+        """
+        Convert one PDF into one Markdown file without any console reporting.
+        
+        This is the reusable core of convert_pdf_to_markdown, used directly by
+        batch processing. Statistics start from zero for every call, so a
+        single converter can handle many documents.
+        
+        pdf_path is a path or in-memory PDF data (bytes, bytearray,
+        memoryview, mmap); nothing is copied to a temporary file.
+        output_path is a path or a writable file object (text, or binary
+        such as io.BytesIO, which receives UTF-8).
+        
+        With self.chunking set, output_path is the directory that receives
+        the chunks and their manifest (see ChunkedMarkdownWriter).
+        
+        Timings for the run are collected in self.metrics. With
+        self.limits set, a document that runs over its budget is cut short:
+        the pages converted so far are kept and result['incomplete'] says why.
+        
+        Returns a dictionary with the analysis and output statistics.
+        Raises ConversionError when the PDF cannot be converted.
+        """
+        self.stats = self._new_stats()
+        self.metrics = ConversionMetrics()
+        self.incomplete = None
+        total_wall = time.perf_counter()
+        total_cpu = time.process_time()
+        
+        # The document is opened once and shared by all stages
+        try:
+            with self.metrics.stage('open'):
+                doc = open_pdf(pdf_path)
+        except Exception as e:
+            raise ConversionError(f"Cannot process PDF: {e}")
+        
+        try:
+            if pages is not None and not select_pages(pages, len(doc)):
+                raise ConversionError(f"No pages selected (the document has {len(doc)} pages)")
             
-            if not content_elements:
-                print("Error: No text content could be extracted from the PDF.")
-                return False
+            # Step 1: Analyze document structure
+            with self.metrics.stage('analyze'):
+                analysis = self.analyze_pdf_structure(pdf_path, doc=doc, pages=pages)
             
-            # Step 3: Generate Markdown output
-            markdown_content = self.generate_markdown(content_elements)
+            if analysis['estimated_type'] == 'error':
+                raise ConversionError(f"Cannot process PDF: {analysis.get('error', 'Unknown error')}")
             
-            # Step 4: Write output file
-            with open(output_path, 'w', encoding='utf-8') as output_file:
-                output_file.write(markdown_content)
+            if analysis['estimated_type'] == 'image_based':
+                if self.ocr is not None:
+                    self.log("Scanned/image-based PDF: pages without a text layer will be OCR'd")
+                else:
+                    self.warn("Warning: This appears to be a scanned/image-based PDF.\n"
+                              "Text extraction may be limited. Run with --ocr to OCR\n"
+                              "pages without a text layer (needs pytesseract and tesseract).")
             
-            # Step 5: Report success with statistics
-            file_size = len(markdown_content)
-            line_count = len(markdown_content.splitlines())
+            # Steps 2-4: Extract content and stream Markdown into the output file
+            page_elements = self.iter_page_elements(pdf_path, doc=doc, pages=pages)
             
-            print(f"Conversion successful!")
-            print(f"Output file: {output_path}")
-            print(f"Generated {line_count} lines, {file_size} characters")
-            print(f"Document analysis: {analysis['estimated_type']} with {analysis['avg_chars_per_page']:.1f} chars/page")
+            if self.chunking is not None:
+                if not isinstance(output_path, (str, os.PathLike)):
+                    raise ConversionError("Chunked output needs a directory path")
+                writer = ChunkedMarkdownWriter(self, output_path, **self.chunking)
+                if self.limits is not None or self.progress is not None:
+                    page_elements = self._governed_pages(page_elements, writer, total_wall)
+                try:
+                    result = writer.write(page_elements, describe_source(pdf_path))
+                except Exception:
+                    writer.discard()
+                    raise
+                if result['elements'] == 0:
+                    self._raise_no_content()
+            elif not isinstance(output_path, (str, os.PathLike)):
+                if self.limits is not None or self.progress is not None:
+                    page_elements = self._governed_pages(page_elements, output_path, total_wall)
+                result = self._write_to_file_object(page_elements, output_path)
+                if result['elements'] == 0:
+                    self._raise_no_content()
+            else:
+                try:
+                    with open(output_path, 'w', encoding='utf-8') as output_file:
+                        if self.limits is not None or self.progress is not None:
+                            page_elements = self._governed_pages(page_elements, output_file, total_wall)
+                        result = self.write_markdown_stream(page_elements, output_file)
+                except Exception:
+                    # Do not leave a half-written Markdown file behind
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                    raise
+                
+                if result['elements'] == 0:
+                    os.remove(output_path)
+                    self._raise_no_content()
             
-            if self.verbose:
-                print("\nDetailed Statistics:")
-                for key, value in self.stats.items():
-                    print(f"  {key.replace('_', ' ').title()}: {value}")
+            if self.page_cache is not None:
+                self.log(f"Page cache: {self.page_cache.hits} hits, {self.page_cache.misses} misses")
+            if self.stats['pages_ocr']:
+                self.log(f"OCR: {self.stats['pages_ocr']} pages recognised with Tesseract")
             
-            print("\nThe generated Markdown file is ready for use with document readers,")
-            print("note-taking applications, or further processing.")
+            if self.incomplete:
+                self.warn(f"Warning: Incomplete conversion, {self.incomplete}")
             
-            return True
+            result['analysis'] = analysis
+            result['pages'] = self.stats['pages_processed']
+            result['incomplete'] = self.incomplete
+            return result
             
-        except Exception as e:
-            print(f"Conversion failed: {e}")
-            if self.verbose:
-                import traceback
-                traceback.print_exc()
-            return False
+        finally:
+            doc.close()
+            self.metrics.add('total', time.perf_counter() - total_wall,
+                             time.process_time() - total_cpu)
 
-def setup_command_line_interface():
+class PageCache:
     """
-    Set up command-line argument parsing for user-friendly tool operation.
+    Persistent page-level cache of extracted content elements (SQLite).
     
-    This function demonstrates how to create professional command-line tools
-    that are intuitive for users while providing flexibility for advanced use cases.
+    Entries are keyed by a hash of the page's content stream, its fonts and
+    geometry plus the classifier settings. When a large PDF is revised, only
+    the pages that really changed need get_text("dict") again.
+    
+    The cache is bounded: when its stored size exceeds max_bytes, the least
+    recently used entries are evicted. Several processes can share one cache
+    file (the database runs in WAL mode). A PageCache can be passed to
+    process pool workers; each process opens its own connection.
     """
     
-    parser = argparse.ArgumentParser(
-        description=".PDF to .md - Convert PDF documents to Markdown format",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  python pdf_to_md.py document.pdf
-  python pdf_to_md.py research_paper.pdf --output paper.md
-  python pdf_to_md.py complex_doc.pdf --verbose
-
-Educational Notes:
-  This tool demonstrates fundamental document processing concepts.
-  Extend it with OCR capabilities, web interfaces, or batch processing.
-  Perfect foundation for learning about text extraction and format conversion.
-
-OCR Extension:
-  For scanned PDFs, add OCR capabilities with tesseract and pdf2image.
-  See source code comments for implementation hints.
-        """
-    )
+    def __init__(self, path, max_bytes=DEFAULT_PAGE_CACHE_BYTES):
+        self.path = str(path)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._connect()
     
-    parser.add_argument(
-        'pdf_file',
-        help='Path to the PDF file to convert'
-    )
+    def _connect(self):
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self.connection.commit()
+        self._total_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
     
-    parser.add_argument(
-        '-o', '--output',
-        help='Output Markdown file path (default: same name as PDF with .md extension)'
-    )
+    def __getstate__(self):
+        # Connections cannot be pickled; workers reconnect to the same file
+        return {'path': self.path, 'max_bytes': self.max_bytes}
     
-    parser.add_argument(
-        '-v', '--verbose',
-        action='store_true',
-        help='Enable verbose output for detailed processing information'
-    )
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.max_bytes = state['max_bytes']
+        self.hits = 0
+        self.misses = 0
+        self._connect()
     
-    return parser
-
-def main():
-    """
-    Main entry point for the PDF to Markdown conversion tool.
+    @staticmethod
+    def page_key(page, settings_key, include_images=False):
+        """
+        Hash everything that determines a page's extracted text.
+        
+        Font xrefs are left out on purpose: they are renumbered when a PDF is
+        rewritten, even if the page itself did not change. Text drawn by
+        Form XObjects lives in their own streams, which are hashed along
+        with the page's. With OCR, the text can also come from images, so
+        include_images adds their raw (still compressed) data to the hash.
+        """
+        doc = page.parent
+        digest = hashlib.sha256()
+        digest.update(f"{PAGE_CACHE_VERSION}:{settings_key}".encode('utf-8'))
+        digest.update(repr((tuple(page.rect), page.rotation)).encode('utf-8'))
+        digest.update(repr([font[1:] for font in page.get_fonts()]).encode('utf-8'))
+        digest.update(page.read_contents())
+        for xref, name, _, _ in page.get_xobjects():
+            digest.update(name.encode('utf-8'))
+            digest.update(doc.xref_stream(xref) or b'')
+        if include_images:
+            for image in page.get_images():
+                digest.update(doc.xref_stream_raw(image[0]) or b'')
+        return digest.hexdigest()
+    
+    def get(self, key, count=True):
+        """
+        Return the cached entry for key (marking it recently used), or None.
+        
+        With count=False, the lookup is left out of hits and misses.
+        """
+        row = self.connection.execute("SELECT data FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            if count:
+                self.misses += 1
+            return None
+        
+        if count:
+            self.hits += 1
+        self.connection.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+        return json.loads(zlib.decompress(row[0]))
+    
+    def put(self, key, entry):
+        """Store an entry, evicting old entries if the cache grows too large."""
+        data = zlib.compress(json.dumps(entry, separators=(',', ':')).encode('utf-8'))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, data, len(data), time.time()))
+        self.connection.commit()
+        
+        self._total_bytes += len(data)
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+    
+    def evict(self):
+        """Remove least recently used entries until the cache is below 90% of its limit."""
+        self._total_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        target = self.max_bytes * 0.9
+        
+        if self._total_bytes > target:
+            excess = self._total_bytes - target
+            cursor = self.connection.execute("SELECT key, size FROM pages ORDER BY last_used")
+            doomed = []
+            for key, size in cursor:
+                doomed.append((key,))
+                excess -= size
+                self._total_bytes -= size
+                if excess <= 0:
+                    break
+            self.connection.executemany("DELETE FROM pages WHERE key = ?", doomed)
+            self.connection.commit()
+    
+    def close(self):
+        self.connection.close()
+
+class OCREngine:
+    """
+    OCR fallback for pages without a usable text layer (local Tesseract).
+    
+    A page is OCR'd when it has fewer than min_chars characters of
+    extractable text and contains at least one image, so blank pages and
+    vector drawings are left alone. The decision is made per page.
+    
+    The page is rendered to a grayscale pixmap at dpi, recognised with
+    pytesseract.image_to_data(), and words below min_confidence are dropped.
+    Each Tesseract paragraph becomes one text block in the same layout as
+    page.get_text("dict"), with a font size estimated from the word heights,
+    so OCR text goes through the normal classification.
+    
+    Recognition is by far the most expensive step, so with a PageCache the
+    result is cached under a hash of the rendered pixels: re-runs only
+    render the page. workers is the size of the OCR process pool used by a
+    converter with a single worker (see _iter_ocr_pipeline).
+    
+    Needs the optional packages pytesseract and pillow, plus the tesseract
+    program. An OCREngine can be passed to process pool workers.
+    """
+    
+    def __init__(self, language='eng', dpi=OCR_DEFAULT_DPI, workers=1, cache=None,
+                 min_chars=OCR_MIN_CHARS, min_confidence=OCR_MIN_CONFIDENCE):
+        self.language = language
+        self.dpi = int(dpi)
+        self.workers = max(1, int(workers))
+        self.cache = cache
+        self.min_chars = min_chars
+        self.min_confidence = min_confidence
+    
+    @staticmethod
+    def check():
+        """
+        Make sure pytesseract, pillow and the tesseract program are available.
+        
+        Returns the Tesseract version; raises ConversionError otherwise.
+        """
+        try:
+            import pytesseract
+            import PIL  # noqa: F401 - needed by pytesseract for in-memory images
+        except ImportError:
+            raise ConversionError("OCR needs the pytesseract and pillow packages "
+                                  "(pip install pytesseract pillow)")
+        try:
+            return pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            raise ConversionError("OCR needs the tesseract program (https://github.com/tesseract-ocr/tesseract)")
+    
+    def signature(self):
+        """Settings that change OCR output, for cache keys."""
+        return [self.language, self.dpi, self.min_chars, self.min_confidence]
+    
+    def needs_ocr(self, blocks):
+        """True when a parsed page has (almost) no text but does show an image."""
+        page_chars = 0
+        has_image = False
+        for block in blocks.get("blocks", []):
+            if block.get("type") == 1:
+                has_image = True
+            elif block.get("type") == 0:
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        page_chars += len(span.get("text", "").strip())
+        return has_image and page_chars < self.min_chars
+    
+    def page_blocks(self, page):
+        """Render and OCR one page; returns blocks like page.get_text("dict")."""
+        pixmap = page.get_pixmap(dpi=self.dpi, colorspace=fitz.csGRAY, alpha=False)
+        
+        key = None
+        if self.cache is not None:
+            digest = hashlib.sha256()
+            digest.update(f"ocr:{OCR_CACHE_VERSION}:{json.dumps(self.signature())}".encode('utf-8'))
+            digest.update(repr((pixmap.width, pixmap.height)).encode('utf-8'))
+            digest.update(pixmap.samples_mv)
+            key = 'ocr:' + digest.hexdigest()
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+        
+        blocks = self.recognize(pixmap)
+        if key is not None:
+            self.cache.put(key, blocks)
+        return blocks
+    
+    def recognize(self, pixmap):
+        """Run Tesseract on a grayscale pixmap."""
+        import pytesseract
+        from PIL import Image
+        
+        image = Image.frombuffer('L', (pixmap.width, pixmap.height), pixmap.samples_mv,
+                                 'raw', 'L', pixmap.stride, 1)
+        data = pytesseract.image_to_data(image, lang=self.language,
+                                         output_type=pytesseract.Output.DICT)
+        
+        # Group words into lines and lines into paragraphs, in reading order
+        paragraphs = {}
+        for index, word in enumerate(data['text']):
+            word = word.strip()
+            if not word or float(data['conf'][index]) < self.min_confidence:
+                continue
+            paragraph = paragraphs.setdefault((data['block_num'][index], data['par_num'][index]), {})
+            line = paragraph.setdefault(data['line_num'][index], {'words': [], 'height': 0})
+            line['words'].append(word)
+            line['height'] = max(line['height'], data['height'][index])
+        
+        points_per_pixel = 72 / self.dpi
+        blocks = []
+        for paragraph in paragraphs.values():
+            lines = [{'spans': [{'text': ' '.join(line['words']),
+                                 'size': round(line['height'] * points_per_pixel, 1),
+                                 'flags': 0}]}
+                     for line in paragraph.values()]
+            blocks.append({'type': 0, 'lines': lines})
+        
+        return {'blocks': blocks, 'ocr': True}
+
+class MarkdownBody:
+    """
+    Incremental Markdown builder for the document body.
+    
+    Elements can be added in any number of batches (for example one page
+    at a time). The paragraph buffer is kept between batches, so a paragraph
+    that continues on the next page is still joined into one Markdown
+    paragraph. Finished lines are collected until take_lines() is called.
+    """
+    
+    def __init__(self, converter):
+        self.converter = converter
+        self.lines = []
+        self.current_paragraph_lines = []
+        self.heading_counter = {'h1': 0, 'h2': 0, 'h3': 0}
+    
+    def add_elements(self, content_elements):
+        """
+        Turn content elements into Markdown lines.
+        
+        Accepts a ContentElements store (read column by column) or any
+        iterable of element dictionaries.
+        """
+        if not isinstance(content_elements, ContentElements):
+            content_elements = self.converter._elements_from_dicts(content_elements)
+        
+        types = content_elements.types
+        markers = content_elements.markers
+        
+        for index, text in enumerate(content_elements.texts):
+            content_type = CONTENT_TYPES[types[index]]
+            
+            if content_type == 'heading':
+                # Flush any accumulated paragraph content before adding heading
+                self._flush_paragraph()
+                
+                # Determine heading level based on font size and content
+                element = ElementView(content_elements, index)
+                heading_level = self.converter._determine_heading_level(element)
+                heading_marker = '#' * heading_level
+                
+                # Track heading statistics
+                heading_key = f'h{heading_level}'
+                if heading_key in self.heading_counter:
+                    self.heading_counter[heading_key] += 1
+                
+                self.lines.append(f"{heading_marker} {text}")
+                self.lines.append("")
+                
+            elif content_type == 'list_item':
+                # Flush paragraph content before starting list
+                self._flush_paragraph()
+                
+                # The classifier already found where the list marker ends
+                self.lines.append(f"- {text[markers[index]:]}")
+                
+            else:  # paragraph content
+                # Accumulate paragraph lines for better text flow
+                self.current_paragraph_lines.append(text)
+    
+    def _flush_paragraph(self):
+        """Emit the buffered paragraph followed by a blank line."""
+        if self.current_paragraph_lines:
+            paragraph_text = ' '.join(self.current_paragraph_lines)
+            self.lines.append(self.converter._format_paragraph(paragraph_text))
+            self.lines.append("")
+            self.current_paragraph_lines = []
+    
+    def finish(self):
+        """Handle any remaining paragraph content at the end of the document."""
+        if self.current_paragraph_lines:
+            paragraph_text = ' '.join(self.current_paragraph_lines)
+            self.lines.append(self.converter._format_paragraph(paragraph_text))
+            self.current_paragraph_lines = []
+    
+    def take_lines(self):
+        """Return the Markdown lines produced so far and start a new batch."""
+        lines = self.lines
+        self.lines = []
+        return lines
+
+class ChunkedMarkdownWriter:
+    """
+    Writes a document as numbered Markdown chunk files plus a JSON manifest.
+    
+    With split='headings', a chunk ends before each heading of level
+    CHUNK_SPLIT_LEVEL or higher once it holds at least min_chars characters;
+    with split='pages', it ends every pages_per_chunk pages. Either way a
+    chunk that grows past max_chars ends at the next page boundary.
+    
+    The manifest (CHUNK_MANIFEST_NAME) lists every chunk with its file,
+    title, page span, size in bytes and byte offset in the joined body,
+    followed by the conversion statistics. A reader only needs the manifest
+    to show a table of contents, and fetches chunks as they are viewed.
+    Chunks are written as soon as they are complete, so memory use is
+    bounded by the chunk size, not the document.
+    """
+    
+    def __init__(self, converter, output_dir, split='headings', pages_per_chunk=CHUNK_PAGES,
+                 min_chars=CHUNK_MIN_CHARS, max_chars=CHUNK_MAX_CHARS):
+        if split not in ('headings', 'pages'):
+            raise ValueError(f"Unknown chunk split: {split}")
+        self.converter = converter
+        self.output_dir = Path(output_dir)
+        self.split = split
+        self.pages_per_chunk = pages_per_chunk
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.chunks = []
+        self.offset = 0
+        self.written = []
+        self._start_chunk()
+    
+    def _start_chunk(self):
+        self.lines = []
+        self.characters = 0
+        self.first_page = None
+        self.last_page = None
+        self.title = None
+        self.level = None
+    
+    def _append(self, lines, page_number):
+        """Add finished Markdown lines, produced on page_number, to the open chunk."""
+        if not lines:
+            return
+        self.lines.extend(lines)
+        self.characters += sum(len(line) + 1 for line in lines)
+        if self.first_page is None:
+            self.first_page = page_number
+        self.last_page = page_number
+    
+    def _close_chunk(self):
+        """Write the open chunk to its file and record it in the manifest."""
+        while self.lines and not self.lines[-1]:
+            self.lines.pop()
+        if self.lines:
+            data = ('\n'.join(self.lines) + '\n').encode('utf-8')
+            name = f"chunk-{len(self.chunks) + 1:04d}.md"
+            path = self.output_dir / name
+            with open(path, 'wb') as chunk_file:
+                chunk_file.write(data)
+            self.written.append(path)
+            
+            title = self.title
+            if title is None:
+                title = (f"Page {self.first_page}" if self.first_page == self.last_page
+                         else f"Pages {self.first_page}-{self.last_page}")
+            self.chunks.append({
+                'file': name,
+                'title': title,
+                'level': self.level,
+                'first_page': self.first_page,
+                'last_page': self.last_page,
+                'bytes': len(data),
+                'offset': self.offset
+            })
+            self.offset += len(data)
+        self._start_chunk()
+    
+    def flush(self):
+        """Chunks need no flushing; this lets _governed_pages handle the writer like a file."""
+    
+    def tell(self):
+        """Bytes written so far, like a file's position (used for progress reports)."""
+        return self.offset
+    
+    def write(self, page_elements, source=None):
+        """
+        Convert (page_number, content_elements) pairs into chunks.
+        
+        Returns a dictionary with element, character, line and chunk counts.
+        """
+        converter = self.converter
+        metrics = converter.metrics
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        body = MarkdownBody(converter)
+        heading_code = CONTENT_TYPES.index('heading')
+        element_count = 0
+        characters = 0
+        lines = 0
+        
+        def add(elements, page_number):
+            nonlocal characters, lines
+            with metrics.stage('markdown'):
+                body.add_elements(elements)
+                finished = body.take_lines()
+            characters += sum(len(line) + 1 for line in finished)
+            lines += len(finished)
+            self._append(finished, page_number)
+        
+        for page_number, elements in page_elements:
+            element_count += len(elements)
+            
+            if (self.split == 'pages' and self.first_page is not None
+                    and page_number - self.first_page >= self.pages_per_chunk):
+                with metrics.stage('write'):
+                    self._close_chunk()
+            
+            start = 0
+            for index, type_code in enumerate(elements.types):
+                if type_code != heading_code:
+                    continue
+                with metrics.stage('markdown'):
+                    level = converter._determine_heading_level(ElementView(elements, index))
+                
+                if (self.split == 'headings' and level <= CHUNK_SPLIT_LEVEL
+                        and self.characters + sum(map(len, body.current_paragraph_lines)) >= self.min_chars):
+                    if index > start:
+                        add(elements.subset(range(start, index)), page_number)
+                    with metrics.stage('markdown'):
+                        body.finish()
+                        finished = body.take_lines()
+                    characters += sum(len(line) + 1 for line in finished)
+                    lines += len(finished)
+                    self._append(finished, page_number)
+                    with metrics.stage('write'):
+                        self._close_chunk()
+                    start = index
+                
+                if self.title is None:
+                    self.title = elements.texts[index]
+                    self.level = level
+            
+            add(elements.subset(range(start, len(elements))) if start else elements, page_number)
+            
+            if self.characters >= self.max_chars:
+                with metrics.stage('write'):
+                    self._close_chunk()
+        
+        with metrics.stage('markdown'):
+            body.finish()
+            finished = body.take_lines()
+        characters += sum(len(line) + 1 for line in finished)
+        lines += len(finished)
+        self._append(finished, self.last_page)
+        
+        if converter.incomplete:
+            note = converter._incomplete_note(converter.incomplete).strip('\n')
+            self._append(["", note], self.last_page)
+        
+        with metrics.stage('write'):
+            self._close_chunk()
+            if element_count:
+                self._remove_stale_chunks()
+                self._write_manifest(source, element_count)
+        
+        converter.log(f"Chunked output complete: {len(self.chunks)} chunks in {self.output_dir}")
+        
+        return {
+            'elements': element_count,
+            'characters': characters,
+            'lines': lines,
+            'chunks': len(self.chunks)
+        }
+    
+    def _write_manifest(self, source, element_count):
+        """Write the manifest atomically, after all chunks it lists exist."""
+        stats = self.converter.stats
+        manifest = {
+            'version': CHUNK_MANIFEST_VERSION,
+            'source': source,
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'split': self.split,
+            'bytes': self.offset,
+            'statistics': {
+                'pages_processed': stats['pages_processed'],
+                'content_elements': element_count,
+                'headings_detected': stats['headings_detected'],
+                'paragraphs_created': stats['paragraphs_created'],
+                'list_items_found': stats['list_items_found']
+            },
+            'incomplete': self.converter.incomplete,
+            'chunks': self.chunks
+        }
+        manifest_path = self.output_dir / CHUNK_MANIFEST_NAME
+        temp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+        os.replace(temp_path, manifest_path)
+    
+    def _remove_stale_chunks(self):
+        """Delete chunk files left over from an earlier, longer conversion."""
+        current = {chunk['file'] for chunk in self.chunks}
+        for path in self.output_dir.glob('chunk-*.md'):
+            if path.name not in current:
+                path.unlink()
+    
+    def discard(self):
+        """Remove the chunks written by a conversion that failed."""
+        for path in self.written:
+            if path.exists():
+                path.unlink()
+
+class BatchConverter:
+    """
+    Convert many PDFs in one process, with a pool of converter workers.
+    
+    Starting Python and importing PyMuPDF once per file dominates the cost
+    of converting large numbers of small documents. A batch run pays that
+    cost once per worker instead.
+    
+    An on-disk manifest records the content hash of every converted PDF
+    together with the converter settings, so files that did not change
+    since the last run are skipped.
+    
+    When the converter has ResourceLimits, workers are supervised by a
+    GovernedPool. Documents that exceed a budget are quarantined: the
+    manifest records the reason, their partial output is kept, and later
+    runs skip them unless force is set.
+    """
+    
+    def __init__(self, converter, output_dir=None, manifest_path=None, workers=1, force=False,
+                 pages=None):
+        self.converter = converter
+        self.pages = pages
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.workers = max(1, int(workers))
+        self.force = force
+        
+        if manifest_path is None:
+            manifest_path = (self.output_dir or Path('.')) / MANIFEST_NAME
+        self.manifest_path = Path(manifest_path)
+        self.manifest = self._load_manifest()
+    
+    def _load_manifest(self):
+        """Load the skip manifest, starting fresh if it is missing or outdated."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get('version') == MANIFEST_VERSION:
+                manifest.setdefault('quarantine', {})
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {'version': MANIFEST_VERSION, 'entries': {}, 'quarantine': {}}
+    
+    def _save_manifest(self):
+        """Write the manifest atomically, so an interrupted run cannot corrupt it."""
+        if self.manifest_path.parent:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+    
+    def output_path_for(self, pdf_path, relative_path):
+        """Markdown path for a PDF: mirrored under output_dir, or next to the PDF."""
+        if self.output_dir is None:
+            return pdf_path.with_suffix('.md')
+        return self.output_dir / relative_path.with_suffix('.md')
+    
+    def run(self, inputs):
+        """
+        Convert every PDF found in inputs (files, directories or glob patterns).
+        
+        Returns a summary dictionary with counts, throughput and failures.
+        """
+        started = time.perf_counter()
+        config = self.converter._worker_config()
+        settings_key = self.converter._settings_key()
+        if self.pages is not None:
+            settings_key += f"|pages={self.pages}"
+        entries = self.manifest['entries']
+        quarantine = self.manifest['quarantine']
+        
+        # Stage timings of all files, and the slowest files (not pages)
+        self.metrics = ConversionMetrics()
+        slowest_files = []
+        
+        summary = {
+            'files_found': 0,
+            'converted': 0,
+            'skipped': 0,
+            'failed': 0,
+            'quarantined': 0,
+            'pages': 0,
+            'warnings': 0,
+            'failures': [],
+            'quarantine': []
+        }
+        
+        # Decide which files need work before starting any workers
+        jobs = []
+        for pdf_path, relative_path in collect_pdf_paths(inputs):
+            summary['files_found'] += 1
+            output_path = self.output_path_for(pdf_path, relative_path)
+            
+            try:
+                key = file_content_hash(pdf_path, settings_key)
+            except OSError as e:
+                summary['failed'] += 1
+                summary['failures'].append({'source': str(pdf_path), 'error': str(e)})
+                continue
+            
+            entry = entries.get(key)
+            if (not self.force and entry and str(output_path) in entry['outputs']
+                    and output_path.exists()):
+                self.converter.log(f"Unchanged, skipping: {pdf_path}")
+                summary['skipped'] += 1
+                continue
+            
+            if not self.force and key in quarantine:
+                self.converter.log(f"Quarantined, skipping: {pdf_path} ({quarantine[key]['reason']})")
+                summary['quarantined'] += 1
+                summary['quarantine'].append({'source': str(pdf_path),
+                                              'reason': quarantine[key]['reason'],
+                                              'pages': quarantine[key]['pages'], 'new': False})
+                continue
+            
+            jobs.append((key, str(pdf_path), str(output_path), self.pages))
+        
+        self.converter.log(f"{len(jobs)} of {summary['files_found']} files need conversion")
+        
+        for key, result in self._run_jobs(jobs, config):
+            if result['metrics'] is not None:
+                self.metrics.merge(result['metrics'], include_pages=False)
+                seconds = result['metrics']['stages'].get('total', {}).get('wall_seconds', 0.0)
+                entry = (seconds, result['source'])
+                if len(slowest_files) < BATCH_SLOWEST_FILES:
+                    heapq.heappush(slowest_files, entry)
+                elif entry > slowest_files[0]:
+                    heapq.heapreplace(slowest_files, entry)
+            
+            if result.get('incomplete'):
+                # Over budget: keep the partial output, but never retry it automatically
+                summary['quarantined'] += 1
+                summary['pages'] += result['pages']
+                summary['quarantine'].append({'source': result['source'], 'reason': result['incomplete'],
+                                              'pages': result['pages'], 'new': True})
+                quarantine[key] = {
+                    'source': result['source'],
+                    'reason': result['incomplete'],
+                    'pages': result['pages'],
+                    'quarantined_at': datetime.now().isoformat(timespec='seconds')
+                }
+            elif result['ok']:
+                quarantine.pop(key, None)
+                summary['converted'] += 1
+                summary['pages'] += result['pages']
+                summary['warnings'] += result['warnings']
+                entry = entries.setdefault(key, {'outputs': []})
+                if result['output'] not in entry['outputs']:
+                    entry['outputs'].append(result['output'])
+                entry.update({
+                    'source': result['source'],
+                    'pages': result['pages'],
+                    'converted_at': datetime.now().isoformat(timespec='seconds')
+                })
+                
+                # Save now and then, so an interrupted run keeps its progress
+                if summary['converted'] % MANIFEST_SAVE_INTERVAL == 0:
+                    self._save_manifest()
+            else:
+                summary['failed'] += 1
+                summary['failures'].append({'source': result['source'], 'error': result['error']})
+            
+            outcome = 'Quarantined' if result.get('incomplete') else 'Converted' if result['ok'] else 'Failed'
+            self.converter.log(f"{outcome}: {result['source']}")
+        
+        if jobs:
+            self._save_manifest()
+        
+        elapsed = time.perf_counter() - started
+        summary['seconds'] = elapsed
+        summary['pages_per_second'] = summary['pages'] / elapsed if elapsed > 0 else 0.0
+        summary['files_per_second'] = summary['converted'] / elapsed if elapsed > 0 else 0.0
+        summary['metrics'] = self.metrics.to_dict()
+        summary['metrics']['slowest_files'] = [
+            {'source': source, 'wall_seconds': seconds}
+            for seconds, source in sorted(slowest_files, reverse=True)
+        ]
+        
+        return summary
+    
+    def _run_jobs(self, jobs, config):
+        """
+        Yield (manifest_key, result) for every job, using a pool when workers > 1.
+        
+        With resource limits, jobs always run in supervised worker
+        processes, even with a single worker, so a hanging PDF can be killed.
+        """
+        limits = self.converter.limits
+        if limits is not None and limits.supervised() and jobs:
+            pool = GovernedPool(self.converter, config, limits, self.workers)
+            yield from pool.run(jobs)
+            return
+        
+        if self.workers == 1 or len(jobs) <= 1:
+            _init_batch_worker(config)
+            for key, pdf_path, output_path, pages in jobs:
+                yield key, _convert_file_worker(pdf_path, output_path, pages)
+            return
+        
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_batch_worker,
+                                 initargs=(config, True)) as executor:
+            futures = {executor.submit(_convert_file_worker, pdf_path, output_path, pages): key
+                       for key, pdf_path, output_path, pages in jobs}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+class GovernedPool:
+    """
+    Batch worker processes kept within a ResourceLimits budget.
+    
+    Each worker converts one document at a time and reports after every
+    page it writes. The supervisor kills a worker whose current page or
+    whole document runs past its time budget, or whose resident memory
+    grows past the ceiling. Time limits get GOVERNOR_GRACE_SECONDS and
+    memory GOVERNOR_MEMORY_HARD_FACTOR of slack, so the worker's own check
+    between pages can stop cleanly first. A worker that dies on its own (a
+    crash, or the kernel's OOM killer) is handled the same way.
+    
+    The pages a killed worker completed are kept: its output is cut back
+    to the last reported page, closed with a note, and given the statistics
+    header of those pages. The first page's budget also covers opening and
+    analysing the document.
+    
+    Workers are replaced after documents_per_worker documents and after any
+    document that hit a limit, so leaked or fragmented memory cannot build
+    up over a long run and throughput stays steady.
+    """
+    
+    def __init__(self, converter, config, limits, workers=1):
+        self.converter = converter
+        self.config = config
+        self.limits = limits
+        self.workers = max(1, int(workers))
+        self.context = multiprocessing.get_context()
+        
+        # Size of the header placeholder written by every worker
+        self.header_reserve = len('\n'.join(converter._markdown_header_lines(
+            0, " " * HEADER_RESERVE, stats=converter._new_stats())))
+    
+    def _start_worker(self):
+        connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=_governed_worker_main,
+                                       args=(child_connection, self.config), daemon=True)
+        process.start()
+        child_connection.close()
+        return {'process': process, 'connection': connection, 'job': None, 'documents': 0,
+                'started': None, 'beat': None, 'progress': None}
+    
+    def _stop_worker(self, worker, kill=False):
+        if kill:
+            worker['process'].kill()
+        else:
+            try:
+                worker['connection'].send(None)
+            except OSError:
+                pass
+        worker['process'].join(timeout=GOVERNOR_GRACE_SECONDS)
+        if worker['process'].is_alive():
+            worker['process'].kill()
+            worker['process'].join()
+        worker['connection'].close()
+    
+    def _assign(self, worker, jobs):
+        """Give the worker its next job, if any are left."""
+        worker['job'] = jobs.popleft() if jobs else None
+        worker['progress'] = None
+        if worker['job'] is not None:
+            _, pdf_path, output_path, pages = worker['job']
+            worker['started'] = worker['beat'] = time.monotonic()
+            worker['connection'].send((pdf_path, output_path, pages))
+    
+    def _over_budget(self, worker, now):
+        """Reason to kill a busy worker, or None."""
+        limits = self.limits
+        if limits.page_seconds is not None and now - worker['beat'] > limits.page_seconds + GOVERNOR_GRACE_SECONDS:
+            return f"page hung for {now - worker['beat']:.0f} s (page budget {limits.page_seconds:g} s)"
+        if (limits.document_seconds is not None
+                and now - worker['started'] > limits.document_seconds + GOVERNOR_GRACE_SECONDS):
+            return f"document ran for {now - worker['started']:.0f} s (budget {limits.document_seconds:g} s)"
+        if limits.memory_mb is not None:
+            rss_mb = process_rss_mb(worker['process'].pid)
+            if rss_mb is not None and rss_mb > limits.memory_mb * GOVERNOR_MEMORY_HARD_FACTOR:
+                return f"memory reached {rss_mb:.0f} MB (ceiling {limits.memory_mb:g} MB)"
+        return None
+    
+    def _salvage(self, worker, reason):
+        """Result for a killed worker's document, keeping the pages it completed."""
+        _, pdf_path, output_path, _ = worker['job']
+        result = {'source': pdf_path, 'output': output_path, 'ok': False, 'pages': 0,
+                  'warnings': 0, 'error': reason, 'metrics': None, 'incomplete': reason}
+        
+        if worker['progress'] is None:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            result['incomplete'] = f"no page completed: {reason}"
+            return result
+        
+        page_number, offset, element_count, stats = worker['progress']
+        reason = f"stopped after page {page_number}: {reason}"
+        note = self.converter._incomplete_note(reason)
+        header = self.converter._fitted_header(element_count, self.header_reserve, stats=stats)
+        with open(output_path, 'r+b') as output_file:
+            output_file.truncate(offset)
+            output_file.seek(offset)
+            output_file.write(note.encode('utf-8'))
+            output_file.seek(0)
+            output_file.write(header.encode('utf-8'))
+        
+        result.update(ok=True, error=None, pages=stats['pages_processed'], incomplete=reason)
+        return result
+    
+    def run(self, jobs):
+        """Yield (manifest_key, result) for every (key, pdf, output, pages) job."""
+        jobs = deque(jobs)
+        workers = [self._start_worker() for _ in range(min(self.workers, len(jobs)))]
+        
+        def replace(worker):
+            self._stop_worker(worker, kill=True)
+            new_worker = self._start_worker()
+            workers[workers.index(worker)] = new_worker
+            return new_worker
+        
+        try:
+            for worker in workers:
+                self._assign(worker, jobs)
+            
+            while any(worker['job'] is not None for worker in workers):
+                busy = {worker['connection']: worker for worker in workers if worker['job'] is not None}
+                
+                for connection in wait(list(busy), timeout=GOVERNOR_POLL_SECONDS):
+                    worker = busy[connection]
+                    try:
+                        kind, payload = connection.recv()
+                    except (EOFError, OSError):
+                        worker['process'].join(timeout=GOVERNOR_GRACE_SECONDS)
+                        key = worker['job'][0]
+                        result = self._salvage(
+                            worker, f"worker process died (exit code {worker['process'].exitcode})")
+                        self._assign(replace(worker), jobs)
+                        yield key, result
+                        continue
+                    
+                    if kind == 'page':
+                        worker['beat'] = time.monotonic()
+                        worker['progress'] = payload
+                        continue
+                    
+                    key = worker['job'][0]
+                    worker['documents'] += 1
+                    if payload.get('incomplete') or (
+                            self.limits.documents_per_worker is not None
+                            and worker['documents'] >= self.limits.documents_per_worker):
+                        worker = replace(worker)
+                    self._assign(worker, jobs)
+                    yield key, payload
+                
+                now = time.monotonic()
+                for worker in list(workers):
+                    if worker['job'] is None:
+                        continue
+                    reason = self._over_budget(worker, now)
+                    if reason:
+                        key = worker['job'][0]
+                        worker['process'].kill()
+                        worker['process'].join()
+                        result = self._salvage(worker, reason)
+                        self._assign(replace(worker), jobs)
+                        yield key, result
+        finally:
+            for worker in workers:
+                self._stop_worker(worker, kill=worker['job'] is not None)
+
+class ConversionService:
+    """
+    Small HTTP server that converts uploaded PDFs with warm worker processes.
+    
+    Every worker process imports PyMuPDF and builds its converter once, so
+    requests only pay for the conversion itself. Uploads wait in a bounded
+    queue; when it is full, new uploads get 429 Too Many Requests right
+    away instead of piling up. The Markdown is streamed back (chunked
+    transfer encoding) page by page while the worker is still converting,
+    with the statistics as a trailer.
+    
+    Endpoints:
+    
+    - POST /convert[?pages=1-20]: the request body is the PDF
+    - GET /metrics: queue depth, in-flight jobs and per-job latency as JSON
+    - GET /health
+    
+    Built on asyncio streams only; every response closes its connection.
+    """
+    
+    def __init__(self, converter, host='127.0.0.1', port=8000, workers=1,
+                 queue_size=SERVICE_QUEUE_SIZE, max_upload_bytes=SERVICE_MAX_UPLOAD_MB * 1024 * 1024,
+                 pages=None):
+        self.converter = converter
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.max_upload_bytes = max_upload_bytes
+        self.pages = pages
+        self.config = converter._worker_config()
+        self.context = multiprocessing.get_context()
+        
+        self.in_flight = 0
+        self.counters = {'accepted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        self.recent_jobs = deque(maxlen=SERVICE_RECENT_JOBS)
+        self._job_ids = 0
+    
+    def run(self):
+        """Serve until interrupted."""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+    
+    async def serve(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.processes = [self._start_worker() for _ in range(self.workers)]
+        slots = [asyncio.create_task(self._worker_slot(index)) for index in range(self.workers)]
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        
+        print(f"[.PDF to .md] Serving on http://{self.host}:{self.port} with {self.workers} workers "
+              f"(queue: {self.queue_size})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for slot in slots:
+                slot.cancel()
+            for process, connection in self.processes:
+                process.kill()
+                process.join()
+                connection.close()
+    
+    def _start_worker(self):
+        connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=_service_worker_main,
+                                       args=(child_connection, self.config), daemon=True)
+        process.start()
+        child_connection.close()
+        return process, connection
+    
+    async def _worker_slot(self, index):
+        """Feed queued jobs to one worker process and relay its output."""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            self.in_flight += 1
+            job['started'] = time.perf_counter()
+            process, connection = self.processes[index]
+            try:
+                await loop.run_in_executor(None, connection.send, (job['pdf'], job['pages']))
+                job['pdf'] = None
+                while True:
+                    kind, payload = await loop.run_in_executor(None, connection.recv)
+                    await job['output'].put((kind, payload))
+                    if kind != 'chunk':
+                        break
+            except (EOFError, OSError):
+                # The worker died (e.g. killed by the OOM killer): replace it
+                process.join(timeout=GOVERNOR_GRACE_SECONDS)
+                await job['output'].put(('error', f"worker process died (exit code {process.exitcode})"))
+                connection.close()
+                self.processes[index] = self._start_worker()
+            finally:
+                self.in_flight -= 1
+    
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, _ = request_line.split(' ', 2)
+            except ValueError:
+                await self._respond(writer, 400, "Malformed request line\n")
+                return
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                if name:
+                    headers[name.strip().lower()] = value.strip()
+            
+            url = urlsplit(target)
+            if url.path == '/convert':
+                if method != 'POST':
+                    await self._respond(writer, 405, "Use POST with the PDF as request body\n")
+                else:
+                    await self._convert(reader, writer, headers, parse_qs(url.query))
+            elif url.path == '/metrics' and method == 'GET':
+                await self._respond(writer, 200, json.dumps(self.metrics(), indent=2) + '\n',
+                                    'application/json')
+            elif url.path == '/health' and method == 'GET':
+                await self._respond(writer, 200, "ok\n")
+            else:
+                await self._respond(writer, 404, "Not found\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    async def _respond(self, writer, status, body, content_type='text/plain; charset=utf-8',
+                       extra_headers=()):
+        data = body.encode('utf-8')
+        head = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(data)}",
+                "Connection: close"]
+        head.extend(extra_headers)
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+        await writer.drain()
+    
+    async def _convert(self, reader, writer, headers, query):
+        """Handle POST /convert: queue the upload and stream the Markdown back."""
+        received = time.perf_counter()
+        
+        # Refuse before reading a body that could not be queued anyway
+        if self.queue.full():
+            self.counters['rejected'] += 1
+            await self._respond(writer, 429, "Conversion queue is full, try again shortly\n",
+                                extra_headers=["Retry-After: 5"])
+            return
+        
+        try:
+            length = int(headers.get('content-length', ''))
+        except ValueError:
+            await self._respond(writer, 411, "Content-Length is required\n")
+            return
+        if length > self.max_upload_bytes:
+            await self._respond(writer, 413, f"Uploads are limited to {self.max_upload_bytes} bytes\n")
+            return
+        
+        pages = query.get('pages', [self.pages])[0]
+        if pages is not None:
+            try:
+                parse_page_ranges(pages)
+            except ValueError as e:
+                await self._respond(writer, 400, f"{e}\n")
+                return
+        
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        try:
+            pdf = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return
+        
+        self._job_ids += 1
+        job = {'id': self._job_ids, 'pdf': pdf, 'pages': pages, 'output': asyncio.Queue(),
+               'received': received, 'started': None}
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counters['rejected'] += 1
+            await self._respond(writer, 429, "Conversion queue is full, try again shortly\n",
+                                extra_headers=["Retry-After: 5"])
+            return
+        self.counters['accepted'] += 1
+        
+        first_byte = None
+        status = 'failed'
+        outcome = {}
+        kind = None
+        try:
+            while True:
+                kind, payload = await job['output'].get()
+                
+                if kind == 'chunk':
+                    if first_byte is None:
+                        first_byte = time.perf_counter()
+                        writer.write(b"HTTP/1.1 200 OK\r\n"
+                                     b"Content-Type: text/markdown; charset=utf-8\r\n"
+                                     b"Transfer-Encoding: chunked\r\n"
+                                     b"Connection: close\r\n\r\n")
+                    data = payload.encode('utf-8')
+                    writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+                    await writer.drain()
+                elif kind == 'done':
+                    outcome = payload
+                    status = 'completed'
+                    writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    outcome = {'error': payload}
+                    if first_byte is None:
+                        await self._respond(writer, 422, f"Conversion failed: {payload}\n")
+                    else:
+                        # Streaming already started: add a note and end without the final
+                        # chunk, so clients see an incomplete transfer
+                        data = f"\n\n> **Conversion failed:** {payload}\n".encode('utf-8')
+                        writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+                        await writer.drain()
+                    break
+        except ConnectionError:
+            # The client went away; keep draining so the worker slot moves on
+            status = 'disconnected'
+            while kind == 'chunk':
+                kind, payload = await job['output'].get()
+        finally:
+            self._record_job(job, status, first_byte, outcome, len(pdf))
+    
+    def _record_job(self, job, status, first_byte, outcome, upload_bytes):
+        finished = time.perf_counter()
+        started = job['started'] or finished
+        self.counters['completed' if status == 'completed' else 'failed'] += 1
+        self.recent_jobs.append({
+            'id': job['id'],
+            'status': status,
+            'upload_bytes': upload_bytes,
+            'pages': outcome.get('pages'),
+            'incomplete': outcome.get('incomplete'),
+            'error': outcome.get('error'),
+            'queued_seconds': round(started - job['received'], 4),
+            'first_byte_seconds': round(first_byte - job['received'], 4) if first_byte else None,
+            'total_seconds': round(finished - job['received'], 4)
+        })
+    
+    def metrics(self):
+        """Queue depth, in-flight jobs and latency of recent jobs."""
+        latencies = sorted(job['total_seconds'] for job in self.recent_jobs
+                           if job['status'] == 'completed')
+        
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else None
+        
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue_size,
+            'in_flight': self.in_flight,
+            'jobs': dict(self.counters),
+            'latency_seconds': {
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': latencies[-1] if latencies else None
+            },
+            'recent_jobs': list(self.recent_jobs)
+        }
+
+def print_batch_summary(summary):
+    """Print the final batch report: counts, throughput and failures."""
+    print("Batch conversion finished")
+    print(f"  Files found: {summary['files_found']}")
+    print(f"  Converted: {summary['converted']}")
+    print(f"  Skipped (unchanged): {summary['skipped']}")
+    print(f"  Failed: {summary['failed']}")
+    print(f"  Quarantined (over budget): {summary['quarantined']}")
+    print(f"  Pages converted: {summary['pages']}")
+    print(f"  Elapsed: {summary['seconds']:.2f} s")
+    print(f"  Throughput: {summary['pages_per_second']:.1f} pages/s, "
+          f"{summary['files_per_second']:.2f} files/s")
+    
+    if summary['warnings']:
+        print(f"  Files with warnings (e.g. scanned PDFs): {summary['warnings']}")
+    
+    if summary['failures']:
+        print("\nFailures:")
+        for failure in summary['failures']:
+            print(f"  {failure['source']}: {failure['error']}")
+    
+    if summary['quarantine']:
+        print("\nQuarantined (use --force to retry):")
+        for entry in summary['quarantine']:
+            kept = f", {entry['pages']} pages kept" if entry['pages'] else ""
+            earlier = "" if entry['new'] else " [earlier run]"
+            print(f"  {entry['source']}: {entry['reason']}{kept}{earlier}")
+
+def collect_pdf_paths(inputs):
+    """
+    Expand files, directories and glob patterns into (pdf_path, relative_path) pairs.
+    
+    Directories are searched recursively. The relative path is used to
+    mirror the directory layout under the batch output directory.
+    """
+    seen = set()
+    found = []
+    
+    for item in inputs:
+        if os.path.isdir(item):
+            base = Path(item)
+            candidates = [(path, path.relative_to(base)) for path in sorted(base.rglob('*'))
+                          if path.is_file() and path.suffix.lower() == '.pdf']
+        elif glob.has_magic(item):
+            candidates = [(Path(path), Path(Path(path).name))
+                          for path in sorted(glob.glob(item, recursive=True))
+                          if os.path.isfile(path)]
+        else:
+            candidates = [(Path(item), Path(Path(item).name))]
+        
+        for path, relative_path in candidates:
+            resolved = path.resolve()
+            if resolved not in seen:
+                seen.add(resolved)
+                found.append((path, relative_path))
+    
+    return found
+
+def file_content_hash(pdf_path, settings_key):
+    """
+    Hash a PDF's bytes together with the converter settings.
+    
+    The file is read in chunks, so large PDFs are hashed in constant memory.
+    Including the settings means changing a threshold re-converts everything.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{MANIFEST_VERSION}:{settings_key}".encode('utf-8'))
+    with open(pdf_path, 'rb') as pdf_file:
+        for chunk in iter(lambda: pdf_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Converter reused by all files handled in one batch worker process
+_batch_converter = None
+
+def _init_batch_worker(config, inline_ocr=False):
+    """
+    Process pool initializer: build one quiet converter per worker process.
+    
+    With inline_ocr, OCR runs in the worker itself instead of starting a
+    second pool, as files are already spread over all cores.
+    """
+    global _batch_converter
+    _batch_converter = _build_worker_converter(config)
+    if inline_ocr and _batch_converter.ocr is not None:
+        _batch_converter.ocr.workers = 1
+
+def _convert_file_worker(pdf_path, output_path, pages=None):
+    """
+    Convert a single file in a batch worker.
+    
+    Never raises: the outcome is returned as a plain dictionary so one bad
+    PDF cannot stop the rest of the batch.
+    """
+    converter = _batch_converter
+    converter.warnings = []
+    result = {'source': pdf_path, 'output': output_path, 'ok': False, 'pages': 0,
+              'warnings': 0, 'error': None, 'metrics': None, 'incomplete': None}
+    
+    try:
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        converted = converter.convert_file(pdf_path, output_path, pages=pages)
+        result.update(ok=True, pages=converted['pages'], incomplete=converted['incomplete'],
+                      warnings=1 if converter.warnings else 0)
+    except ResourceLimitExceeded as e:
+        result.update(error=str(e), incomplete=str(e))
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    
+    result['metrics'] = converter.metrics.to_dict()
+    return result
+
+class _PipeWriter(io.TextIOBase):
+    """Write-only text stream that sends every write through a pipe as a chunk."""
+    
+    def __init__(self, connection):
+        self.connection = connection
+    
+    def writable(self):
+        return True
+    
+    def write(self, text):
+        if text:
+            self.connection.send(('chunk', text))
+        return len(text)
+
+def _service_worker_main(connection, config):
+    """
+    Body of a ConversionService worker process.
+    
+    Receives (pdf_bytes, pages) jobs and answers with ('chunk', markdown)
+    messages while converting, then ('done', summary) or ('error', message).
+    """
+    _init_batch_worker(config, inline_ocr=True)
+    converter = _batch_converter
+    output = _PipeWriter(connection)
+    
+    while True:
+        try:
+            pdf, pages = connection.recv()
+        except EOFError:
+            break
+        try:
+            result = converter.convert_file(pdf, output, pages=pages)
+            connection.send(('done', {'pages': result['pages'], 'elements': result['elements'],
+                                      'characters': result['characters'],
+                                      'incomplete': result['incomplete']}))
+        except Exception as e:
+            connection.send(('error', str(e) or type(e).__name__))
+
+def _governed_worker_main(connection, config):
+    """
+    Body of a GovernedPool worker process.
+    
+    Receives (pdf_path, output_path, pages) jobs until it gets None, sends
+    ('page', progress) after every written page and ('done', result) at
+    the end of each document.
+    """
+    _init_batch_worker(config, inline_ocr=True)
+    _batch_converter.progress = lambda *progress: connection.send(('page', progress))
+    
+    while True:
+        job = connection.recv()
+        if job is None:
+            break
+        connection.send(('done', _convert_file_worker(*job)))
+
+def is_pdf_path(pdf_source):
+    """True when a PDF source is a file path rather than in-memory data."""
+    return isinstance(pdf_source, (str, os.PathLike))
+
+def open_pdf(pdf_source):
+    """
+    Open a PDF from a path or from memory.
+    
+    In-memory sources can be bytes, bytearray, memoryview or mmap objects.
+    PyMuPDF reads bytes and memoryviews in place, so bytearray and mmap
+    are wrapped in a memoryview rather than copied.
+    """
+    if is_pdf_path(pdf_source):
+        return fitz.open(pdf_source)
+    
+    if isinstance(pdf_source, (bytearray, mmap.mmap)):
+        pdf_source = memoryview(pdf_source)
+    return fitz.open(stream=pdf_source, filetype='pdf')
+
+def describe_source(pdf_source):
+    """Short description of a PDF source for messages."""
+    if is_pdf_path(pdf_source):
+        return str(pdf_source)
+    return f"<in-memory PDF, {len(memoryview(pdf_source).cast('B'))} bytes>"
+
+def _shareable_source(pdf_source):
+    """
+    A PDF source that can be sent to worker processes.
+    
+    Paths are sent as they are. Memory views and mmaps cannot be pickled,
+    so their bytes are copied once per worker; bytes are sent unchanged.
+    """
+    if is_pdf_path(pdf_source) or isinstance(pdf_source, bytes):
+        return pdf_source
+    return bytes(memoryview(pdf_source).cast('B'))
+
+def parse_page_ranges(spec):
+    """
+    Parse a page selection such as "1-20,45" or "100-" into 1-based (first, last) pairs.
+    
+    last is None for open-ended ranges. Raises ValueError for malformed input.
+    """
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        
+        first_text, dash, last_text = part.partition('-')
+        try:
+            first = int(first_text) if first_text.strip() else 1
+            last = (int(last_text) if last_text.strip() else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}")
+        
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((first, last))
+    
+    if not ranges:
+        raise ValueError("Empty page selection")
+    return ranges
+
+def select_pages(pages, total_pages):
+    """
+    Resolve a page selection into sorted, unique 0-based page indexes.
+    
+    pages may be None (all pages), a string like "1-20,45", or an iterable of
+    1-based page numbers. Pages beyond the end of the document are ignored,
+    so one selection can be applied to documents of different lengths.
+    """
+    if pages is None:
+        return list(range(total_pages))
+    
+    if isinstance(pages, str):
+        selected = set()
+        for first, last in parse_page_ranges(pages):
+            last = total_pages if last is None else min(last, total_pages)
+            selected.update(range(first - 1, last))
+    else:
+        selected = {page - 1 for page in pages if 1 <= page <= total_pages}
+    
+    return sorted(selected)
+
+def _split_page_range(total_pages, parts):
+    """
+    Split range(total_pages) into at most `parts` contiguous (start, stop) ranges.
+    
+    Contiguous ranges keep each worker reading neighbouring pages and make
+    merging the results in page order trivial.
+    """
+    parts = max(1, min(parts, total_pages))
+    base, extra = divmod(total_pages, parts)
+    ranges = []
+    start = 0
+    for index in range(parts):
+        stop = start + base + (1 if index < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def _build_worker_converter(config):
+    """Create a quiet converter that classifies content like its parent does."""
+    converter = PDFToMarkdownConverter(quiet=True, page_cache=config['page_cache'],
+                                       classifier=config['classifier'], ocr=config['ocr'],
+                                       limits=config['limits'])
+    for name, value in config['settings'].items():
+        setattr(converter, name, value)
+    return converter
+
+# Converter and open document of one page extraction worker process
+_page_worker = None
+
+def _init_page_worker(pdf_source, config):
+    """Process pool initializer: open the document once per worker process."""
+    global _page_worker
+    _page_worker = (_build_worker_converter(config), open_pdf(pdf_source))
+
+def _extract_pages_worker(page_numbers):
+    """
+    Process pool entry point: extract a list of pages in a separate process.
+    
+    Returns one list of content elements per page, the statistics counters,
+    the timing metrics and the page cache (hits, misses) for the pages, so
+    the parent converter can merge them.
+    """
+    converter, doc = _page_worker
+    converter.stats = converter._new_stats()
+    converter.metrics = ConversionMetrics()
+    cache = converter.page_cache
+    if cache is not None:
+        cache.hits = cache.misses = 0
+    
+    pages = [converter._page_elements(doc, page_num) for page_num in page_numbers]
+    
+    cache_counts = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    return pages, converter.stats, converter.metrics, cache_counts
+
+# OCR engine and open document of one OCR worker process
+_ocr_worker = None
+
+def _init_ocr_worker(pdf_source, ocr):
+    """Process pool initializer for OCR workers."""
+    global _ocr_worker
+    # One Tesseract thread per process; the pool already uses every core
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    _ocr_worker = (ocr, open_pdf(pdf_source))
+
+def _ocr_page_worker(page_num):
+    """Process pool entry point: render and OCR one page, with its timing."""
+    ocr, doc = _ocr_worker
+    metrics = ConversionMetrics()
+    with metrics.stage('ocr'):
+        blocks = ocr.page_blocks(doc[page_num])
+    return blocks, metrics
+
+def setup_command_line_interface():
+    """
+    Set up command-line argument parsing for user-friendly tool operation.
+    
+    This function demonstrates how to create professional command-line tools
+    that are intuitive for users while providing flexibility for advanced use cases.
+    """
+    
+    parser = argparse.ArgumentParser(
+        description=".PDF to .md - Convert PDF documents to Markdown format",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python pdf_to_md.py document.pdf
+  python pdf_to_md.py research_paper.pdf --output paper.md
+  python pdf_to_md.py complex_doc.pdf --verbose
+  python pdf_to_md.py large_manual.pdf --workers 4
+  python pdf_to_md.py large_manual.pdf --chunks headings --output manual_chunks
+  python pdf_to_md.py scanned.pdf --ocr --ocr-workers 4 --page-cache ocr_cache.db
+  curl -s https://example.org/paper.pdf | python pdf_to_md.py - > paper.md
+  python pdf_to_md.py --batch incoming/ "archive/**/*.pdf" --output-dir md_out --workers 8
+  python pdf_to_md.py --batch archive/ --workers 8 --page-timeout 30 --max-memory 2048 --recycle-after 200
+  python pdf_to_md.py --serve --host 0.0.0.0 --workers 3
+  curl --data-binary @notes.pdf http://mini-pc:8000/convert > notes.md
+
+Educational Notes:
+  This tool demonstrates fundamental document processing concepts.
+  Extend it with OCR capabilities, web interfaces, or batch processing.
+  Perfect foundation for learning about text extraction and format conversion.
+
+OCR:
+  For scanned PDFs, install pytesseract, pillow and tesseract, then add --ocr.
+  Only pages without a text layer are OCR'd; use --page-cache to keep the
+  results, so re-runs skip recognition.
+        """
+    )
+    
+    parser.add_argument(
+        'pdf_file',
+        nargs='*',
+        help='Path to the PDF file to convert, or - to read it from stdin '
+             '(batch mode: files, directories or glob patterns)'
+    )
+    
+    parser.add_argument(
+        '-o', '--output',
+        help='Output Markdown file path, or - for stdout (default: same name as PDF '
+             'with .md extension; stdout when reading from stdin)'
+    )
+    
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        help='Enable verbose output for detailed processing information'
+    )
+    
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes for page extraction, or for files in batch mode (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--adaptive-headings',
+        action='store_true',
+        help="Detect headings and their levels from each document's own body font size "
+             "instead of fixed point sizes"
+    )
+    
+    parser.add_argument(
+        '--strip-headers',
+        action='store_true',
+        help='Remove running headers, footers and page numbers that repeat across pages'
+    )
+    
+    parser.add_argument(
+        '--chunks',
+        choices=['headings', 'pages'],
+        help='Write a directory of Markdown chunks split at major headings or every '
+             '--chunk-pages pages, plus an index.json manifest for lazy loading readers '
+             '(--output names the directory; default: PDF name with _chunks)'
+    )
+    
+    parser.add_argument(
+        '--chunk-pages',
+        type=int,
+        default=CHUNK_PAGES,
+        metavar='N',
+        help='Pages per chunk with --chunks pages (default: %(default)s)'
+    )
+    
+    parser.add_argument(
+        '--pages',
+        metavar='RANGES',
+        help='Only convert these pages, e.g. "1-20,45" or "100-" (pages past the end are ignored)'
+    )
+    
+    parser.add_argument(
+        '--page-cache',
+        metavar='PATH',
+        help='SQLite file caching extracted pages, so re-converting a revised PDF only processes changed pages'
+    )
+    
+    parser.add_argument(
+        '--page-cache-size',
+        type=int,
+        default=DEFAULT_PAGE_CACHE_BYTES // (1024 * 1024),
+        metavar='MB',
+        help='Maximum page cache size before old entries are evicted (default: %(default)s MB)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print wall/CPU time per stage and the slowest pages (or files in batch mode)'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        metavar='PATH',
+        help='Write stage timings, slowest pages and statistics as JSON'
+    )
+    
+    parser.add_argument(
+        '--cprofile',
+        metavar='PATH',
+        help='Run under cProfile and save the stats file (inspect with python -m pstats)'
+    )
+    
+    ocr_group = parser.add_argument_group('OCR (needs pytesseract, pillow and tesseract)')
+    
+    ocr_group.add_argument(
+        '--ocr',
+        action='store_true',
+        help='OCR pages that have (almost) no extractable text but contain an image'
+    )
+    
+    ocr_group.add_argument(
+        '--ocr-lang',
+        default='eng',
+        metavar='LANGS',
+        help='Tesseract language(s), e.g. "eng+deu" (default: %(default)s)'
+    )
+    
+    ocr_group.add_argument(
+        '--ocr-dpi',
+        type=int,
+        default=OCR_DEFAULT_DPI,
+        help='Resolution pages are rendered at for OCR (default: %(default)s)'
+    )
+    
+    ocr_group.add_argument(
+        '--ocr-workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='OCR processes when --workers is 1; page workers OCR their own pages '
+             '(default: %(default)s)'
+    )
+    
+    limits_group = parser.add_argument_group(
+        'resource limits',
+        'Budgets are checked between pages; in batch mode, workers that hang or run\n'
+        'away are also killed from outside. Pages finished in time are kept.')
+    
+    limits_group.add_argument(
+        '--file-timeout',
+        type=float,
+        metavar='SECONDS',
+        help='Time budget per document'
+    )
+    
+    limits_group.add_argument(
+        '--page-timeout',
+        type=float,
+        metavar='SECONDS',
+        help='Time budget per page'
+    )
+    
+    limits_group.add_argument(
+        '--max-memory',
+        type=float,
+        metavar='MB',
+        help='Resident memory ceiling per converting process'
+    )
+    
+    limits_group.add_argument(
+        '--recycle-after',
+        type=int,
+        metavar='N',
+        help='Batch mode: replace each worker process after N documents'
+    )
+    
+    service_group = parser.add_argument_group('service mode')
+    
+    service_group.add_argument(
+        '--serve',
+        action='store_true',
+        help='Run an HTTP conversion service (POST a PDF to /convert; see /metrics)'
+    )
+    
+    service_group.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Address to listen on; use 0.0.0.0 to serve the local network (default: %(default)s)'
+    )
+    
+    service_group.add_argument(
+        '--port',
+        type=int,
+        default=8000,
+        help='Port to listen on (default: %(default)s)'
+    )
+    
+    service_group.add_argument(
+        '--queue-size',
+        type=int,
+        default=SERVICE_QUEUE_SIZE,
+        help='Uploads that may wait for a worker before new ones get 429 (default: %(default)s)'
+    )
+    
+    service_group.add_argument(
+        '--max-upload',
+        type=int,
+        default=SERVICE_MAX_UPLOAD_MB,
+        metavar='MB',
+        help='Largest accepted upload (default: %(default)s MB)'
+    )
+    
+    batch_group = parser.add_argument_group('batch mode')
+    
+    batch_group.add_argument(
+        '--batch',
+        action='store_true',
+        help='Convert every PDF found in the given files, directories and glob patterns'
+    )
+    
+    batch_group.add_argument(
+        '--output-dir',
+        help='Directory for batch output (default: next to each PDF)'
+    )
+    
+    batch_group.add_argument(
+        '--manifest',
+        help=f'Skip manifest path (default: {MANIFEST_NAME} in the output directory)'
+    )
+    
+    batch_group.add_argument(
+        '--force',
+        action='store_true',
+        help='Convert all files, even if the manifest says they are unchanged or quarantined'
+    )
+    
+    return parser
+
+def main():
+    """
+    Main entry point for the PDF to Markdown conversion tool.
     
     This function demonstrates good practices for command-line tool development:
     - Clear argument parsing and validation
@@ -545,17 +3867,167 @@ def main():
     parser = setup_command_line_interface()
     args = parser.parse_args()
     
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.ocr_workers < 1:
+        parser.error("--ocr-workers must be at least 1")
+    for option, value in (('--file-timeout', args.file_timeout), ('--page-timeout', args.page_timeout),
+                          ('--max-memory', args.max_memory), ('--recycle-after', args.recycle_after)):
+        if value is not None and value <= 0:
+            parser.error(f"{option} must be positive")
+    if args.recycle_after is not None and not args.batch:
+        parser.error("--recycle-after requires --batch")
+    if args.queue_size < 1 or args.max_upload < 1:
+        parser.error("--queue-size and --max-upload must be at least 1")
+    if args.chunk_pages < 1:
+        parser.error("--chunk-pages must be at least 1")
+    if args.chunks and (args.batch or args.serve or args.output == '-'
+                        or (args.pdf_file and args.pdf_file[0] == '-' and args.output is None)):
+        parser.error("--chunks writes a directory and cannot be used with --batch, --serve or stdout "
+                     "(give --output for stdin input)")
+    
+    if args.serve:
+        if args.pdf_file or args.batch or args.output:
+            parser.error("--serve takes no PDF files, --batch or --output")
+    elif not args.pdf_file:
+        parser.error("the following arguments are required: pdf_file")
+    if args.ocr:
+        try:
+            OCREngine.check()
+        except ConversionError as e:
+            parser.error(str(e))
+    
+    if not args.batch:
+        if len(args.pdf_file) > 1:
+            parser.error("only one PDF file can be converted at a time (use --batch for more)")
+        if args.output_dir or args.manifest or args.force:
+            parser.error("--output-dir, --manifest and --force require --batch")
+    elif args.output:
+        parser.error("--output cannot be used with --batch (use --output-dir)")
+    elif '-' in args.pdf_file:
+        parser.error("stdin input cannot be used with --batch")
+    
+    if args.pages is not None:
+        try:
+            parse_page_ranges(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    # Markdown on stdout: every status message goes to stderr instead
+    to_stdout = not args.batch and not args.serve and (args.output == '-' or (args.pdf_file[0] == '-' and args.output is None))
+    if to_stdout:
+        markdown_output = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            run_command_line(args, markdown_output=markdown_output)
+    else:
+        run_command_line(args)
+
+def run_command_line(args, markdown_output=None):
+    """
+    Run a parsed command line.
+    
+    markdown_output is a file object that receives the Markdown instead of
+    the file named by --output (used for stdout).
+    """
+    
+    page_cache = None
+    if args.page_cache:
+        page_cache = PageCache(args.page_cache, max_bytes=args.page_cache_size * 1024 * 1024)
+    
+    ocr = None
+    if args.ocr:
+        ocr = OCREngine(language=args.ocr_lang, dpi=args.ocr_dpi, workers=args.ocr_workers,
+                        cache=page_cache)
+    
+    limits = None
+    if any(value is not None for value in (args.file_timeout, args.page_timeout,
+                                           args.max_memory, args.recycle_after)):
+        limits = ResourceLimits(document_seconds=args.file_timeout, page_seconds=args.page_timeout,
+                                memory_mb=args.max_memory, documents_per_worker=args.recycle_after)
+    
+    if args.serve:
+        # Each service worker converts one upload at a time
+        converter = PDFToMarkdownConverter(verbose=args.verbose, page_cache=page_cache, ocr=ocr,
+                                           limits=limits)
+        converter.adaptive_headings = args.adaptive_headings
+        converter.strip_running_lines = args.strip_headers
+        ConversionService(converter, host=args.host, port=args.port, workers=args.workers,
+                          queue_size=args.queue_size, max_upload_bytes=args.max_upload * 1024 * 1024,
+                          pages=args.pages).run()
+        return
+    
     # Display tool information
     if args.verbose:
         print(".PDF to .md - Educational PDF to Markdown Converter")
         print("MIT Licensed - Free to use, modify, and distribute")
         print("")
     
-    # Initialize converter with user preferences
-    converter = PDFToMarkdownConverter(verbose=args.verbose)
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    if args.batch:
+        # One process converts all files; the workers share out whole documents
+        converter = PDFToMarkdownConverter(verbose=args.verbose, page_cache=page_cache, ocr=ocr,
+                                           limits=limits)
+        converter.adaptive_headings = args.adaptive_headings
+        converter.strip_running_lines = args.strip_headers
+        batch = BatchConverter(converter, output_dir=args.output_dir,
+                               manifest_path=args.manifest, workers=args.workers,
+                               force=args.force, pages=args.pages)
+        summary = batch.run(args.pdf_file)
+        success = not summary['failed']
+        metrics = summary['metrics']
+    else:
+        # Initialize converter with user preferences
+        converter = PDFToMarkdownConverter(verbose=args.verbose, workers=args.workers,
+                                           page_cache=page_cache, ocr=ocr, limits=limits)
+        converter.adaptive_headings = args.adaptive_headings
+        converter.strip_running_lines = args.strip_headers
+        if args.chunks:
+            converter.chunking = {'split': args.chunks, 'pages_per_chunk': args.chunk_pages}
+        
+        # Read a piped PDF straight into memory; no temporary file is needed
+        pdf_source = sys.stdin.buffer.read() if args.pdf_file[0] == '-' else args.pdf_file[0]
+        
+        # Perform conversion
+        success = converter.convert_pdf_to_markdown(pdf_source, markdown_output or args.output,
+                                                    pages=args.pages)
+        metrics = converter.metrics.to_dict()
+        metrics['stats'] = converter.stats
+    
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+    
+    if args.batch:
+        print_batch_summary(summary)
+    
+    if args.profile:
+        print("")
+        if args.batch:
+            aggregated = ConversionMetrics()
+            aggregated.merge(metrics, include_pages=False)
+            for line in aggregated.report_lines():
+                print(line)
+            print("Slowest files:")
+            for slow_file in metrics['slowest_files']:
+                print(f"  {slow_file['wall_seconds']:9.3f} s  {slow_file['source']}")
+        else:
+            for line in converter.metrics.report_lines():
+                print(line)
+    
+    if args.metrics_json:
+        with open(args.metrics_json, 'w', encoding='utf-8') as metrics_file:
+            json.dump(metrics, metrics_file, indent=2)
+    
+    if args.cprofile:
+        print(f"cProfile stats saved to {args.cprofile}")
     
-    # Perform conversion
-    success = converter.convert_pdf_to_markdown(args.pdf_file, args.output)
+    if args.batch:
+        sys.exit(0 if success else 1)
     
     # Provide appropriate exit codes for scripting compatibility
     if success:
@@ -566,7 +4038,8 @@ def main():
         sys.exit(0)
     else:
         print("\nConversion failed. Please check the error messages above.")
-        print("For scanned PDFs, consider implementing OCR extensions.")
+        if not args.ocr:
+            print("For scanned PDFs, try --ocr.")
         sys.exit(1)
 
 if __name__ == "__main__":